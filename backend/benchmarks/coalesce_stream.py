@@ -0,0 +1,62 @@
+"""
+CPU time per token and number of writes when a fast token stream is sent
+as is versus through coalesce_stream.
+
+    cd backend && python -m benchmarks.coalesce_stream --tokens 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from open_webui.utils.coalesce import coalesce_stream
+
+
+async def generate(tokens: int, interval: float):
+    for i in range(tokens):
+        chunk = {"choices": [{"delta": {"content": f"token{i} "}}]}
+        yield f"data: {json.dumps(chunk)}\n\n".encode()
+        await asyncio.sleep(interval)
+    yield b"data: [DONE]\n\n"
+
+
+async def consume(iterator) -> int:
+    writes = 0
+    async for _ in iterator:
+        writes += 1
+        # A client write yields to the loop like a real transport would
+        await asyncio.sleep(0)
+    return writes
+
+
+async def run(name: str, iterator, tokens: int):
+    start = time.process_time()
+    writes = await consume(iterator)
+    elapsed = time.process_time() - start
+    print(f"{name:>10}: {elapsed / tokens * 1e6:.2f} us CPU per token, {writes} writes")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--interval", type=float, default=0.0)
+    parser.add_argument("--window", type=float, default=0.02)
+    parser.add_argument("--max-bytes", type=int, default=16384)
+    args = parser.parse_args()
+
+    await run("untouched", generate(args.tokens, args.interval), args.tokens)
+    await run(
+        "coalesced",
+        coalesce_stream(
+            generate(args.tokens, args.interval),
+            args.window,
+            args.max_bytes,
+            args.max_bytes * 16,
+        ),
+        args.tokens,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
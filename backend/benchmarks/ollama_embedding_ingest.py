@@ -0,0 +1,90 @@
+"""
+Texts per second embedded through generate_ollama_batch_embeddings against
+mock Ollama backends, one text per request versus batched /api/embed calls.
+The mock charges a fixed cost per request plus a cost per text.
+
+    cd backend && python -m benchmarks.ollama_embedding_ingest --texts 2000
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+from aiohttp import web
+
+MOCK_MODEL = "mock-embed:latest"
+
+
+def start_mock_ollama(
+    port: int, request_latency: float, text_latency: float, dimensions: int = 384
+):
+    """
+    Serves /api/embed and /api/embeddings on a background thread.
+    """
+
+    async def embed(request: web.Request) -> web.Response:
+        data = await request.json()
+        texts = data["input"] if isinstance(data["input"], list) else [data["input"]]
+        await asyncio.sleep(request_latency + text_latency * len(texts))
+        return web.json_response({"embeddings": [[0.1] * dimensions for _ in texts]})
+
+    async def embeddings(request: web.Request) -> web.Response:
+        await asyncio.sleep(request_latency + text_latency)
+        return web.json_response({"embedding": [0.1] * dimensions})
+
+    async def serve(started: threading.Event):
+        app = web.Application()
+        app.router.add_post("/api/embed", embed)
+        app.router.add_post("/api/embeddings", embeddings)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        started.set()
+        await asyncio.Event().wait()
+
+    started = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(started)), daemon=True).start()
+    started.wait()
+    return f"http://127.0.0.1:{port}"
+
+
+def configure_ollama(urls: list[str]):
+    from open_webui.apps.ollama.main import app
+
+    # Set on the value only, assigning the config would persist it
+    app.state.config._state["OLLAMA_BASE_URLS"].value = urls
+    app.state.MODELS = {
+        MOCK_MODEL: {"model": MOCK_MODEL, "urls": list(range(len(urls)))}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--backends", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18180)
+    parser.add_argument("--request-latency", type=float, default=0.005)
+    parser.add_argument("--text-latency", type=float, default=0.0002)
+    args = parser.parse_args()
+
+    from open_webui.apps.ollama.main import generate_ollama_batch_embeddings
+
+    configure_ollama(
+        [
+            start_mock_ollama(args.port + i, args.request_latency, args.text_latency)
+            for i in range(args.backends)
+        ]
+    )
+
+    texts = [f"chunk {i} " * 20 for i in range(args.texts)]
+    for batch_size in [1, 8, 32, 64]:
+        start = time.perf_counter()
+        embeddings = generate_ollama_batch_embeddings(MOCK_MODEL, texts, batch_size)
+        elapsed = time.perf_counter() - start
+        assert len(embeddings) == len(texts)
+        print(f"batch size {batch_size:>3}: {len(texts) / elapsed:.0f} texts/s")
+
+
+if __name__ == "__main__":
+    main()
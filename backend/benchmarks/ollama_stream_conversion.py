@@ -0,0 +1,94 @@
+"""
+Tokens per second per core of convert_streaming_response_ollama_to_openai,
+next to the earlier implementation that decoded and re-encoded every chunk
+through the OpenAI chunk template.
+
+    cd backend && python -m benchmarks.ollama_stream_conversion --tokens 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from open_webui.utils.misc import openai_chat_chunk_message_template
+from open_webui.utils.response import convert_streaming_response_ollama_to_openai
+
+
+class MockResponse:
+    def __init__(self, lines: list[bytes]):
+        self.lines = lines
+
+    @property
+    def body_iterator(self):
+        return self.iterate()
+
+    async def iterate(self):
+        for line in self.lines:
+            yield line
+
+
+async def convert_template_per_chunk(response):
+    # The implementation before the chunk templates were cached
+    async for data in response.body_iterator:
+        data = json.loads(data)
+        done = data.get("done", False)
+        data = openai_chat_chunk_message_template(
+            data.get("model", "ollama"),
+            data.get("message", {}).get("content", "") if not done else None,
+        )
+        line = f"data: {json.dumps(data)}\n\n"
+        if done:
+            line += "data: [DONE]\n\n"
+        yield line
+
+
+def build_stream(tokens: int) -> list[bytes]:
+    lines = [
+        json.dumps(
+            {
+                "model": "llama3.1:latest",
+                "created_at": "2024-09-01T00:00:00.000000Z",
+                "message": {"role": "assistant", "content": f"token{i} "},
+                "done": False,
+            }
+        ).encode()
+        + b"\n"
+        for i in range(tokens)
+    ]
+    lines.append(
+        json.dumps(
+            {
+                "model": "llama3.1:latest",
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "eval_count": tokens,
+            }
+        ).encode()
+        + b"\n"
+    )
+    return lines
+
+
+async def run(name: str, convert, lines: list[bytes], tokens: int):
+    start = time.process_time()
+    async for _ in convert(MockResponse(lines)):
+        pass
+    elapsed = time.process_time() - start
+    print(f"{name:>10}: {tokens / elapsed:,.0f} tokens/s per core")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=20000)
+    args = parser.parse_args()
+
+    lines = build_stream(args.tokens)
+    await run("template", convert_template_per_chunk, lines, args.tokens)
+    await run(
+        "current", convert_streaming_response_ollama_to_openai, lines, args.tokens
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
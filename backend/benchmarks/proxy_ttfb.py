@@ -0,0 +1,88 @@
+"""
+Time to first byte of a streamed completion against a local mock upstream,
+with the pooled client sessions versus a new session per request.
+
+    cd backend && python -m benchmarks.proxy_ttfb --requests 200
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+from aiohttp import web
+
+from open_webui.utils.http_client import ClientSessionRegistry
+
+
+async def completions(request: web.Request) -> web.StreamResponse:
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    for i in range(5):
+        await response.write(
+            f'data: {{"choices":[{{"delta":{{"content":"{i}"}}}}]}}\n\n'.encode()
+        )
+    await response.write(b"data: [DONE]\n\n")
+    return response
+
+
+async def start_upstream(port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def measure(session: aiohttp.ClientSession, url: str) -> float:
+    start = time.perf_counter()
+    async with session.post(url, json={"stream": True}) as r:
+        await r.content.readany()
+        ttfb = time.perf_counter() - start
+        await r.read()
+    return ttfb
+
+
+async def run_pooled(url: str, requests: int) -> list[float]:
+    registry = ClientSessionRegistry()
+    try:
+        return [await measure(registry.get_session(url), url) for _ in range(requests)]
+    finally:
+        await registry.close()
+
+
+async def run_unpooled(url: str, requests: int) -> list[float]:
+    results = []
+    for _ in range(requests):
+        async with aiohttp.ClientSession() as session:
+            results.append(await measure(session, url))
+    return results
+
+
+def report(name: str, results: list[float]):
+    results = sorted(results)
+    print(
+        f"{name:>10}: p50 {statistics.median(results) * 1000:.2f} ms, "
+        f"p95 {results[int(len(results) * 0.95) - 1] * 1000:.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    runner = await start_upstream(args.port)
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+    try:
+        report("pooled", await run_pooled(url, args.requests))
+        report("unpooled", await run_unpooled(url, args.requests))
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Chunks per second embedded per engine through the same pipeline as document
+ingestion (RAG_EMBEDDING_INSERT_BATCH_SIZE batches, RAG_EMBEDDING_CONCURRENCY
+in flight), against mock Ollama and OpenAI servers. Inserts are left out.
+
+    cd backend && python -m benchmarks.rag_embedding_ingest --chunks 5000
+    cd backend && python -m benchmarks.rag_embedding_ingest \\
+        --sentence-transformers-model sentence-transformers/all-MiniLM-L6-v2
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+from benchmarks.ollama_embedding_ingest import (
+    MOCK_MODEL,
+    configure_ollama,
+    start_mock_ollama,
+)
+from open_webui.config import (
+    RAG_EMBEDDING_CONCURRENCY,
+    RAG_EMBEDDING_INSERT_BATCH_SIZE,
+    RAG_EMBEDDING_OPENAI_BATCH_SIZE,
+)
+
+
+def start_mock_openai(
+    port: int, request_latency: float, text_latency: float, dimensions: int = 384
+):
+    async def embeddings(request: web.Request) -> web.Response:
+        data = await request.json()
+        await asyncio.sleep(request_latency + text_latency * len(data["input"]))
+        return web.json_response(
+            {
+                "data": [
+                    {"index": i, "embedding": [0.1] * dimensions}
+                    for i in range(len(data["input"]))
+                ]
+            }
+        )
+
+    async def serve(started: threading.Event):
+        app = web.Application()
+        app.router.add_post("/v1/embeddings", embeddings)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        started.set()
+        await asyncio.Event().wait()
+
+    started = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(started)), daemon=True).start()
+    started.wait()
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def ingest(embedding_function, texts: list[str], workers: int) -> int:
+    batch_size = max(RAG_EMBEDDING_INSERT_BATCH_SIZE, 1)
+    embedded = 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [
+            executor.submit(embedding_function, texts[i : i + batch_size])
+            for i in range(0, len(texts), batch_size)
+        ]
+        for future in futures:
+            embedded += len(future.result())
+    return embedded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--ollama-backends", type=int, default=2)
+    parser.add_argument("--port", type=int, default=18280)
+    parser.add_argument("--request-latency", type=float, default=0.005)
+    parser.add_argument("--text-latency", type=float, default=0.0002)
+    parser.add_argument("--sentence-transformers-model", default=None)
+    args = parser.parse_args()
+
+    from open_webui.apps.rag import utils
+
+    # Every chunk has to reach the engine, and the real cache stays untouched
+    utils.EMBEDDING_CACHE = None
+
+    configure_ollama(
+        [
+            start_mock_ollama(args.port + i, args.request_latency, args.text_latency)
+            for i in range(args.ollama_backends)
+        ]
+    )
+    openai_url = start_mock_openai(
+        args.port + args.ollama_backends, args.request_latency, args.text_latency
+    )
+
+    engines = [
+        ("ollama", MOCK_MODEL, None, RAG_EMBEDDING_CONCURRENCY),
+        ("openai", "mock-embed", None, RAG_EMBEDDING_CONCURRENCY),
+    ]
+    if args.sentence_transformers_model:
+        from sentence_transformers import SentenceTransformer
+
+        engines.append(
+            (
+                "",
+                args.sentence_transformers_model,
+                SentenceTransformer(args.sentence_transformers_model),
+                1,
+            )
+        )
+
+    texts = [f"chunk {i} " * 40 for i in range(args.chunks)]
+    for engine, model, embedding_function, workers in engines:
+        func = utils.get_embedding_function(
+            engine,
+            model,
+            embedding_function,
+            "sk-mock",
+            openai_url,
+            RAG_EMBEDDING_OPENAI_BATCH_SIZE,
+        )
+        start = time.perf_counter()
+        embedded = ingest(func, texts, workers)
+        elapsed = time.perf_counter() - start
+        assert embedded == len(texts)
+        print(
+            f"{engine or 'sentence_transformers':>21}: {embedded / elapsed:.0f} chunks/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Embedding calls and latency per chat request of get_rag_context, next to
+the earlier behaviour of embedding the query again for every collection.
+The embedding function and the vector DB are mocked, the embedding one
+with a fixed latency per call.
+
+    cd backend && python -m benchmarks.rag_query_embedding --files 4 --collections 3
+"""
+
+import argparse
+import contextlib
+import io
+import time
+
+from open_webui.apps.rag.vector.main import SearchResult
+
+
+class CountingEmbeddingFunction:
+    def __init__(self, latency: float, dimensions: int = 384):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def __call__(self, query):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [0.1] * self.dimensions
+
+
+class MockVectorDBClient:
+    def search(self, collection_name: str, vectors: list, limit: int):
+        return SearchResult(
+            ids=[[f"{collection_name}-{i}" for i in range(limit)]],
+            distances=[[i / limit for i in range(limit)]],
+            documents=[[f"{collection_name} document {i}" for i in range(limit)]],
+            metadatas=[[{"name": collection_name} for _ in range(limit)]],
+        )
+
+
+def query_per_collection(files, query, embedding_function, k):
+    # The behaviour before the query was embedded once per request
+    from open_webui.apps.rag.utils import query_doc
+
+    for file in files:
+        for collection_name in file["collection_names"]:
+            query_doc(collection_name, query, embedding_function, k)
+
+
+def run(name: str, query_files, requests: int, latency: float):
+    embedding_function = CountingEmbeddingFunction(latency)
+    start = time.perf_counter()
+    # query_doc prints every result
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(requests):
+            query_files(embedding_function)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>14}: {embedding_function.calls / requests:.1f} embedding calls, "
+        f"{elapsed / requests * 1000:.1f} ms per request"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--collections", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedding-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    from open_webui.apps.rag import utils
+
+    utils.VECTOR_DB_CLIENT = MockVectorDBClient()
+
+    query = "What does the document say about the quarterly results?"
+    files = [
+        {
+            "type": "collection",
+            "collection_names": [f"file-{i}-{j}" for j in range(args.collections)],
+        }
+        for i in range(args.files)
+    ]
+    messages = [{"role": "user", "content": query}]
+
+    run(
+        "per collection",
+        lambda embedding_function: query_per_collection(
+            files, query, embedding_function, args.k
+        ),
+        args.requests,
+        args.embedding_latency,
+    )
+    run(
+        "per request",
+        lambda embedding_function: utils.get_rag_context(
+            files,
+            messages,
+            embedding_function,
+            k=args.k,
+            reranking_function=None,
+            r=0.0,
+            hybrid_search=False,
+        ),
+        args.requests,
+        args.embedding_latency,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+CPU cost per chunk of scanning a passed through OpenAI stream for usage and
+timings, compared with forwarding the bytes untouched.
+
+    cd backend && python -m benchmarks.sse_stream_stats --chunks 100000
+"""
+
+import argparse
+import json
+import time
+
+from open_webui.apps.openai.utils.streaming import SSEStreamStats
+
+
+def build_stream(chunks: int) -> list[bytes]:
+    frames = [
+        f"data: {json.dumps({'id': 'chatcmpl-1', 'object': 'chat.completion.chunk', 'choices': [{'index': 0, 'delta': {'content': f'token{i} '}, 'finish_reason': None}]})}\n\n".encode()
+        for i in range(chunks)
+    ]
+    frames.append(
+        b'data: {"id":"chatcmpl-1","choices":[],"usage":{"prompt_tokens":10,"completion_tokens":%d}}\n\n'
+        % chunks
+    )
+    frames.append(b"data: [DONE]\n\n")
+    return frames
+
+
+def run(frames: list[bytes], stats: SSEStreamStats = None) -> float:
+    start = time.process_time()
+    forwarded = 0
+    for data in frames:
+        if stats is not None:
+            data = stats.feed(data)
+        forwarded += len(data)
+    if stats is not None:
+        forwarded += len(stats.flush())
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=100000)
+    args = parser.parse_args()
+
+    frames = build_stream(args.chunks)
+    for name, stats in [
+        ("untouched", None),
+        ("scanned", SSEStreamStats()),
+        ("stripped", SSEStreamStats(strip_usage=True)),
+    ]:
+        elapsed = run(frames, stats)
+        print(f"{name:>10}: {elapsed / args.chunks * 1e6:.3f} us CPU per chunk")
+
+
+if __name__ == "__main__":
+    main()
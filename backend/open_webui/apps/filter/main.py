@@ -4,6 +4,7 @@ import logging
 import os
 import time
 from collections import defaultdict
+from typing import Optional
 
 import aiohttp
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -36,6 +37,7 @@ from open_webui.env import (
     WEBSOCKET_REDIS_URL,
     WEBSOCKET_MANAGER,
 )
+from open_webui.utils.metrics import METRICS
 from open_webui.utils.utils import (
     get_admin_user,
 )
@@ -69,20 +71,29 @@ app.state.config.WECHAT_NOTICE_SUFFIX = WECHAT_NOTICE_SUFFIX
 
 file_path = os.path.join(DATA_DIR, app.state.config.CHAT_FILTER_WORDS_FILE)
 user_usage = defaultdict(lambda: defaultdict(int))
+user_token_usage = defaultdict(dict)
 redis_client = None
 if WEBSOCKET_REDIS_URL and WEBSOCKET_MANAGER == "redis":
     user_usage = RedisDict("open-webui:user_usage", redis_url=WEBSOCKET_REDIS_URL)
+    user_token_usage = RedisDict(
+        "open-webui:user_token_usage", redis_url=WEBSOCKET_REDIS_URL
+    )
 usage_lock = asyncio.Lock()
 search = None
 
 
 async def reset_usage():
-    global user_usage
+    global user_usage, user_token_usage
     if isinstance(user_usage, RedisDict):
         user_usage.clear()
     else:
         user_usage = defaultdict(lambda: defaultdict(int))
 
+    if isinstance(user_token_usage, RedisDict):
+        user_token_usage.clear()
+    else:
+        user_token_usage = defaultdict(dict)
+
 
 async def new_number_sign_up_notice(name, role, email):
     data = await notice_newnumber_signup_to_wechatapp(name, role, email)
@@ -385,7 +396,7 @@ async def init_usages():
     return usage_strings
 
 
-async def process_user_usage(model, user):
+async def process_user_usage(model, user, usage: Optional[dict] = None):
     global user_usage
     model_name = model.get("name", "")
     user_name = user.name
@@ -398,10 +409,32 @@ async def process_user_usage(model, user):
                 user_usage[user_name] = user_data
             else:
                 user_usage[user_name][model_name] += 1
+
+            if usage:
+                process_user_token_usage(model_name, user_name, usage)
     except Exception as e:
         log.error(f"处理用户使用数据时发生错误: {e}")
 
 
+def process_user_token_usage(model_name: str, user_name: str, usage: dict):
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+
+    user_data = user_token_usage.get(user_name, {})
+    model_data = user_data.get(model_name, {})
+    model_data["prompt_tokens"] = model_data.get("prompt_tokens", 0) + prompt_tokens
+    model_data["completion_tokens"] = (
+        model_data.get("completion_tokens", 0) + completion_tokens
+    )
+    user_data[model_name] = model_data
+    user_token_usage[user_name] = user_data
+
+    METRICS.inc("chat_tokens_total", prompt_tokens, model=model_name, type="prompt")
+    METRICS.inc(
+        "chat_tokens_total", completion_tokens, model=model_name, type="completion"
+    )
+
+
 @app.post("/usages")
 async def get_usages(user=Depends(get_admin_user)):
     if user.role != "admin":
@@ -410,6 +443,11 @@ async def get_usages(user=Depends(get_admin_user)):
     return {"data": await init_usages()}
 
 
+@app.post("/usages/tokens")
+async def get_token_usages(user=Depends(get_admin_user)):
+    return {"data": dict(user_token_usage.items())}
+
+
 async def content_filter_message(payload: dict, content: str, user):
     if content:
         chat_id = payload.get("metadata", {}).get("chat_id", None)
@@ -1,10 +1,12 @@
 import asyncio
+import hashlib
 import json
 import logging
 import os
-import random
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Union
 from urllib.parse import urlparse
 
@@ -16,7 +18,6 @@ from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ConfigDict
 from starlette.background import BackgroundTask
 
-from open_webui.apps.webui.models.models import Models
 from open_webui.config import (
     AIOHTTP_CLIENT_TIMEOUT,
     CORS_ALLOW_ORIGIN,
@@ -24,18 +25,35 @@ from open_webui.config import (
     ENABLE_OLLAMA_API,
     MODEL_FILTER_LIST,
     OLLAMA_BASE_URLS,
+    OLLAMA_DOWNLOAD_CONNECTIONS,
+    OLLAMA_DOWNLOAD_SEGMENT_SIZE,
+    OLLAMA_EMBEDDING_BATCH_SIZE,
+    OLLAMA_EMBEDDING_CONCURRENCY,
+    OLLAMA_EMBEDDING_RETRIES,
+    OLLAMA_KEEP_WARM_INTERVAL,
+    OLLAMA_KEEP_WARM_KEEP_ALIVE,
+    OLLAMA_KEEP_WARM_MODELS,
+    OLLAMA_MAX_CONCURRENCY,
+    OLLAMA_ROUTING_STRATEGY,
+    OLLAMA_WEIGHTS,
     UPLOAD_DIR,
     AppConfig,
 )
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.env import SRC_LOG_LEVELS
-from open_webui.utils.misc import (
-    calculate_sha256,
-)
-from open_webui.utils.payload import (
-    apply_model_params_to_body_ollama,
-    apply_model_params_to_body_openai,
-    apply_model_system_prompt_to_body,
+from open_webui.utils.balancer import ROUTING_STRATEGIES, BackendBalancer
+from open_webui.utils.disconnect import CancellableStreamingResponse
+from open_webui.utils.http_client import get_client_session
+from open_webui.utils.metrics import METRICS
+from open_webui.utils.payload import get_model_preset
+from open_webui.utils.scheduler import get_admission_scheduler, get_request_priority
+from open_webui.utils.transfer import (
+    TRANSFER_CHUNK_SIZE,
+    TransferProgress,
+    download_file,
+    iter_file,
+    watch_transfer,
+    write_and_hash,
 )
 from open_webui.utils.utils import get_admin_user, get_verified_user
 
@@ -58,12 +76,21 @@ app.state.config.MODEL_FILTER_LIST = MODEL_FILTER_LIST
 
 app.state.config.ENABLE_OLLAMA_API = ENABLE_OLLAMA_API
 app.state.config.OLLAMA_BASE_URLS = OLLAMA_BASE_URLS
+app.state.config.OLLAMA_ROUTING_STRATEGY = OLLAMA_ROUTING_STRATEGY
+app.state.config.OLLAMA_WEIGHTS = OLLAMA_WEIGHTS
+app.state.config.OLLAMA_MAX_CONCURRENCY = OLLAMA_MAX_CONCURRENCY
+app.state.config.OLLAMA_KEEP_WARM_MODELS = OLLAMA_KEEP_WARM_MODELS
+app.state.config.OLLAMA_KEEP_WARM_KEEP_ALIVE = OLLAMA_KEEP_WARM_KEEP_ALIVE
 app.state.MODELS = {}
-
-
-# TODO: Implement a more intelligent load balancing mechanism for distributing requests among multiple backend instances.
-# Current implementation uses a simple round-robin approach (random.choice). Consider incorporating algorithms like weighted round-robin,
-# least connections, or least response time for better resource utilization and performance optimization.
+# url_idx -> {"models": {model: /api/ps entry}, "updated_at": ...}
+app.state.RESIDENCY = {}
+# (url_idx, model) -> time of the last keep_alive ping, and pings in flight
+app.state.KEEP_WARM_PINGS = {}
+app.state.KEEP_WARM_PENDING = set()
+# url_idx -> bound on /api/embed batches in flight, shared by all ingestions
+app.state.EMBEDDING_SEMAPHORES = {}
+app.state.BALANCER = BackendBalancer()
+app.state.SCHEDULER = get_admission_scheduler("ollama")
 
 
 @app.middleware("http")
@@ -115,12 +142,81 @@ async def update_ollama_api_url(form_data: UrlUpdateForm, user=Depends(get_admin
     return {"OLLAMA_BASE_URLS": app.state.config.OLLAMA_BASE_URLS}
 
 
+@app.get("/routing")
+async def get_routing_config(user=Depends(get_admin_user)):
+    return {
+        "OLLAMA_ROUTING_STRATEGY": app.state.config.OLLAMA_ROUTING_STRATEGY,
+        "OLLAMA_WEIGHTS": app.state.config.OLLAMA_WEIGHTS,
+        "OLLAMA_MAX_CONCURRENCY": app.state.config.OLLAMA_MAX_CONCURRENCY,
+        "stats": app.state.BALANCER.model_dump(),
+        "queue": app.state.SCHEDULER.model_dump(),
+    }
+
+
+class RoutingConfigForm(BaseModel):
+    # Settings left out keep their current value
+    strategy: Optional[str] = None
+    weights: Optional[list[int]] = None
+    max_concurrency: Optional[list[int]] = None
+
+
+@app.post("/routing/update")
+async def update_routing_config(
+    form_data: RoutingConfigForm, user=Depends(get_admin_user)
+):
+    if form_data.strategy is not None:
+        if form_data.strategy not in ROUTING_STRATEGIES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown routing strategy, expected one of {ROUTING_STRATEGIES}",
+            )
+        app.state.config.OLLAMA_ROUTING_STRATEGY = form_data.strategy
+    if form_data.weights is not None:
+        app.state.config.OLLAMA_WEIGHTS = form_data.weights
+    if form_data.max_concurrency is not None:
+        app.state.config.OLLAMA_MAX_CONCURRENCY = form_data.max_concurrency
+    # Raised caps may let queued requests through right away
+    app.state.SCHEDULER.notify()
+    return await get_routing_config(user)
+
+
+@app.get("/residency")
+async def get_residency(user=Depends(get_admin_user)):
+    return {
+        "OLLAMA_KEEP_WARM_MODELS": app.state.config.OLLAMA_KEEP_WARM_MODELS,
+        "OLLAMA_KEEP_WARM_KEEP_ALIVE": app.state.config.OLLAMA_KEEP_WARM_KEEP_ALIVE,
+        "backends": {
+            idx: {
+                "url": url,
+                **app.state.RESIDENCY.get(idx, {"models": None, "updated_at": None}),
+            }
+            for idx, url in enumerate(app.state.config.OLLAMA_BASE_URLS)
+        },
+    }
+
+
+class ResidencyConfigForm(BaseModel):
+    keep_warm_models: list[str] = []
+    keep_alive: str = "30m"
+
+
+@app.post("/residency/update")
+async def update_residency_config(
+    form_data: ResidencyConfigForm, user=Depends(get_admin_user)
+):
+    app.state.config.OLLAMA_KEEP_WARM_MODELS = form_data.keep_warm_models
+    app.state.config.OLLAMA_KEEP_WARM_KEEP_ALIVE = form_data.keep_alive
+    # Pings go out again with the new keep_alive
+    app.state.KEEP_WARM_PINGS.clear()
+    return await get_residency(user)
+
+
 async def fetch_url(url):
     timeout = aiohttp.ClientTimeout(total=5)
     try:
-        async with aiohttp.ClientSession(timeout=timeout, trust_env=True) as session:
-            async with session.get(url) as response:
-                return await response.json()
+        session = get_client_session(url)
+        async with session.get(url, timeout=timeout) as response:
+            return await response.json()
     except Exception as e:
         # Handle connection error here
         log.error(f"Connection error: {e}")
@@ -128,46 +224,158 @@ async def fetch_url(url):
 
 
 async def cleanup_response(
-    response: Optional[aiohttp.ClientResponse],
-    session: Optional[aiohttp.ClientSession],
+    response: Optional[aiohttp.ClientResponse], url_idx: Optional[int] = None
 ):
+    # Sessions are pooled per upstream, only the response is released here
     if response:
-        response.close()
-    if session:
-        await session.close()
+        response.release()
+    if url_idx is not None:
+        release_url_idx(url_idx)
+
+
+def get_url_idx(url: str) -> Optional[int]:
+    for idx, base_url in enumerate(app.state.config.OLLAMA_BASE_URLS):
+        if url == base_url or url.startswith(f"{base_url}/"):
+            return idx
+    return None
+
+
+async def probe_backends():
+    # Active health check for backends whose circuit is not closed
+    async def probe(idx, url):
+        if await fetch_url(f"{url}/api/version") is not None:
+            app.state.BALANCER.record_success(idx)
+        else:
+            app.state.BALANCER.record_failure(idx, Exception("Health probe failed"))
+
+    await asyncio.gather(
+        *[
+            probe(idx, url)
+            for idx, url in enumerate(app.state.config.OLLAMA_BASE_URLS)
+            if app.state.BALANCER.get_stats(idx).state != "closed"
+        ]
+    )
+
+
+def is_model_resident(url_idx: int, model: str) -> bool:
+    return model in app.state.RESIDENCY.get(url_idx, {}).get("models", {})
+
+
+async def poll_residency():
+    # Records which models each backend currently holds in memory
+    async def poll(idx, url):
+        res = await fetch_url(f"{url}/api/ps")
+        if res is None:
+            # Unknown rather than empty, don't steer traffic on stale data
+            app.state.RESIDENCY.pop(idx, None)
+            return
+        app.state.RESIDENCY[idx] = {
+            "models": {model["model"]: model for model in res.get("models", [])},
+            "updated_at": int(time.time()),
+        }
+
+    await asyncio.gather(
+        *[poll(idx, url) for idx, url in enumerate(app.state.config.OLLAMA_BASE_URLS)]
+    )
+
+
+async def keep_models_warm():
+    async def ping(idx: int, model: str):
+        url = app.state.config.OLLAMA_BASE_URLS[idx]
+        try:
+            session = get_client_session(url)
+            # A generate request without a prompt only loads the model
+            async with session.post(
+                f"{url}/api/generate",
+                json={
+                    "model": model,
+                    "keep_alive": app.state.config.OLLAMA_KEEP_WARM_KEEP_ALIVE,
+                },
+                timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT),
+            ) as r:
+                r.raise_for_status()
+            app.state.KEEP_WARM_PINGS[(idx, model)] = time.time()
+            log.debug(f"Kept {model} warm on backend {idx}")
+        except Exception as e:
+            log.warning(f"Failed to keep {model} warm on backend {idx}: {e}")
+        finally:
+            app.state.KEEP_WARM_PENDING.discard((idx, model))
+
+    now = time.time()
+    for model in app.state.config.OLLAMA_KEEP_WARM_MODELS:
+        if ":" not in model:
+            model = f"{model}:latest"
+        if model not in app.state.MODELS:
+            continue
+
+        for idx in app.state.MODELS[model]["urls"]:
+            if (idx, model) in app.state.KEEP_WARM_PENDING:
+                continue
+            last_ping = app.state.KEEP_WARM_PINGS.get((idx, model))
+            if (
+                is_model_resident(idx, model)
+                and last_ping is not None
+                and now - last_ping < OLLAMA_KEEP_WARM_INTERVAL
+            ):
+                continue
+
+            app.state.KEEP_WARM_PENDING.add((idx, model))
+            # Cold loads take a while, don't hold up the poller
+            asyncio.create_task(ping(idx, model))
 
 
 async def post_streaming_url(
-    url: str, payload: Union[str, bytes], stream: bool = True, content_type=None
+    url: str,
+    payload: Union[str, bytes],
+    stream: bool = True,
+    content_type=None,
+    release_idx: Optional[int] = None,
 ):
+    # release_idx is the backend slot taken for this request, it's given back
+    # once the response has been consumed
     r = None
+    url_idx = get_url_idx(url)
+    streaming = False
     try:
-        session = aiohttp.ClientSession(
-            trust_env=True, timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
-        )
-        r = await session.post(
-            url,
-            data=payload,
-            headers={"Content-Type": "application/json"},
-        )
+        session = get_client_session(url)
+        start_time = time.monotonic()
+        try:
+            r = await session.post(
+                url,
+                data=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT),
+            )
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            if url_idx is not None:
+                app.state.BALANCER.record_failure(url_idx, e)
+            raise
+
+        if url_idx is not None:
+            app.state.BALANCER.observe_latency(url_idx, time.monotonic() - start_time)
+            if r.status >= 500:
+                app.state.BALANCER.record_failure(
+                    url_idx, Exception(f"HTTP {r.status}")
+                )
+            else:
+                app.state.BALANCER.record_success(url_idx)
         r.raise_for_status()
 
         if stream:
             headers = dict(r.headers)
             if content_type:
                 headers["Content-Type"] = content_type
-            return StreamingResponse(
+            streaming = True
+            return CancellableStreamingResponse(
                 r.content,
                 status_code=r.status,
                 headers=headers,
                 background=BackgroundTask(
-                    cleanup_response, response=r, session=session
+                    cleanup_response, response=r, url_idx=release_idx
                 ),
             )
         else:
-            res = await r.json()
-            await cleanup_response(r, session)
-            return res
+            return await r.json()
 
     except Exception as e:
         error_detail = "Open WebUI: Server Connection Error"
@@ -183,6 +391,67 @@ async def post_streaming_url(
             status_code=r.status if r else 500,
             detail=error_detail,
         )
+    finally:
+        if not streaming:
+            await cleanup_response(r, url_idx=release_idx)
+
+
+async def send_request(
+    url_idx: int,
+    path: str,
+    method: str = "POST",
+    data: Optional[bytes] = None,
+    timeout: Optional[int] = AIOHTTP_CLIENT_TIMEOUT,
+):
+    # Non streaming requests over the pooled session, keeping the balancer's
+    # latency and health up to date
+    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
+    log.debug(f"url: {url}{path}")
+
+    r = None
+    try:
+        session = get_client_session(url)
+        start_time = time.monotonic()
+        try:
+            r = await session.request(
+                method,
+                f"{url}{path}",
+                data=data,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            )
+            body = await r.text()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            app.state.BALANCER.record_failure(url_idx, e)
+            raise
+
+        app.state.BALANCER.observe_latency(url_idx, time.monotonic() - start_time)
+        if r.status >= 500:
+            app.state.BALANCER.record_failure(url_idx, Exception(f"HTTP {r.status}"))
+        else:
+            app.state.BALANCER.record_success(url_idx)
+
+        if r.status >= 400:
+            error_detail = f"Ollama: {body or r.reason}"
+            try:
+                res = json.loads(body)
+                if "error" in res:
+                    error_detail = f"Ollama: {res['error']}"
+            except Exception:
+                pass
+            raise HTTPException(status_code=r.status, detail=error_detail)
+
+        return json.loads(body) if body else None
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception(e)
+        raise HTTPException(
+            status_code=500, detail="Open WebUI: Server Connection Error"
+        )
+    finally:
+        if r is not None:
+            r.release()
 
 
 def merge_models_lists(model_lists):
@@ -245,29 +514,7 @@ async def get_ollama_tags(
                 )
         return models
     else:
-        url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-
-        r = None
-        try:
-            r = requests.request(method="GET", url=f"{url}/api/tags")
-            r.raise_for_status()
-
-            return r.json()
-        except Exception as e:
-            log.exception(e)
-            error_detail = "Open WebUI: Server Connection Error"
-            if r is not None:
-                try:
-                    res = r.json()
-                    if "error" in res:
-                        error_detail = f"Ollama: {res['error']}"
-                except Exception:
-                    error_detail = f"Ollama: {e}"
-
-            raise HTTPException(
-                status_code=r.status_code if r else 500,
-                detail=error_detail,
-            )
+        return await send_request(url_idx, "/api/tags", method="GET")
 
 
 @app.get("/api/version")
@@ -298,29 +545,7 @@ async def get_ollama_versions(url_idx: Optional[int] = None):
                     detail=ERROR_MESSAGES.OLLAMA_NOT_FOUND,
                 )
         else:
-            url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-
-            r = None
-            try:
-                r = requests.request(method="GET", url=f"{url}/api/version")
-                r.raise_for_status()
-
-                return r.json()
-            except Exception as e:
-                log.exception(e)
-                error_detail = "Open WebUI: Server Connection Error"
-                if r is not None:
-                    try:
-                        res = r.json()
-                        if "error" in res:
-                            error_detail = f"Ollama: {res['error']}"
-                    except Exception:
-                        error_detail = f"Ollama: {e}"
-
-                raise HTTPException(
-                    status_code=r.status_code if r else 500,
-                    detail=error_detail,
-                )
+            return await send_request(url_idx, "/api/version", method="GET")
     else:
         return {"version": False}
 
@@ -415,36 +640,10 @@ async def copy_model(
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.source),
             )
 
-    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-    log.info(f"url: {url}")
-    r = requests.request(
-        method="POST",
-        url=f"{url}/api/copy",
-        headers={"Content-Type": "application/json"},
-        data=form_data.model_dump_json(exclude_none=True).encode(),
+    await send_request(
+        url_idx, "/api/copy", data=form_data.model_dump_json(exclude_none=True).encode()
     )
-
-    try:
-        r.raise_for_status()
-
-        log.debug(f"r.text: {r.text}")
-
-        return True
-    except Exception as e:
-        log.exception(e)
-        error_detail = "Open WebUI: Server Connection Error"
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    error_detail = f"Ollama: {res['error']}"
-            except Exception:
-                error_detail = f"Ollama: {e}"
-
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=error_detail,
-        )
+    return True
 
 
 @app.delete("/api/delete")
@@ -463,36 +662,39 @@ async def delete_model(
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.name),
             )
 
-    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-    log.info(f"url: {url}")
-
-    r = requests.request(
+    await send_request(
+        url_idx,
+        "/api/delete",
         method="DELETE",
-        url=f"{url}/api/delete",
-        headers={"Content-Type": "application/json"},
         data=form_data.model_dump_json(exclude_none=True).encode(),
     )
-    try:
-        r.raise_for_status()
+    return True
 
-        log.debug(f"r.text: {r.text}")
 
-        return True
-    except Exception as e:
-        log.exception(e)
-        error_detail = "Open WebUI: Server Connection Error"
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    error_detail = f"Ollama: {res['error']}"
-            except Exception:
-                error_detail = f"Ollama: {e}"
+def send_backend_request(url_idx: int, path: str, data: bytes) -> requests.Response:
+    # Keeps the balancer's latency and health up to date for blocking requests
+    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
+    log.info(f"url: {url}")
 
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=error_detail,
+    start_time = time.monotonic()
+    try:
+        r = requests.request(
+            method="POST",
+            url=f"{url}{path}",
+            headers={"Content-Type": "application/json"},
+            data=data,
+            timeout=AIOHTTP_CLIENT_TIMEOUT,
         )
+    except requests.exceptions.RequestException as e:
+        app.state.BALANCER.record_failure(url_idx, e)
+        raise
+    app.state.BALANCER.observe_latency(url_idx, time.monotonic() - start_time)
+
+    if r.status_code >= 500:
+        app.state.BALANCER.record_failure(url_idx, Exception(f"HTTP {r.status_code}"))
+    else:
+        app.state.BALANCER.record_success(url_idx)
+    return r
 
 
 @app.post("/api/show")
@@ -503,35 +705,16 @@ async def show_model_info(form_data: ModelNameForm, user=Depends(get_verified_us
             detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.name),
         )
 
-    url_idx = random.choice(app.state.MODELS[form_data.name]["urls"])
-    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-    log.info(f"url: {url}")
-
-    r = requests.request(
-        method="POST",
-        url=f"{url}/api/show",
-        headers={"Content-Type": "application/json"},
-        data=form_data.model_dump_json(exclude_none=True).encode(),
-    )
+    url_idx = select_url_idx(form_data.name, capped=False)
+    app.state.BALANCER.acquire(url_idx)
     try:
-        r.raise_for_status()
-
-        return r.json()
-    except Exception as e:
-        log.exception(e)
-        error_detail = "Open WebUI: Server Connection Error"
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    error_detail = f"Ollama: {res['error']}"
-            except Exception:
-                error_detail = f"Ollama: {e}"
-
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=error_detail,
+        return await send_request(
+            url_idx,
+            "/api/show",
+            data=form_data.model_dump_json(exclude_none=True).encode(),
         )
+    finally:
+        release_url_idx(url_idx)
 
 
 class GenerateEmbeddingsForm(BaseModel):
@@ -541,10 +724,18 @@ class GenerateEmbeddingsForm(BaseModel):
     keep_alive: Optional[Union[int, str]] = None
 
 
+class GenerateEmbedForm(BaseModel):
+    model: str
+    input: Union[list[str], str]
+    truncate: Optional[bool] = None
+    options: Optional[dict] = None
+    keep_alive: Optional[Union[int, str]] = None
+
+
 @app.post("/api/embed")
 @app.post("/api/embed/{url_idx}")
 async def generate_embeddings(
-    form_data: GenerateEmbeddingsForm,
+    form_data: GenerateEmbedForm,
     url_idx: Optional[int] = None,
     user=Depends(get_verified_user),
 ):
@@ -555,41 +746,22 @@ async def generate_embeddings(
             model = f"{model}:latest"
 
         if model in app.state.MODELS:
-            url_idx = random.choice(app.state.MODELS[model]["urls"])
+            url_idx = select_url_idx(model, capped=False)
         else:
             raise HTTPException(
                 status_code=400,
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
             )
 
-    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-    log.info(f"url: {url}")
-
-    r = requests.request(
-        method="POST",
-        url=f"{url}/api/embed",
-        headers={"Content-Type": "application/json"},
-        data=form_data.model_dump_json(exclude_none=True).encode(),
-    )
+    app.state.BALANCER.acquire(url_idx)
     try:
-        r.raise_for_status()
-
-        return r.json()
-    except Exception as e:
-        log.exception(e)
-        error_detail = "Open WebUI: Server Connection Error"
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    error_detail = f"Ollama: {res['error']}"
-            except Exception:
-                error_detail = f"Ollama: {e}"
-
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=error_detail,
+        return await send_request(
+            url_idx,
+            "/api/embed",
+            data=form_data.model_dump_json(exclude_none=True).encode(),
         )
+    finally:
+        release_url_idx(url_idx)
 
 
 @app.post("/api/embeddings")
@@ -606,41 +778,22 @@ async def generate_embeddings(
             model = f"{model}:latest"
 
         if model in app.state.MODELS:
-            url_idx = random.choice(app.state.MODELS[model]["urls"])
+            url_idx = select_url_idx(model, capped=False)
         else:
             raise HTTPException(
                 status_code=400,
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
             )
 
-    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-    log.info(f"url: {url}")
-
-    r = requests.request(
-        method="POST",
-        url=f"{url}/api/embeddings",
-        headers={"Content-Type": "application/json"},
-        data=form_data.model_dump_json(exclude_none=True).encode(),
-    )
+    app.state.BALANCER.acquire(url_idx)
     try:
-        r.raise_for_status()
-
-        return r.json()
-    except Exception as e:
-        log.exception(e)
-        error_detail = "Open WebUI: Server Connection Error"
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    error_detail = f"Ollama: {res['error']}"
-            except Exception:
-                error_detail = f"Ollama: {e}"
-
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=error_detail,
+        return await send_request(
+            url_idx,
+            "/api/embeddings",
+            data=form_data.model_dump_json(exclude_none=True).encode(),
         )
+    finally:
+        release_url_idx(url_idx)
 
 
 def generate_ollama_embeddings(
@@ -656,23 +809,22 @@ def generate_ollama_embeddings(
             model = f"{model}:latest"
 
         if model in app.state.MODELS:
-            url_idx = random.choice(app.state.MODELS[model]["urls"])
+            url_idx = select_url_idx(model, capped=False)
         else:
             raise HTTPException(
                 status_code=400,
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
             )
 
-    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-    log.info(f"url: {url}")
-
-    r = requests.request(
-        method="POST",
-        url=f"{url}/api/embeddings",
-        headers={"Content-Type": "application/json"},
-        data=form_data.model_dump_json(exclude_none=True).encode(),
-    )
+    # Runs in worker threads, so the in-flight count (and the scheduler behind
+    # it) is left alone, only latency and health are reported
+    r = None
     try:
+        r = send_backend_request(
+            url_idx,
+            "/api/embeddings",
+            form_data.model_dump_json(exclude_none=True).encode(),
+        )
         r.raise_for_status()
 
         data = r.json()
@@ -697,6 +849,99 @@ def generate_ollama_embeddings(
         raise Exception(error_detail)
 
 
+def get_embedding_semaphore(url_idx: int) -> threading.BoundedSemaphore:
+    return app.state.EMBEDDING_SEMAPHORES.setdefault(
+        url_idx, threading.BoundedSemaphore(max(OLLAMA_EMBEDDING_CONCURRENCY, 1))
+    )
+
+
+def generate_ollama_batch_embeddings(
+    model: str, texts: list[str], batch_size: int = OLLAMA_EMBEDDING_BATCH_SIZE
+) -> list[list[float]]:
+    log.info(f"generate_ollama_batch_embeddings {model} {len(texts)} texts")
+
+    if ":" not in model:
+        model = f"{model}:latest"
+    try:
+        urls = get_healthy_url_idxs(model)
+    except HTTPException as e:
+        raise Exception(f"Ollama: {e.detail}")
+
+    # Backends that already hold the model go first, so small documents don't
+    # cause cold loads elsewhere
+    urls.sort(key=lambda idx: not is_model_resident(idx, model))
+
+    batch_size = max(int(batch_size or 1), 1)
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+
+    def pick_url_idx(start: int) -> Optional[int]:
+        # Each backend is checked with the balancer, so a half-open one only
+        # gets a single trial batch and one that opened since is skipped
+        for offset in range(len(urls)):
+            url_idx = urls[(start + offset) % len(urls)]
+            if app.state.BALANCER.select([url_idx]) is not None:
+                return url_idx
+        return None
+
+    # Runs in worker threads like generate_ollama_embeddings, batches are
+    # spread over the backends round robin
+    def embed_batch(batch_idx: int) -> list[list[float]]:
+        batch = batches[batch_idx]
+        error_detail = "Open WebUI: Server Connection Error"
+        for attempt in range(OLLAMA_EMBEDDING_RETRIES + 1):
+            if attempt:
+                time.sleep(0.5 * 2 ** (attempt - 1))
+
+            url_idx = pick_url_idx(batch_idx + attempt)
+            if url_idx is None:
+                error_detail = f"Ollama: {ERROR_MESSAGES.BACKENDS_UNAVAILABLE}"
+                continue
+
+            r = None
+            try:
+                with get_embedding_semaphore(url_idx):
+                    r = send_backend_request(
+                        url_idx,
+                        "/api/embed",
+                        json.dumps({"model": model, "input": batch}).encode(),
+                    )
+                r.raise_for_status()
+
+                embeddings = r.json().get("embeddings") or []
+                if len(embeddings) != len(batch):
+                    raise Exception(
+                        f"Expected {len(batch)} embeddings, got {len(embeddings)}"
+                    )
+                METRICS.inc("ollama_embedding_batches_total", result="success")
+                return embeddings
+            except Exception as e:
+                error_detail = f"Ollama: {e}"
+                if r is not None:
+                    try:
+                        res = r.json()
+                        if "error" in res:
+                            error_detail = f"Ollama: {res['error']}"
+                    except Exception:
+                        pass
+                log.warning(
+                    f"Embedding batch {batch_idx} failed on backend {url_idx}: {error_detail}"
+                )
+                # Bad input or an unknown model fail the same way everywhere
+                if r is not None and 400 <= r.status_code < 500:
+                    break
+
+        METRICS.inc("ollama_embedding_batches_total", result="failure")
+        raise Exception(error_detail)
+
+    if len(batches) == 1:
+        return embed_batch(0)
+
+    workers = min(len(batches), len(urls) * OLLAMA_EMBEDDING_CONCURRENCY)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = list(executor.map(embed_batch, range(len(batches))))
+    return [embedding for result in results for embedding in result]
+
+
 class GenerateCompletionForm(BaseModel):
     model: str
     prompt: str
@@ -725,18 +970,22 @@ async def generate_completion(
             model = f"{model}:latest"
 
         if model in app.state.MODELS:
-            url_idx = random.choice(app.state.MODELS[model]["urls"])
+            url_idx = await acquire_url_idx(model, get_request_priority(None))
         else:
             raise HTTPException(
                 status_code=400,
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
             )
+    else:
+        app.state.BALANCER.acquire(url_idx)
 
     url = app.state.config.OLLAMA_BASE_URLS[url_idx]
     log.info(f"url: {url}")
 
     return await post_streaming_url(
-        f"{url}/api/generate", form_data.model_dump_json(exclude_none=True).encode()
+        f"{url}/api/generate",
+        form_data.model_dump_json(exclude_none=True).encode(),
+        release_idx=url_idx,
     )
 
 
@@ -754,20 +1003,72 @@ class GenerateChatCompletionForm(BaseModel):
     template: Optional[str] = None
     stream: Optional[bool] = None
     keep_alive: Optional[Union[int, str]] = None
+    metadata: Optional[dict] = None
+
+
+def get_healthy_url_idxs(model: str) -> list[int]:
+    if model not in app.state.MODELS:
+        raise HTTPException(
+            status_code=400,
+            detail=ERROR_MESSAGES.MODEL_NOT_FOUND(model),
+        )
+
+    # Skip backends with an open circuit so a degraded node fails fast
+    urls = app.state.BALANCER.get_healthy(app.state.MODELS[model]["urls"])
+    if not urls:
+        raise HTTPException(
+            status_code=503,
+            detail=ERROR_MESSAGES.BACKENDS_UNAVAILABLE,
+        )
+    return urls
+
+
+def select_url_idx(model: str, capped: bool = True) -> Optional[int]:
+    # None when every healthy backend is at its concurrency cap, uncapped
+    # selection is for short requests that don't queue (embeddings, show)
+    urls = get_healthy_url_idxs(model)
+
+    # Backends that already hold the model skip a cold load, the rest are
+    # only used once those are busy
+    resident = [idx for idx in urls if is_model_resident(idx, model)]
+    for candidates in [resident, urls] if resident else [urls]:
+        url_idx = app.state.BALANCER.select(
+            candidates,
+            strategy=app.state.config.OLLAMA_ROUTING_STRATEGY,
+            weights=app.state.config.OLLAMA_WEIGHTS,
+            max_concurrency=(
+                app.state.config.OLLAMA_MAX_CONCURRENCY if capped else None
+            ),
+            key=model,
+        )
+        if url_idx is not None:
+            return url_idx
+    return None
 
 
 def get_ollama_url(url_idx: Optional[int], model: str):
     if url_idx is None:
-        if model not in app.state.MODELS:
-            raise HTTPException(
-                status_code=400,
-                detail=ERROR_MESSAGES.MODEL_NOT_FOUND(model),
-            )
-        url_idx = random.choice(app.state.MODELS[model]["urls"])
+        url_idx = select_url_idx(model, capped=False)
     url = app.state.config.OLLAMA_BASE_URLS[url_idx]
     return url
 
 
+async def acquire_url_idx(model: str, priority: int) -> int:
+    # Waits in the admission queue while every backend is at its cap
+    def try_acquire() -> Optional[int]:
+        url_idx = select_url_idx(model)
+        if url_idx is not None:
+            app.state.BALANCER.acquire(url_idx)
+        return url_idx
+
+    return await app.state.SCHEDULER.admit(try_acquire, release_url_idx, priority)
+
+
+def release_url_idx(url_idx: int):
+    app.state.BALANCER.release(url_idx)
+    app.state.SCHEDULER.notify()
+
+
 @app.post("/api/chat")
 @app.post("/api/chat/{url_idx}")
 async def generate_chat_completion(
@@ -792,27 +1093,21 @@ async def generate_chat_completion(
                 detail="Model not found",
             )
 
-    model_info = Models.get_model_by_id(model_id)
-
-    if model_info:
-        if model_info.base_model_id:
-            payload["model"] = model_info.base_model_id
-
-        params = model_info.params.model_dump()
-
-        if params:
-            if payload.get("options") is None:
-                payload["options"] = {}
+    model_preset = get_model_preset(model_id)
 
-            payload["options"] = apply_model_params_to_body_ollama(
-                params, payload["options"]
-            )
-            payload = apply_model_system_prompt_to_body(params, payload, user)
+    if model_preset:
+        payload = model_preset.apply_to_ollama_body(payload, user)
 
     if ":" not in payload["model"]:
         payload["model"] = f"{payload['model']}:latest"
 
-    url = get_ollama_url(url_idx, payload["model"])
+    if url_idx is None:
+        url_idx = await acquire_url_idx(
+            payload["model"], get_request_priority(form_data.metadata)
+        )
+    else:
+        app.state.BALANCER.acquire(url_idx)
+    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
     log.info(f"url: {url}")
     log.debug(payload)
 
@@ -821,6 +1116,7 @@ async def generate_chat_completion(
         json.dumps(payload),
         stream=form_data.stream,
         content_type="application/x-ndjson",
+        release_idx=url_idx,
     )
 
 
@@ -852,6 +1148,7 @@ async def generate_openai_chat_completion(
     user=Depends(get_verified_user),
 ):
     completion_form = OpenAIChatCompletionForm(**form_data)
+    priority = get_request_priority(form_data.get("metadata"))
     payload = {**completion_form.model_dump(exclude_none=True, exclude=["metadata"])}
     if "metadata" in payload:
         del payload["metadata"]
@@ -868,28 +1165,26 @@ async def generate_openai_chat_completion(
                 detail="Model not found",
             )
 
-    model_info = Models.get_model_by_id(model_id)
+    model_preset = get_model_preset(model_id)
 
-    if model_info:
-        if model_info.base_model_id:
-            payload["model"] = model_info.base_model_id
-
-        params = model_info.params.model_dump()
-
-        if params:
-            payload = apply_model_params_to_body_openai(params, payload)
-            payload = apply_model_system_prompt_to_body(params, payload, user)
+    if model_preset:
+        payload = model_preset.apply_to_openai_body(payload, user)
 
     if ":" not in payload["model"]:
         payload["model"] = f"{payload['model']}:latest"
 
-    url = get_ollama_url(url_idx, payload["model"])
+    if url_idx is None:
+        url_idx = await acquire_url_idx(payload["model"], priority)
+    else:
+        app.state.BALANCER.acquire(url_idx)
+    url = app.state.config.OLLAMA_BASE_URLS[url_idx]
     log.info(f"url: {url}")
 
     return await post_streaming_url(
         f"{url}/v1/chat/completions",
         json.dumps(payload),
         stream=payload.get("stream", False),
+        release_idx=url_idx,
     )
 
 
@@ -926,41 +1221,19 @@ async def get_openai_models(
         }
 
     else:
-        url = app.state.config.OLLAMA_BASE_URLS[url_idx]
-        try:
-            r = requests.request(method="GET", url=f"{url}/api/tags")
-            r.raise_for_status()
-
-            models = r.json()
-
-            return {
-                "data": [
-                    {
-                        "id": model["model"],
-                        "object": "model",
-                        "created": int(time.time()),
-                        "owned_by": "openai",
-                    }
-                    for model in models["models"]
-                ],
-                "object": "list",
-            }
-
-        except Exception as e:
-            log.exception(e)
-            error_detail = "Open WebUI: Server Connection Error"
-            if r is not None:
-                try:
-                    res = r.json()
-                    if "error" in res:
-                        error_detail = f"Ollama: {res['error']}"
-                except Exception:
-                    error_detail = f"Ollama: {e}"
-
-            raise HTTPException(
-                status_code=r.status_code if r else 500,
-                detail=error_detail,
-            )
+        models = await send_request(url_idx, "/api/tags", method="GET")
+        return {
+            "data": [
+                {
+                    "id": model["model"],
+                    "object": "model",
+                    "created": int(time.time()),
+                    "owned_by": "openai",
+                }
+                for model in models["models"]
+            ],
+            "object": "list",
+        }
 
 
 class UrlForm(BaseModel):
@@ -987,53 +1260,72 @@ def parse_huggingface_url(hf_url):
         return None
 
 
-async def download_file_stream(
-    ollama_url, file_url, file_path, file_name, chunk_size=1024 * 1024
+async def upload_blob(
+    ollama_url: str, file_path: str, digest: str, progress: TransferProgress
 ):
-    done = False
-
-    if os.path.exists(file_path):
-        current_size = os.path.getsize(file_path)
-    else:
-        current_size = 0
-
-    headers = {"Range": f"bytes={current_size}-"} if current_size > 0 else {}
-
-    timeout = aiohttp.ClientTimeout(total=600)  # Set the timeout
-
-    async with aiohttp.ClientSession(timeout=timeout, trust_env=True) as session:
-        async with session.get(file_url, headers=headers) as response:
-            total_size = int(response.headers.get("content-length", 0)) + current_size
-
-            with open(file_path, "ab+") as file:
-                async for data in response.content.iter_chunked(chunk_size):
-                    current_size += len(data)
-                    file.write(data)
-
-                    done = current_size == total_size
-                    progress = round((current_size / total_size) * 100, 2)
-
-                    yield f'data: {{"progress": {progress}, "completed": {current_size}, "total": {total_size}}}\n\n'
+    session = get_client_session(ollama_url)
+    url = f"{ollama_url}/api/blobs/sha256:{digest}"
+
+    async with session.head(url) as r:
+        if r.status == 200:
+            log.info(f"Blob sha256:{digest} already exists, skipping upload")
+            progress.completed = progress.total
+            return
+
+    async with session.post(
+        url,
+        data=iter_file(file_path, progress),
+        timeout=aiohttp.ClientTimeout(total=None, sock_read=AIOHTTP_CLIENT_TIMEOUT),
+    ) as r:
+        if r.status >= 400:
+            log.error(f"Blob upload failed: {r.status} {await r.text()}")
+            raise Exception("Ollama: Could not create blob, Please try again.")
+
+
+async def upload_blob_stream(
+    ollama_url: str, file_path: str, file_name: str, digest: str
+):
+    progress = TransferProgress(os.path.getsize(file_path))
+    task = asyncio.create_task(upload_blob(ollama_url, file_path, digest, progress))
+    async for res in watch_transfer(task, progress):
+        yield f"data: {json.dumps({**res, 'status': 'uploading'})}\n\n"
+    task.result()
 
-                if done:
-                    file.seek(0)
-                    hashed = calculate_sha256(file)
-                    file.seek(0)
+    os.remove(file_path)
+    res = {
+        "done": True,
+        "blob": f"sha256:{digest}",
+        "name": file_name,
+    }
+    yield f"data: {json.dumps(res)}\n\n"
 
-                    url = f"{ollama_url}/api/blobs/sha256:{hashed}"
-                    response = requests.post(url, data=file)
 
-                    if response.ok:
-                        res = {
-                            "done": done,
-                            "blob": f"sha256:{hashed}",
-                            "name": file_name,
-                        }
-                        os.remove(file_path)
+async def download_file_stream(
+    ollama_url, file_url, file_path, file_name, chunk_size=TRANSFER_CHUNK_SIZE
+):
+    try:
+        async with aiohttp.ClientSession(trust_env=True) as session:
+            progress = TransferProgress()
+            task = asyncio.create_task(
+                download_file(
+                    session,
+                    file_url,
+                    file_path,
+                    progress,
+                    connections=OLLAMA_DOWNLOAD_CONNECTIONS,
+                    segment_size=OLLAMA_DOWNLOAD_SEGMENT_SIZE,
+                    chunk_size=chunk_size,
+                )
+            )
+            async for res in watch_transfer(task, progress):
+                yield f"data: {json.dumps(res)}\n\n"
+            digest = task.result()
 
-                        yield f"data: {json.dumps(res)}\n\n"
-                    else:
-                        raise "Ollama: Could not create blob, Please try again."
+        async for event in upload_blob_stream(ollama_url, file_path, file_name, digest):
+            yield event
+    except Exception as e:
+        log.exception(e)
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
 
 # url = "https://huggingface.co/TheBloke/stablelm-zephyr-3b-GGUF/resolve/main/stablelm-zephyr-3b.Q2_K.gguf"
@@ -1081,58 +1373,20 @@ def upload_model(
 
     file_path = f"{UPLOAD_DIR}/{file.filename}"
 
-    # Save file in chunks
+    # Hashed while it's saved, the blob upload is then the only other read
+    hasher = hashlib.sha256()
     with open(file_path, "wb+") as f:
-        for chunk in file.file:
-            f.write(chunk)
+        while chunk := file.file.read(TRANSFER_CHUNK_SIZE):
+            write_and_hash(f, hasher, chunk)
 
-    def file_process_stream():
-        nonlocal ollama_url
-        total_size = os.path.getsize(file_path)
-        chunk_size = 1024 * 1024
+    async def file_process_stream():
         try:
-            with open(file_path, "rb") as f:
-                total = 0
-                done = False
-
-                while not done:
-                    chunk = f.read(chunk_size)
-                    if not chunk:
-                        done = True
-                        continue
-
-                    total += len(chunk)
-                    progress = round((total / total_size) * 100, 2)
-
-                    res = {
-                        "progress": progress,
-                        "total": total_size,
-                        "completed": total,
-                    }
-                    yield f"data: {json.dumps(res)}\n\n"
-
-                if done:
-                    f.seek(0)
-                    hashed = calculate_sha256(f)
-                    f.seek(0)
-
-                    url = f"{ollama_url}/api/blobs/sha256:{hashed}"
-                    response = requests.post(url, data=f)
-
-                    if response.ok:
-                        res = {
-                            "done": done,
-                            "blob": f"sha256:{hashed}",
-                            "name": file.filename,
-                        }
-                        os.remove(file_path)
-                        yield f"data: {json.dumps(res)}\n\n"
-                    else:
-                        raise Exception(
-                            "Ollama: Could not create blob, Please try again."
-                        )
-
+            async for event in upload_blob_stream(
+                ollama_url, file_path, file.filename, hasher.hexdigest()
+            ):
+                yield event
         except Exception as e:
+            log.exception(e)
             res = {"error": str(e)}
             yield f"data: {json.dumps(res)}\n\n"
 
@@ -2,6 +2,7 @@ import asyncio
 import hashlib
 import json
 import logging
+import time
 from pathlib import Path
 from typing import Literal, Optional, overload
 
@@ -16,28 +17,35 @@ from starlette.background import BackgroundTask
 from open_webui.apps.filter.main import process_user_usage
 
 from open_webui.apps.openai.utils.streaming import (
+    SSEStreamStats,
     convert_from_stream_headers,
     convert_to_stream_data,
 )
-from open_webui.apps.webui.models.models import Models
 from open_webui.config import (
     AIOHTTP_CLIENT_TIMEOUT,
+    AIOHTTP_CLIENT_TTFB_TIMEOUT,
     CACHE_DIR,
     CORS_ALLOW_ORIGIN,
     ENABLE_MODEL_FILTER,
     ENABLE_OPENAI_API,
+    ENABLE_OPENAI_API_STREAM_USAGE,
     MODEL_FILTER_LIST,
     OPENAI_API_BASE_URLS,
     OPENAI_API_KEYS,
+    OPENAI_API_MAX_CONCURRENCY,
     OPENAI_API_NOSTREAM_MODELS,
+    OPENAI_API_ROUTING_STRATEGY,
+    OPENAI_API_WEIGHTS,
     AppConfig,
 )
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.env import SRC_LOG_LEVELS
-from open_webui.utils.payload import (
-    apply_model_params_to_body_openai,
-    apply_model_system_prompt_to_body,
-)
+from open_webui.utils.balancer import ROUTING_STRATEGIES, BackendBalancer
+from open_webui.utils.disconnect import CancellableStreamingResponse
+from open_webui.utils.http_client import get_client_session
+from open_webui.utils.metrics import METRICS
+from open_webui.utils.payload import get_model_preset
+from open_webui.utils.scheduler import get_admission_scheduler, get_request_priority
 from open_webui.utils.utils import get_admin_user, get_verified_user
 
 log = logging.getLogger(__name__)
@@ -60,8 +68,15 @@ app.state.config.MODEL_FILTER_LIST = MODEL_FILTER_LIST
 app.state.config.ENABLE_OPENAI_API = ENABLE_OPENAI_API
 app.state.config.OPENAI_API_BASE_URLS = OPENAI_API_BASE_URLS
 app.state.config.OPENAI_API_KEYS = OPENAI_API_KEYS
+app.state.config.ENABLE_OPENAI_API_STREAM_USAGE = ENABLE_OPENAI_API_STREAM_USAGE
+
+app.state.config.OPENAI_API_ROUTING_STRATEGY = OPENAI_API_ROUTING_STRATEGY
+app.state.config.OPENAI_API_WEIGHTS = OPENAI_API_WEIGHTS
+app.state.config.OPENAI_API_MAX_CONCURRENCY = OPENAI_API_MAX_CONCURRENCY
 
 app.state.MODELS = {}
+app.state.BALANCER = BackendBalancer()
+app.state.SCHEDULER = get_admission_scheduler("openai")
 
 
 @app.middleware("http")
@@ -119,6 +134,39 @@ async def update_openai_key(form_data: KeysUpdateForm, user=Depends(get_admin_us
     return {"OPENAI_API_KEYS": app.state.config.OPENAI_API_KEYS}
 
 
+class RoutingConfigForm(BaseModel):
+    strategy: str
+    weights: list[int] = []
+    max_concurrency: list[int] = []
+
+
+@app.get("/routing")
+async def get_routing_config(user=Depends(get_admin_user)):
+    return {
+        "OPENAI_API_ROUTING_STRATEGY": app.state.config.OPENAI_API_ROUTING_STRATEGY,
+        "OPENAI_API_WEIGHTS": app.state.config.OPENAI_API_WEIGHTS,
+        "OPENAI_API_MAX_CONCURRENCY": app.state.config.OPENAI_API_MAX_CONCURRENCY,
+        "stats": app.state.BALANCER.model_dump(),
+        "queue": app.state.SCHEDULER.model_dump(),
+    }
+
+
+@app.post("/routing/update")
+async def update_routing_config(
+    form_data: RoutingConfigForm, user=Depends(get_admin_user)
+):
+    if form_data.strategy not in ROUTING_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown routing strategy, expected one of {ROUTING_STRATEGIES}",
+        )
+
+    app.state.config.OPENAI_API_ROUTING_STRATEGY = form_data.strategy
+    app.state.config.OPENAI_API_WEIGHTS = form_data.weights
+    app.state.config.OPENAI_API_MAX_CONCURRENCY = form_data.max_concurrency
+    return await get_routing_config(user)
+
+
 @app.post("/audio/speech")
 async def speech(request: Request, user=Depends(get_verified_user)):
     idx = None
@@ -187,9 +235,9 @@ async def fetch_url(url, key):
     timeout = aiohttp.ClientTimeout(total=10)
     try:
         headers = {"Authorization": f"Bearer {key}"}
-        async with aiohttp.ClientSession(timeout=timeout, trust_env=True) as session:
-            async with session.get(url, headers=headers) as response:
-                return await response.json()
+        session = get_client_session(url)
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            return await response.json()
     except Exception as e:
         # Handle connection error here
         log.error(f"Connection error: {e}")
@@ -197,54 +245,77 @@ async def fetch_url(url, key):
 
 
 async def cleanup_response(
-    response: Optional[aiohttp.ClientResponse],
-    session: Optional[aiohttp.ClientSession],
+    response: Optional[aiohttp.ClientResponse], url_idx: Optional[int] = None
 ):
+    # Sessions are pooled per upstream, only the response is released here
     if response:
-        response.close()
-    if session:
-        await session.close()
+        response.release()
+    if url_idx is not None:
+        release_url_idx(url_idx)
+
+
+async def probe_backends():
+    # Active health check for backends whose circuit is not closed
+    async def probe(idx, url):
+        res = await fetch_url(f"{url}/models", app.state.config.OPENAI_API_KEYS[idx])
+        if res is not None:
+            app.state.BALANCER.record_success(idx)
+        else:
+            app.state.BALANCER.record_failure(idx, Exception("Health probe failed"))
+
+    await asyncio.gather(
+        *[
+            probe(idx, url)
+            for idx, url in enumerate(app.state.config.OPENAI_API_BASE_URLS)
+            if app.state.BALANCER.get_stats(idx).state != "closed"
+        ]
+    )
 
 
 def merge_models_lists(model_lists):
     log.debug(f"merge_models_lists {model_lists}")
-    merged_list = []
+    merged_models = {}
 
     for idx, models in enumerate(model_lists):
         if models is not None and "error" not in models:
-            merged_list.extend(
-                [
-                    {
-                        **model,
-                        "name": model.get("name", model["id"]),
-                        "owned_by": "openai",
-                        "openai": model,
-                        "urlIdx": idx,
-                    }
-                    for model in models
-                    if not any(
-                        name in model["id"]
-                        for name in [
-                            "babbage",
-                            "dall-e",
-                            "davinci",
-                            "embedding",
-                            "tts",
-                            "whisper",
-                            "swap",
-                            "BAAI",
-                            "fishaudio",
-                            "reranker",
-                            "gizmo-g*",
-                            "g-*",
-                            "black-forest-labs",
-                            "SenseVoiceSmall",
-                        ]
-                    )
-                ]
-            )
-
-    return merged_list
+            for model in models:
+                if any(
+                    name in model["id"]
+                    for name in [
+                        "babbage",
+                        "dall-e",
+                        "davinci",
+                        "embedding",
+                        "tts",
+                        "whisper",
+                        "swap",
+                        "BAAI",
+                        "fishaudio",
+                        "reranker",
+                        "gizmo-g*",
+                        "g-*",
+                        "black-forest-labs",
+                        "SenseVoiceSmall",
+                    ]
+                ):
+                    continue
+
+                # The same model served by several urls is routed across all of them,
+                # urlIdx stays the first one for callers that need a single backend
+                if model["id"] in merged_models:
+                    merged_models[model["id"]]["urlIdxs"].append(idx)
+                    continue
+
+                merged_models[model["id"]] = {
+                    **model,
+                    "name": model.get("name", model["id"]),
+                    "owned_by": "openai",
+                    "openai": model,
+                    "urlIdx": idx,
+                    "urlIdxs": [idx],
+                }
+
+    return list(merged_models.values())
 
 
 def is_openai_api_disabled():
@@ -386,6 +457,131 @@ async def get_models(url_idx: Optional[int] = None, user=Depends(get_verified_us
             )
 
 
+def select_url_idx(model: dict, excluded: Optional[list[int]] = None) -> int:
+    candidates = [
+        idx
+        for idx in model.get("urlIdxs", [model["urlIdx"]])
+        if idx not in (excluded or [])
+    ]
+    if not app.state.BALANCER.get_healthy(candidates):
+        raise HTTPException(status_code=503, detail=ERROR_MESSAGES.BACKENDS_UNAVAILABLE)
+
+    url_idx = app.state.BALANCER.select(
+        candidates,
+        strategy=app.state.config.OPENAI_API_ROUTING_STRATEGY,
+        weights=app.state.config.OPENAI_API_WEIGHTS,
+        max_concurrency=app.state.config.OPENAI_API_MAX_CONCURRENCY,
+        key=model["id"],
+    )
+    if url_idx is None:
+        raise HTTPException(status_code=429, detail=ERROR_MESSAGES.BACKENDS_BUSY)
+    return url_idx
+
+
+async def acquire_url_idx(model: dict, priority: int) -> int:
+    # Waits in the admission queue while every backend is at its cap
+    def try_acquire() -> Optional[int]:
+        try:
+            url_idx = select_url_idx(model)
+        except HTTPException as e:
+            if e.status_code == 429:
+                return None
+            raise
+        app.state.BALANCER.acquire(url_idx)
+        return url_idx
+
+    return await app.state.SCHEDULER.admit(try_acquire, release_url_idx, priority)
+
+
+def release_url_idx(url_idx: int):
+    app.state.BALANCER.release(url_idx)
+    app.state.SCHEDULER.notify()
+
+
+async def send_chat_completion_request(idx: int, payload: str):
+    url = app.state.config.OPENAI_API_BASE_URLS[idx]
+    key = app.state.config.OPENAI_API_KEYS[idx]
+
+    headers = {}
+    headers["Authorization"] = f"Bearer {key}"
+    headers["Content-Type"] = "application/json"
+    if "openrouter.ai" in url:
+        headers["HTTP-Referer"] = "https://openwebui.com/"
+        headers["X-Title"] = "Open WebUI"
+
+    start_time = time.monotonic()
+    session = get_client_session(url)
+    r = await asyncio.wait_for(
+        session.request(
+            method="POST",
+            url=f"{url}/chat/completions",
+            data=payload,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT),
+        ),
+        timeout=AIOHTTP_CLIENT_TTFB_TIMEOUT,
+    )
+    app.state.BALANCER.observe_latency(idx, time.monotonic() - start_time)
+    return r
+
+
+async def stream_with_stats(
+    r: aiohttp.ClientResponse, model: dict, user, strip_usage: bool = False
+):
+    # Upstream bytes are forwarded untouched unless the usage frame we asked
+    # for has to be cut out again, the stats only observe them
+    stats = SSEStreamStats(strip_usage=strip_usage)
+    completed = False
+    cancelled = False
+    try:
+        async for data in r.content.iter_any():
+            if data := stats.feed(data):
+                yield data
+        if data := stats.flush():
+            yield data
+        completed = True
+    except (GeneratorExit, asyncio.CancelledError):
+        cancelled = True
+        raise
+    finally:
+        stats.finish()
+        stats = stats.model_dump()
+        log.debug(f"stream stats: {stats}")
+
+        if stats["ttft"] is not None:
+            METRICS.observe("openai_ttft_seconds", stats["ttft"], model=model["id"])
+        if stats["tokens_per_second"] is not None:
+            METRICS.observe(
+                "openai_tokens_per_second",
+                stats["tokens_per_second"],
+                model=model["id"],
+            )
+
+        if completed:
+            completion_tokens = (stats["usage"] or {}).get("completion_tokens")
+            METRICS.observe(
+                "openai_completion_tokens",
+                completion_tokens or stats["content_chunks"],
+                model=model["id"],
+            )
+        elif cancelled and not stats["done"]:
+            # The client went away, drop the connection so the upstream stops
+            # generating instead of finishing an answer nobody reads
+            r.close()
+            METRICS.inc("openai_streams_cancelled_total", model=model["id"])
+            summary = METRICS.get_summary("openai_completion_tokens", model=model["id"])
+            if summary:
+                tokens_saved = (
+                    summary["sum"] / summary["count"] - stats["content_chunks"]
+                )
+                if tokens_saved > 0:
+                    METRICS.inc(
+                        "openai_tokens_saved_total", tokens_saved, model=model["id"]
+                    )
+
+        await process_user_usage(model, user, stats["usage"])
+
+
 @app.post("/chat/completions")
 @app.post("/chat/completions/{url_idx}")
 async def generate_chat_completion(
@@ -395,23 +591,18 @@ async def generate_chat_completion(
 ):
     idx = 0
     payload = {**form_data}
+    priority = get_request_priority(payload.get("metadata"))
 
     if "metadata" in payload:
         del payload["metadata"]
 
     model_id = form_data.get("model")
-    model_info = Models.get_model_by_id(model_id)
-
-    if model_info:
-        if model_info.base_model_id:
-            payload["model"] = model_info.base_model_id
+    model_preset = get_model_preset(model_id)
 
-        params = model_info.params.model_dump()
-        payload = apply_model_params_to_body_openai(params, payload)
-        payload = apply_model_system_prompt_to_body(params, payload, user)
+    if model_preset:
+        payload = model_preset.apply_to_openai_body(payload, user)
 
     model = app.state.MODELS[payload.get("model")]
-    idx = model["urlIdx"]
 
     if "pipeline" in model and model.get("pipeline"):
         payload["user"] = {
@@ -435,37 +626,61 @@ async def generate_chat_completion(
         # hard-code stream=False regardless of upstream in svelte/etc.
         payload["stream"] = False
 
+    strip_usage = False
+    if payload.get("stream", False) and app.state.config.ENABLE_OPENAI_API_STREAM_USAGE:
+        # Ask for the trailing usage chunk, it is stripped from the stream
+        # again unless the client asked for it too
+        stream_options = payload.get("stream_options") or {}
+        strip_usage = "include_usage" not in stream_options
+        payload["stream_options"] = {"include_usage": True, **stream_options}
+
+    # Only non-stream requests are retried on another backend, nothing has
+    # reached the client yet when their first byte deadline passes
+    retry = url_idx is None and not payload.get("stream", False)
+
     # Convert the modified body back to JSON
     payload = json.dumps(payload)
 
     log.debug(payload)
 
-    url = app.state.config.OPENAI_API_BASE_URLS[idx]
-    key = app.state.config.OPENAI_API_KEYS[idx]
-
-    headers = {}
-    headers["Authorization"] = f"Bearer {key}"
-    headers["Content-Type"] = "application/json"
-    if "openrouter.ai" in app.state.config.OPENAI_API_BASE_URLS[idx]:
-        headers["HTTP-Referer"] = "https://openwebui.com/"
-        headers["X-Title"] = "Open WebUI"
-
     r = None
-    session = None
     error = None
+    streaming = False
+    passthrough = False
+    usage = None
+    excluded = []
+
+    if url_idx is not None:
+        idx = url_idx
+        app.state.BALANCER.acquire(idx)
+    else:
+        idx = await acquire_url_idx(model, priority)
 
     try:
-        # NOTE: have seen better OAI performance with httpx/http2 than aiohttp/http1.1
-        session = aiohttp.ClientSession(
-            trust_env=True,
-            timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT),
-        )
-        r = await session.request(
-            method="POST",
-            url=f"{url}/chat/completions",
-            data=payload,
-            headers=headers,
-        )
+        while True:
+            try:
+                r = await send_chat_completion_request(idx, payload)
+                break
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                app.state.BALANCER.record_failure(idx, e)
+                excluded.append(idx)
+                if not retry:
+                    raise
+
+                try:
+                    next_idx = select_url_idx(model, excluded)
+                except HTTPException:
+                    raise e
+
+                log.warning(f"Backend {idx} failed ({e!r}), retrying on {next_idx}")
+                release_url_idx(idx)
+                idx = next_idx
+                app.state.BALANCER.acquire(idx)
+
+        if r.status >= 500:
+            app.state.BALANCER.record_failure(idx, Exception(f"HTTP {r.status}"))
+        else:
+            app.state.BALANCER.record_success(idx)
 
         # check for non-200 status and log the response if it's not a 200
         if r.status != 200:
@@ -477,17 +692,18 @@ async def generate_chat_completion(
         # Check if response is SSE
         if "text/event-stream" in r.headers.get("Content-Type", ""):
             log.info("Streaming response from original event stream")
-            return StreamingResponse(
-                r.content,
+            streaming = True
+            passthrough = True
+            return CancellableStreamingResponse(
+                stream_with_stats(r, model, user, strip_usage),
                 status_code=r.status,
                 headers=dict(r.headers),
-                background=BackgroundTask(
-                    cleanup_response, response=r, session=session
-                ),
+                background=BackgroundTask(cleanup_response, response=r, url_idx=idx),
             )
         else:
             response_data = await r.json()
             log.info("Received non-streaming response from upstream")
+            usage = response_data.get("usage")
 
             if stream_requested:
                 log.info("Streaming response from non-streaming response")
@@ -512,17 +728,17 @@ async def generate_chat_completion(
                 # Set Transfer-Encoding: chunked for streaming
                 headers["transfer-encoding"] = "chunked"
 
-                return StreamingResponse(
+                streaming = True
+                return CancellableStreamingResponse(
                     content_generator(),
                     status_code=r.status,
                     headers=headers,
                     background=BackgroundTask(
-                        cleanup_response, response=r, session=session
+                        cleanup_response, response=r, url_idx=idx
                     ),
                 )
             else:
                 log.info("Returning non-streaming response to client")
-                # close the session
                 return response_data
     except Exception as e:
         log.exception(e)
@@ -538,13 +754,11 @@ async def generate_chat_completion(
                 error_detail = f"External: {e}"
         raise HTTPException(status_code=r.status if r else 500, detail=error_detail)
     finally:
-        if not stream_requested:
-            if r:
-                r.close()
-            if session:
-                await session.close()
-        if not error:
-            await process_user_usage(model, user)
+        if not streaming:
+            await cleanup_response(r, url_idx=idx)
+        # Passthrough streams report usage once the stream has been consumed
+        if not error and not passthrough:
+            await process_user_usage(model, user, usage)
 
 
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
@@ -563,16 +777,17 @@ async def proxy(path: str, request: Request, user=Depends(get_verified_user)):
     headers["Content-Type"] = "application/json"
 
     r = None
-    session = None
     streaming = False
 
     try:
-        session = aiohttp.ClientSession(trust_env=True)
+        session = get_client_session(url)
+        # Streams can run for a long time, only a stalled upstream is cut off
         r = await session.request(
             method=request.method,
             url=target_url,
             data=body,
             headers=headers,
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=AIOHTTP_CLIENT_TIMEOUT),
         )
 
         r.raise_for_status()
@@ -584,9 +799,7 @@ async def proxy(path: str, request: Request, user=Depends(get_verified_user)):
                 r.content,
                 status_code=r.status,
                 headers=dict(r.headers),
-                background=BackgroundTask(
-                    cleanup_response, response=r, session=session
-                ),
+                background=BackgroundTask(cleanup_response, response=r),
             )
         else:
             response_data = await r.json()
@@ -603,7 +816,5 @@ async def proxy(path: str, request: Request, user=Depends(get_verified_user)):
                 error_detail = f"External: {e}"
         raise HTTPException(status_code=r.status if r else 500, detail=error_detail)
     finally:
-        if not streaming and session:
-            if r:
-                r.close()
-            await session.close()
+        if not streaming and r:
+            r.release()
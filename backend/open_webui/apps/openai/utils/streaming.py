@@ -23,7 +23,8 @@ def convert_from_stream_headers(headers: dict) -> dict:
 
 
 import json
-from typing import Any
+import time
+from typing import Any, Optional
 
 
 def encode_sse_chunk(chunk: str | list | dict) -> bytes:
@@ -97,3 +98,122 @@ def convert_to_stream_data(response_data: dict) -> list[bytes]:
     stream.append(encode_sse_chunk("[DONE]"))
 
     return stream
+
+
+class SSEStreamStats:
+    """
+    Incremental scanner for an upstream SSE stream that is passed through as is.
+
+    Chunks are inspected in place and never re-encoded, only frames carrying a
+    usage block are decoded. The unterminated trailing line is the only data
+    kept between calls. With strip_usage, the usage-only frame the client
+    didn't ask for is cut out and only complete lines are forwarded.
+    """
+
+    def __init__(self, strip_usage: bool = False):
+        self.strip_usage = strip_usage
+        self.started_at = time.monotonic()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.chunks = 0
+        self.content_chunks = 0
+        self.done = False
+        self.usage: Optional[dict] = None
+        self.tail = b""
+        self.stripping = False
+
+    def feed(self, data: bytes) -> bytes:
+        """
+        Scans data and returns the bytes to forward to the client.
+        """
+        received = data
+        if self.tail:
+            data = self.tail + data
+            self.tail = b""
+
+        forward = []
+        kept = 0
+        start = 0
+        while (end := data.find(b"\n", start)) != -1:
+            usage_only = False
+            if data.startswith(b"data:", start, end):
+                usage_only = self.process_data_line(data, start + 5, end)
+
+            if self.strip_usage:
+                # The blank line terminating a stripped frame goes with it
+                blank = not data[start:end].strip()
+                if usage_only or (self.stripping and blank):
+                    forward.append(data[kept:start])
+                    kept = end + 1
+                self.stripping = usage_only
+            start = end + 1
+
+        if start < len(data):
+            self.tail = data[start:]
+
+        if not self.strip_usage:
+            return received
+        forward.append(data[kept:start])
+        return b"".join(forward)
+
+    def flush(self) -> bytes:
+        # Held back unterminated line once the upstream is done
+        return self.tail if self.strip_usage else b""
+
+    def process_data_line(self, data: bytes, start: int, end: int) -> bool:
+        # Returns whether the frame carries only usage and no choices
+        if data.find(b"[DONE]", start, end) != -1:
+            self.done = True
+            return False
+        self.chunks += 1
+
+        idx = data.find(b'"content":', start, end)
+        if idx != -1 and not is_empty_json_value(data, idx + 10, end):
+            self.content_chunks += 1
+            if self.first_token_at is None:
+                self.first_token_at = time.monotonic()
+
+        idx = data.find(b'"usage":', start, end)
+        if idx != -1 and not is_empty_json_value(data, idx + 8, end):
+            try:
+                frame = json.loads(data[start:end])
+            except Exception:
+                return False
+            self.usage = frame.get("usage") or self.usage
+            return frame.get("choices") == []
+        return False
+
+    def finish(self):
+        self.finished_at = time.monotonic()
+
+    def model_dump(self) -> dict:
+        finished_at = self.finished_at or time.monotonic()
+
+        ttft = None
+        tokens_per_second = None
+        if self.first_token_at is not None:
+            ttft = self.first_token_at - self.started_at
+
+            tokens = self.content_chunks
+            if self.usage and self.usage.get("completion_tokens"):
+                tokens = self.usage["completion_tokens"]
+
+            generation_time = finished_at - self.first_token_at
+            if generation_time > 0:
+                tokens_per_second = tokens / generation_time
+
+        return {
+            "ttft": ttft,
+            "duration": finished_at - self.started_at,
+            "chunks": self.chunks,
+            "content_chunks": self.content_chunks,
+            "done": self.done,
+            "usage": self.usage,
+            "tokens_per_second": tokens_per_second,
+        }
+
+
+def is_empty_json_value(data: bytes, start: int, end: int) -> bool:
+    while start < end and data[start] in b" \t":
+        start += 1
+    return data.startswith((b'""', b"null", b"{}", b"[]"), start, end)
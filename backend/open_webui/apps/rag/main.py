@@ -5,8 +5,10 @@ import os
 import random
 import shutil
 import socket
+import time
 import urllib.parse
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Iterator, Optional, Sequence, Union, List, Tuple, Any
@@ -77,6 +79,8 @@ from open_webui.config import (
     RAG_EMBEDDING_ENGINE,
     RAG_EMBEDDING_MODEL,
     RAG_EMBEDDING_MODEL_AUTO_UPDATE,
+    RAG_EMBEDDING_CONCURRENCY,
+    RAG_EMBEDDING_INSERT_BATCH_SIZE,
     RAG_EMBEDDING_MODEL_TRUST_REMOTE_CODE,
     RAG_EMBEDDING_OPENAI_BATCH_SIZE,
     RAG_FILE_MAX_COUNT,
@@ -119,6 +123,8 @@ from open_webui.config import (
 )
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.env import SRC_LOG_LEVELS, DEVICE_TYPE, DOCKER
+from open_webui.utils.embedding_cache import EMBEDDING_CACHE, get_embedding_namespace
+from open_webui.utils.metrics import METRICS
 from open_webui.utils.misc import (
     calculate_sha256,
     calculate_sha256_string,
@@ -408,6 +414,14 @@ app.state.EMBEDDING_FUNCTION = get_embedding_function(
     app.state.config.RAG_EMBEDDING_OPENAI_BATCH_SIZE,
 )
 
+if EMBEDDING_CACHE is not None:
+    # Embeddings of a model that is no longer configured are of no use
+    EMBEDDING_CACHE.retain(
+        get_embedding_namespace(
+            app.state.config.RAG_EMBEDDING_ENGINE, app.state.config.RAG_EMBEDDING_MODEL
+        )
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ALLOW_ORIGIN,
@@ -509,6 +523,14 @@ async def update_embedding_config(
             app.state.config.RAG_EMBEDDING_OPENAI_BATCH_SIZE,
         )
 
+        if EMBEDDING_CACHE is not None:
+            EMBEDDING_CACHE.retain(
+                get_embedding_namespace(
+                    app.state.config.RAG_EMBEDDING_ENGINE,
+                    app.state.config.RAG_EMBEDDING_MODEL,
+                )
+            )
+
         return {
             "status": True,
             "embedding_engine": app.state.config.RAG_EMBEDDING_ENGINE,
@@ -527,6 +549,20 @@ async def update_embedding_config(
         )
 
 
+@app.get("/embedding/cache")
+async def get_embedding_cache_stats(user=Depends(get_admin_user)):
+    if EMBEDDING_CACHE is None:
+        return {"enabled": False}
+    return {"enabled": True, **EMBEDDING_CACHE.get_stats()}
+
+
+@app.post("/embedding/cache/clear")
+async def clear_embedding_cache(user=Depends(get_admin_user)):
+    if EMBEDDING_CACHE is not None:
+        EMBEDDING_CACHE.clear()
+    return {"status": True}
+
+
 class RerankingModelUpdateForm(BaseModel):
     reranking_model: str
 
@@ -1263,18 +1299,57 @@ def store_docs_in_vector_db(
                 app.state.config.RAG_EMBEDDING_OPENAI_BATCH_SIZE,
             )
 
-            VECTOR_DB_CLIENT.insert(
-                collection_name=collection_name,
-                items=[
-                    {
-                        "id": str(uuid.uuid4()),
-                        "text": text,
-                        "vector": embedding_function(text.replace("\n", " ")),
-                        "metadata": metadatas[idx],
-                    }
-                    for idx, text in enumerate(texts)
-                ],
+            # Batches are embedded in worker threads, several at once for
+            # remote engines, while the ones before them are being inserted
+            batch_size = max(RAG_EMBEDDING_INSERT_BATCH_SIZE, 1)
+            workers = (
+                RAG_EMBEDDING_CONCURRENCY
+                if app.state.config.RAG_EMBEDDING_ENGINE in ["ollama", "openai"]
+                else 1
+            )
+
+            start_time = time.monotonic()
+            executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+            try:
+                futures = [
+                    executor.submit(
+                        embedding_function,
+                        [text.replace("\n", " ") for text in texts[i : i + batch_size]],
+                    )
+                    for i in range(0, len(texts), batch_size)
+                ]
+
+                for batch_idx, future in enumerate(futures):
+                    start = batch_idx * batch_size
+                    batch = texts[start : start + batch_size]
+                    embeddings = future.result()
+
+                    VECTOR_DB_CLIENT.insert(
+                        collection_name=collection_name,
+                        items=[
+                            {
+                                "id": str(uuid.uuid4()),
+                                "text": text,
+                                "vector": embeddings[idx],
+                                "metadata": metadatas[start + idx],
+                            }
+                            for idx, text in enumerate(batch)
+                        ],
+                    )
+            except Exception:
+                # A partial collection would be taken for a finished one
+                if VECTOR_DB_CLIENT.has_collection(collection_name=collection_name):
+                    VECTOR_DB_CLIENT.delete_collection(collection_name=collection_name)
+                raise
+            finally:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+            duration = time.monotonic() - start_time
+            log.info(
+                f"Embedded {len(texts)} chunks into {collection_name} in {duration:.2f}s"
             )
+            METRICS.inc("rag_embedded_chunks_total", len(texts))
+            METRICS.observe("rag_ingest_seconds", duration)
 
             return True
     except Exception as e:
@@ -1,7 +1,13 @@
+import heapq
+import itertools
 import logging
+import math
 import os
+import threading
+import time
 import uuid
-from typing import Optional, Union
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional, Union
 
 import requests
 from huggingface_hub import snapshot_download
@@ -11,12 +17,20 @@ from langchain_core.documents import Document
 
 from open_webui.apps.ollama.main import (
     GenerateEmbeddingsForm,
+    generate_ollama_batch_embeddings,
     generate_ollama_embeddings,
 )
-from open_webui.config import CHROMA_CLIENT
+from open_webui.config import (
+    CHROMA_CLIENT,
+    RAG_COLLECTION_QUERY_TIMEOUT,
+    RAG_EMBEDDING_CONCURRENCY,
+    RAG_QUERY_CONCURRENCY,
+)
 from open_webui.env import SRC_LOG_LEVELS
 
 from open_webui.apps.rag.vector.connector import VECTOR_DB_CLIENT
+from open_webui.utils.embedding_cache import EMBEDDING_CACHE, get_embedding_namespace
+from open_webui.utils.metrics import METRICS
 from open_webui.utils.misc import get_last_user_message
 
 from open_webui.env import SRC_LOG_LEVELS
@@ -25,6 +39,16 @@ from open_webui.env import SRC_LOG_LEVELS
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
 
+# Shared so searches that outlive their deadline can't pile up threads
+QUERY_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(RAG_QUERY_CONCURRENCY, 1), thread_name_prefix="rag-query"
+)
+
+# Bounds the OpenAI embedding batches in flight across all ingestions
+OPENAI_EMBEDDING_SEMAPHORE = threading.BoundedSemaphore(
+    max(RAG_EMBEDDING_CONCURRENCY, 1)
+)
+
 
 from typing import Any
 
@@ -36,6 +60,7 @@ class VectorSearchRetriever(BaseRetriever):
     collection_name: Any
     embedding_function: Any
     top_k: int
+    query_embedding: Optional[list[float]] = None
 
     def _get_relevant_documents(
         self,
@@ -43,9 +68,13 @@ class VectorSearchRetriever(BaseRetriever):
         *,
         run_manager: CallbackManagerForRetrieverRun,
     ) -> list[Document]:
+        query_embedding = self.query_embedding
+        if query_embedding is None:
+            query_embedding = self.embedding_function(query)
+
         result = VECTOR_DB_CLIENT.search(
             collection_name=self.collection_name,
-            vectors=[self.embedding_function(query)],
+            vectors=[query_embedding],
             limit=self.top_k,
         )
 
@@ -69,11 +98,15 @@ def query_doc(
     query: str,
     embedding_function,
     k: int,
+    query_embedding: Optional[list[float]] = None,
 ):
     try:
+        if query_embedding is None:
+            query_embedding = embedding_function(query)
+
         result = VECTOR_DB_CLIENT.search(
             collection_name=collection_name,
-            vectors=[embedding_function(query)],
+            vectors=[query_embedding],
             limit=k,
         )
 
@@ -93,6 +126,7 @@ def query_doc_with_hybrid_search(
     k: int,
     reranking_function,
     r: float,
+    query_embedding: Optional[list[float]] = None,
 ) -> dict:
     try:
         result = VECTOR_DB_CLIENT.get(collection_name=collection_name)
@@ -107,6 +141,7 @@ def query_doc_with_hybrid_search(
             collection_name=collection_name,
             embedding_function=embedding_function,
             top_k=k,
+            query_embedding=query_embedding,
         )
 
         ensemble_retriever = EnsembleRetriever(
@@ -117,6 +152,7 @@ def query_doc_with_hybrid_search(
             top_n=k,
             reranking_function=reranking_function,
             r_score=r,
+            query_embedding=query_embedding,
         )
 
         compression_retriever = ContextualCompressionRetriever(
@@ -139,44 +175,116 @@ def query_doc_with_hybrid_search(
 def merge_and_sort_query_results(
     query_results: list[dict], k: int, reverse: bool = False
 ) -> list[dict]:
-    # Initialize lists to store combined data
-    combined_distances = []
-    combined_documents = []
-    combined_metadatas = []
-
-    for data in query_results:
-        combined_distances.extend(data["distances"][0])
-        combined_documents.extend(data["documents"][0])
-        combined_metadatas.extend(data["metadatas"][0])
-
-    # Create a list of tuples (distance, document, metadata)
-    combined = list(zip(combined_distances, combined_documents, combined_metadatas))
-
-    # Sort the list based on distances
-    combined.sort(key=lambda x: x[0], reverse=reverse)
-
-    # We don't have anything :-(
-    if not combined:
-        sorted_distances = []
-        sorted_documents = []
-        sorted_metadatas = []
-    else:
-        # Unzip the sorted list
-        sorted_distances, sorted_documents, sorted_metadatas = zip(*combined)
-
-        # Slicing the lists to include only k elements
-        sorted_distances = list(sorted_distances)[:k]
-        sorted_documents = list(sorted_documents)[:k]
-        sorted_metadatas = list(sorted_metadatas)[:k]
-
-    # Create the output dictionary
-    result = {
-        "distances": [sorted_distances],
-        "documents": [sorted_documents],
-        "metadatas": [sorted_metadatas],
+    combined = itertools.chain.from_iterable(
+        zip(data["distances"][0], data["documents"][0], data["metadatas"][0])
+        for data in query_results
+    )
+
+    # Only the best k are kept while going through the results
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    top = select(k, combined, key=lambda x: x[0])
+
+    return {
+        "distances": [[distance for distance, _, _ in top]],
+        "documents": [[document for _, document, _ in top]],
+        "metadatas": [[metadata for _, _, metadata in top]],
     }
 
-    return result
+
+def query_collections_in_parallel(
+    collection_names: list[str], search: Callable[[str], dict], search_type: str
+) -> tuple[list[dict], list[str]]:
+    """
+    Runs search for every collection on QUERY_EXECUTOR and returns the
+    results of those that answered in time, in collection order, with the
+    names of the collections that failed or timed out.
+
+    Each search has RAG_COLLECTION_QUERY_TIMEOUT seconds from when it starts.
+    The request waits that long for each wave of RAG_QUERY_CONCURRENCY
+    searches, searches that haven't started by then are dropped.
+    """
+    collection_names = list(dict.fromkeys(collection_names))
+    if not collection_names:
+        return [], []
+
+    started = {}
+
+    def run(collection_name: str) -> dict:
+        started[collection_name] = time.monotonic()
+        return search(collection_name)
+
+    waves = math.ceil(len(collection_names) / max(RAG_QUERY_CONCURRENCY, 1))
+    request_deadline = time.monotonic() + RAG_COLLECTION_QUERY_TIMEOUT * waves
+    pending = {
+        collection_name: QUERY_EXECUTOR.submit(run, collection_name)
+        for collection_name in collection_names
+    }
+    outcomes = {}
+    while pending:
+        now = time.monotonic()
+        deadlines = []
+        for collection_name, future in list(pending.items()):
+            if future.done():
+                outcomes[collection_name] = future
+                del pending[collection_name]
+                continue
+
+            if collection_name in started:
+                deadline = started[collection_name] + RAG_COLLECTION_QUERY_TIMEOUT
+            elif now < request_deadline:
+                deadline = request_deadline
+            elif future.cancel():
+                outcomes[collection_name] = None
+                del pending[collection_name]
+                continue
+            else:
+                # Started just now, its own timeout applies
+                deadline = now + RAG_COLLECTION_QUERY_TIMEOUT
+
+            if now >= deadline:
+                outcomes[collection_name] = None
+                del pending[collection_name]
+                continue
+            deadlines.append(deadline)
+
+        if pending:
+            wait(
+                pending.values(),
+                timeout=min(deadlines) - now,
+                return_when=FIRST_COMPLETED,
+            )
+
+    results = []
+    failed = []
+    for collection_name in collection_names:
+        future = outcomes[collection_name]
+        if future is None:
+            if collection_name in started:
+                log.warning(
+                    f"Query of collection {collection_name} timed out after {RAG_COLLECTION_QUERY_TIMEOUT}s"
+                )
+            else:
+                log.warning(
+                    f"Query of collection {collection_name} was dropped, no thread was free in time"
+                )
+            METRICS.inc(
+                "rag_collection_queries_total", type=search_type, result="timeout"
+            )
+            failed.append(collection_name)
+            continue
+
+        try:
+            results.append(future.result())
+            METRICS.inc(
+                "rag_collection_queries_total", type=search_type, result="success"
+            )
+        except Exception as e:
+            log.exception(f"Error when querying the collection {collection_name}: {e}")
+            METRICS.inc(
+                "rag_collection_queries_total", type=search_type, result="error"
+            )
+            failed.append(collection_name)
+    return results, failed
 
 
 def query_collection(
@@ -184,24 +292,39 @@ def query_collection(
     query: str,
     embedding_function,
     k: int,
+    query_embedding: Optional[list[float]] = None,
 ) -> dict:
-    results = []
-    for collection_name in collection_names:
-        if collection_name:
-            try:
-                result = query_doc(
-                    collection_name=collection_name,
-                    query=query,
-                    k=k,
-                    embedding_function=embedding_function,
-                )
-                results.append(result.model_dump())
-            except Exception as e:
-                log.exception(f"Error when querying the collection: {e}")
-        else:
-            pass
+    # Embedded once, every collection is searched with the same vector
+    if query_embedding is None:
+        try:
+            query_embedding = embedding_function(query)
+        except Exception as e:
+            # Like a failed search of every collection, nothing is found
+            log.exception(f"Error when embedding the query: {e}")
+            return {
+                **merge_and_sort_query_results([], k=k),
+                "failed_collections": [
+                    collection_name
+                    for collection_name in collection_names
+                    if collection_name
+                ],
+            }
+
+    def search(collection_name: str) -> dict:
+        return query_doc(
+            collection_name=collection_name,
+            query=query,
+            k=k,
+            embedding_function=embedding_function,
+            query_embedding=query_embedding,
+        ).model_dump()
 
-    return merge_and_sort_query_results(results, k=k)
+    results, failed = query_collections_in_parallel(
+        [collection_name for collection_name in collection_names if collection_name],
+        search,
+        "vector",
+    )
+    return {**merge_and_sort_query_results(results, k=k), "failed_collections": failed}
 
 
 def query_collection_with_hybrid_search(
@@ -211,32 +334,42 @@ def query_collection_with_hybrid_search(
     k: int,
     reranking_function,
     r: float,
+    query_embedding: Optional[list[float]] = None,
 ) -> dict:
-    results = []
-    error = False
-    for collection_name in collection_names:
+    if query_embedding is None:
         try:
-            result = query_doc_with_hybrid_search(
-                collection_name=collection_name,
-                query=query,
-                embedding_function=embedding_function,
-                k=k,
-                reranking_function=reranking_function,
-                r=r,
-            )
-            results.append(result)
+            query_embedding = embedding_function(query)
         except Exception as e:
-            log.exception(
-                "Error when querying the collection with " f"hybrid_search: {e}"
+            log.exception(f"Error when embedding the query: {e}")
+            raise Exception(
+                "Hybrid search failed for all collections. Using Non hybrid search as fallback."
             )
-            error = True
 
-    if error:
+    def search(collection_name: str) -> dict:
+        return query_doc_with_hybrid_search(
+            collection_name=collection_name,
+            query=query,
+            embedding_function=embedding_function,
+            k=k,
+            reranking_function=reranking_function,
+            r=r,
+            query_embedding=query_embedding,
+        )
+
+    # The collections that answered are enough, the caller only falls back
+    # to plain vector search when none did
+    results, failed = query_collections_in_parallel(
+        list(collection_names), search, "hybrid"
+    )
+    if failed and not results:
         raise Exception(
             "Hybrid search failed for all collections. Using Non hybrid search as fallback."
         )
 
-    return merge_and_sort_query_results(results, k=k, reverse=True)
+    return {
+        **merge_and_sort_query_results(results, k=k, reverse=True),
+        "failed_collections": failed,
+    }
 
 
 def rag_template(template: str, context: str, query: str):
@@ -270,7 +403,7 @@ def get_embedding_function(
     batch_size,
 ):
     if embedding_engine == "":
-        return lambda query: embedding_function.encode(query).tolist()
+        generate = lambda query: embedding_function.encode(query).tolist()
     elif embedding_engine in ["ollama", "openai"]:
         if embedding_engine == "ollama":
             func = lambda query: generate_ollama_embeddings(
@@ -291,17 +424,38 @@ def get_embedding_function(
 
         def generate_multiple(query, f):
             if isinstance(query, list):
-                if embedding_engine == "openai":
+                if embedding_engine == "ollama":
+                    return generate_ollama_batch_embeddings(embedding_model, query)
+                elif embedding_engine == "openai":
                     embeddings = []
                     for i in range(0, len(query), batch_size):
-                        embeddings.extend(f(query[i : i + batch_size]))
+                        with OPENAI_EMBEDDING_SEMAPHORE:
+                            embeddings.extend(f(query[i : i + batch_size]))
                     return embeddings
                 else:
                     return [f(q) for q in query]
             else:
                 return f(query)
 
-        return lambda query: generate_multiple(query, func)
+        generate = lambda query: generate_multiple(query, func)
+    else:
+        return None
+
+    return get_cached_embedding_function(embedding_engine, embedding_model, generate)
+
+
+def get_cached_embedding_function(embedding_engine, embedding_model, func):
+    if EMBEDDING_CACHE is None:
+        return func
+
+    namespace = get_embedding_namespace(embedding_engine, embedding_model)
+
+    def generate(query):
+        if isinstance(query, list):
+            return EMBEDDING_CACHE.embed(namespace, query, func)
+        return EMBEDDING_CACHE.embed(namespace, [query], lambda texts: [func(query)])[0]
+
+    return generate
 
 
 def get_rag_context(
@@ -318,6 +472,8 @@ def get_rag_context(
 
     extracted_collections = []
     relevant_contexts = []
+    # Shared by every file and retriever of the request
+    query_embedding = None
 
     for file in files:
         context = None
@@ -338,6 +494,9 @@ def get_rag_context(
             if file["type"] == "text":
                 context = file["content"]
             else:
+                if query_embedding is None:
+                    query_embedding = embedding_function(query)
+
                 if hybrid_search:
                     try:
                         context = query_collection_with_hybrid_search(
@@ -347,6 +506,7 @@ def get_rag_context(
                             k=k,
                             reranking_function=reranking_function,
                             r=r,
+                            query_embedding=query_embedding,
                         )
                     except Exception as e:
                         log.debug(
@@ -360,12 +520,18 @@ def get_rag_context(
                         query=query,
                         embedding_function=embedding_function,
                         k=k,
+                        query_embedding=query_embedding,
                     )
         except Exception as e:
             log.exception(e)
 
         extracted_collections.extend(collection_names)
 
+        if isinstance(context, dict) and context.get("failed_collections"):
+            log.warning(
+                f"Collections left out of the context: {context['failed_collections']}"
+            )
+
         if context:
             if "data" in file:
                 del file["data"]
@@ -498,6 +664,7 @@ class RerankCompressor(BaseDocumentCompressor):
     top_n: int
     reranking_function: Any
     r_score: float
+    query_embedding: Optional[list[float]] = None
 
     class Config:
         extra = "forbid"
@@ -521,7 +688,9 @@ class RerankCompressor(BaseDocumentCompressor):
         else:
             from sentence_transformers import util
 
-            query_embedding = self.embedding_function(query)
+            query_embedding = self.query_embedding
+            if query_embedding is None:
+                query_embedding = self.embedding_function(query)
             document_embedding = self.embedding_function(
                 [doc.page_content for doc in documents]
             )
@@ -10,7 +10,6 @@ from pydantic import BaseModel
 
 from open_webui.apps.socket.main import get_event_call, get_event_emitter
 from open_webui.apps.webui.models.functions import Functions
-from open_webui.apps.webui.models.models import Models
 from open_webui.apps.webui.routers import (
     auths,
     chats,
@@ -63,14 +62,16 @@ from open_webui.env import (
     WEBUI_AUTH_TRUSTED_EMAIL_HEADER,
     WEBUI_AUTH_TRUSTED_NAME_HEADER,
 )
+from open_webui.utils.disconnect import (
+    CancellableStreamingResponse,
+    close_iterator,
+    close_streaming_response,
+)
 from open_webui.utils.misc import (
     openai_chat_chunk_message_template,
     openai_chat_completion_message_template,
 )
-from open_webui.utils.payload import (
-    apply_model_params_to_body_openai,
-    apply_model_system_prompt_to_body,
-)
+from open_webui.utils.payload import get_model_preset
 from open_webui.utils.tools import get_tools
 
 app = FastAPI()
@@ -298,7 +299,7 @@ def get_function_params(function_module, form_data, user, extra_params=None):
 
 async def generate_function_chat_completion(form_data, user):
     model_id = form_data.get("model")
-    model_info = Models.get_model_by_id(model_id)
+    model_preset = get_model_preset(model_id)
 
     metadata = form_data.pop("metadata", {})
 
@@ -342,13 +343,8 @@ async def generate_function_chat_completion(form_data, user):
         },
     )
 
-    if model_info:
-        if model_info.base_model_id:
-            form_data["model"] = model_info.base_model_id
-
-        params = model_info.params.model_dump()
-        form_data = apply_model_params_to_body_openai(params, form_data)
-        form_data = apply_model_system_prompt_to_body(params, form_data, user)
+    if model_preset:
+        form_data = model_preset.apply_to_openai_body(form_data, user)
 
     pipe_id = get_pipe_id(form_data)
     function_module = get_function_module(pipe_id)
@@ -359,44 +355,56 @@ async def generate_function_chat_completion(form_data, user):
     if form_data["stream"]:
 
         async def stream_content():
+            res = None
             try:
-                res = await execute_pipe(pipe, params)
-
-                # Directly return if the response is a StreamingResponse
-                if isinstance(res, StreamingResponse):
-                    async for data in res.body_iterator:
-                        yield data
-                    return
-                if isinstance(res, dict):
-                    yield f"data: {json.dumps(res)}\n\n"
+                try:
+                    res = await execute_pipe(pipe, params)
+
+                    # Directly return if the response is a StreamingResponse
+                    if isinstance(res, StreamingResponse):
+                        async for data in res.body_iterator:
+                            yield data
+                        return
+                    if isinstance(res, dict):
+                        yield f"data: {json.dumps(res)}\n\n"
+                        return
+
+                except Exception as e:
+                    print(f"Error: {e}")
+                    yield f"data: {json.dumps({'error': {'detail': str(e)}})}\n\n"
                     return
 
-            except Exception as e:
-                print(f"Error: {e}")
-                yield f"data: {json.dumps({'error': {'detail': str(e)}})}\n\n"
-                return
-
-            if isinstance(res, str):
-                message = openai_chat_chunk_message_template(form_data["model"], res)
-                yield f"data: {json.dumps(message)}\n\n"
-
-            if isinstance(res, Iterator):
-                for line in res:
-                    yield process_line(form_data, line)
-
-            if isinstance(res, AsyncGenerator):
-                async for line in res:
-                    yield process_line(form_data, line)
-
-            if isinstance(res, str) or isinstance(res, Generator):
-                finish_message = openai_chat_chunk_message_template(
-                    form_data["model"], ""
-                )
-                finish_message["choices"][0]["finish_reason"] = "stop"
-                yield f"data: {json.dumps(finish_message)}\n\n"
-                yield "data: [DONE]"
+                if isinstance(res, str):
+                    message = openai_chat_chunk_message_template(
+                        form_data["model"], res
+                    )
+                    yield f"data: {json.dumps(message)}\n\n"
+
+                if isinstance(res, Iterator):
+                    for line in res:
+                        yield process_line(form_data, line)
+
+                if isinstance(res, AsyncGenerator):
+                    async for line in res:
+                        yield process_line(form_data, line)
+
+                if isinstance(res, str) or isinstance(res, Generator):
+                    finish_message = openai_chat_chunk_message_template(
+                        form_data["model"], ""
+                    )
+                    finish_message["choices"][0]["finish_reason"] = "stop"
+                    yield f"data: {json.dumps(finish_message)}\n\n"
+                    yield "data: [DONE]"
+            finally:
+                # Stop the pipe as well when the client goes away mid stream
+                if isinstance(res, StreamingResponse):
+                    await close_streaming_response(res)
+                elif isinstance(res, (Generator, AsyncGenerator)):
+                    await close_iterator(res)
 
-        return StreamingResponse(stream_content(), media_type="text/event-stream")
+        return CancellableStreamingResponse(
+            stream_content(), media_type="text/event-stream"
+        )
     else:
         try:
             res = await execute_pipe(pipe, params)
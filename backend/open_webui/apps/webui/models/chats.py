@@ -114,6 +114,35 @@ class ChatTable:
         except Exception:
             return None
 
+    def update_chat_message_content_by_id(
+        self, id: str, message_id: str, content: str
+    ) -> Optional[ChatModel]:
+        try:
+            with get_db() as db:
+                chat_obj = db.get(Chat, id)
+                chat = json.loads(chat_obj.chat)
+
+                message = chat.get("history", {}).get("messages", {}).get(message_id)
+                if message is None:
+                    return None
+                message["content"] = content
+                message["done"] = True
+
+                # The flat message list is kept in sync with the history
+                for chat_message in chat.get("messages", []):
+                    if chat_message.get("id") == message_id:
+                        chat_message["content"] = content
+                        chat_message["done"] = True
+
+                chat_obj.chat = json.dumps(chat)
+                chat_obj.updated_at = int(time.time())
+                db.commit()
+                db.refresh(chat_obj)
+
+                return ChatModel.model_validate(chat_obj)
+        except Exception:
+            return None
+
     def insert_shared_chat_by_chat_id(self, chat_id: str) -> Optional[ChatModel]:
         with get_db() as db:
             # Get the existing chat to share
@@ -109,6 +109,10 @@ class ModelForm(BaseModel):
 
 
 class ModelsTable:
+    def __init__(self):
+        # Bumped on every write so cached model presets can be invalidated
+        self.version = 0
+
     def insert_new_model(
         self, form_data: ModelForm, user_id: str
     ) -> Optional[ModelModel]:
@@ -126,6 +130,7 @@ class ModelsTable:
                 db.add(result)
                 db.commit()
                 db.refresh(result)
+                self.version += 1
 
                 if result:
                     return ModelModel.model_validate(result)
@@ -157,6 +162,7 @@ class ModelsTable:
                     .update(model.model_dump(exclude={"id"}, exclude_none=True))
                 )
                 db.commit()
+                self.version += 1
 
                 model = db.get(Model, id)
                 db.refresh(model)
@@ -171,6 +177,7 @@ class ModelsTable:
             with get_db() as db:
                 db.query(Model).filter_by(id=id).delete()
                 db.commit()
+                self.version += 1
 
                 return True
         except Exception:
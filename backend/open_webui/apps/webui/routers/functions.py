@@ -9,7 +9,12 @@ from open_webui.apps.webui.models.functions import (
     FunctionResponse,
     Functions,
 )
-from open_webui.apps.webui.utils import load_function_module_by_id, replace_imports
+from open_webui.apps.webui.utils import (
+    extract_frontmatter,
+    install_frontmatter_requirements_async,
+    load_function_module_by_id,
+    replace_imports,
+)
 from open_webui.config import CACHE_DIR
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.utils.utils import get_admin_user, get_verified_user
@@ -58,6 +63,9 @@ async def create_new_function(
     if function is None:
         try:
             form_data.content = replace_imports(form_data.content)
+            await install_frontmatter_requirements_async(
+                extract_frontmatter(form_data.content).get("requirements", "")
+            )
             function_module, function_type, frontmatter = load_function_module_by_id(
                 form_data.id,
                 content=form_data.content,
@@ -175,6 +183,9 @@ async def update_function_by_id(
 ):
     try:
         form_data.content = replace_imports(form_data.content)
+        await install_frontmatter_requirements_async(
+            extract_frontmatter(form_data.content).get("requirements", "")
+        )
         function_module, function_type, frontmatter = load_function_module_by_id(
             id, content=form_data.content
         )
@@ -5,7 +5,12 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 
 from open_webui.apps.webui.models.tools import ToolForm, ToolModel, ToolResponse, Tools
-from open_webui.apps.webui.utils import load_toolkit_module_by_id, replace_imports
+from open_webui.apps.webui.utils import (
+    extract_frontmatter,
+    install_frontmatter_requirements_async,
+    load_toolkit_module_by_id,
+    replace_imports,
+)
 from open_webui.config import CACHE_DIR, DATA_DIR
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.utils.tools import get_tools_specs
@@ -62,6 +67,9 @@ async def create_new_toolkit(
     if toolkit is None:
         try:
             form_data.content = replace_imports(form_data.content)
+            await install_frontmatter_requirements_async(
+                extract_frontmatter(form_data.content).get("requirements", "")
+            )
             toolkit_module, frontmatter = load_toolkit_module_by_id(
                 form_data.id, content=form_data.content
             )
@@ -128,6 +136,9 @@ async def update_toolkit_by_id(
 ):
     try:
         form_data.content = replace_imports(form_data.content)
+        await install_frontmatter_requirements_async(
+            extract_frontmatter(form_data.content).get("requirements", "")
+        )
         toolkit_module, frontmatter = load_toolkit_module_by_id(
             id, content=form_data.content
         )
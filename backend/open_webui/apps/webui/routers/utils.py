@@ -3,6 +3,7 @@ from pathlib import Path
 
 import black
 import markdown
+from open_webui.apps.webui.utils import get_requirements_jobs
 from open_webui.config import DATA_DIR, ENABLE_ADMIN_EXPORT
 from open_webui.env import FONTS_DIR
 from open_webui.constants import ERROR_MESSAGES
@@ -138,3 +139,8 @@ async def download_litellm_config_yaml(user=Depends(get_admin_user)):
         media_type="application/octet-stream",
         filename="config.yaml",
     )
+
+
+@router.get("/requirements")
+async def get_requirements_install_jobs(user=Depends(get_admin_user)):
+    return get_requirements_jobs()
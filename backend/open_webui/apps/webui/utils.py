@@ -1,12 +1,29 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
 import re
-import subprocess
 import sys
+import time
 import types
 import tempfile
+from importlib import metadata
+from pathlib import Path
 
 from open_webui.apps.webui.models.functions import Functions
 from open_webui.apps.webui.models.tools import Tools
+from open_webui.config import CACHE_DIR
+
+log = logging.getLogger(__name__)
+
+REQUIREMENTS_CACHE_DIR = Path(CACHE_DIR) / "requirements"
+REQUIREMENTS_WHEELS_DIR = REQUIREMENTS_CACHE_DIR / "wheels"
+REQUIREMENTS_RECORD_FILE = REQUIREMENTS_CACHE_DIR / "installed.json"
+
+# Install jobs keyed by requirements hash, exposed for progress reporting
+REQUIREMENTS_JOBS = {}
+REQUIREMENTS_JOB_LOG_LINES = 50
 
 
 def extract_frontmatter(content):
@@ -63,6 +80,8 @@ def replace_imports(content):
 
 
 def load_toolkit_module_by_id(toolkit_id, content=None):
+    # Requirements of new content are installed by the caller beforehand, see
+    # install_frontmatter_requirements_async
     if content is None:
         tool = Tools.get_tool_by_id(toolkit_id)
         if not tool:
@@ -72,10 +91,6 @@ def load_toolkit_module_by_id(toolkit_id, content=None):
 
         content = replace_imports(content)
         Tools.update_tool_by_id(toolkit_id, {"content": content})
-    else:
-        frontmatter = extract_frontmatter(content)
-        # Install required packages found within the frontmatter
-        install_frontmatter_requirements(frontmatter.get("requirements", ""))
 
     module_name = f"tool_{toolkit_id}"
     module = types.ModuleType(module_name)
@@ -110,6 +125,8 @@ def load_toolkit_module_by_id(toolkit_id, content=None):
 
 
 def load_function_module_by_id(function_id, content=None):
+    # Requirements of new content are installed by the caller beforehand, see
+    # install_frontmatter_requirements_async
     if content is None:
         function = Functions.get_function_by_id(function_id)
         if not function:
@@ -118,9 +135,6 @@ def load_function_module_by_id(function_id, content=None):
 
         content = replace_imports(content)
         Functions.update_function_by_id(function_id, {"content": content})
-    else:
-        frontmatter = extract_frontmatter(content)
-        install_frontmatter_requirements(frontmatter.get("requirements", ""))
 
     module_name = f"function_{function_id}"
     module = types.ModuleType(module_name)
@@ -159,11 +173,143 @@ def load_function_module_by_id(function_id, content=None):
         os.unlink(temp_file.name)
 
 
-def install_frontmatter_requirements(requirements):
-    if requirements:
-        req_list = [req.strip() for req in requirements.split(",")]
-        for req in req_list:
-            print(f"Installing requirement: {req}")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", req])
-    else:
-        print("No requirements found in frontmatter.")
+def parse_frontmatter_requirements(requirements) -> list[str]:
+    if not requirements:
+        return []
+    return sorted(set(req.strip() for req in requirements.split(",") if req.strip()))
+
+
+def get_requirements_hash(req_list: list[str]) -> str:
+    return hashlib.sha256("\n".join(req_list).encode()).hexdigest()
+
+
+def get_requirement_name(req: str) -> str:
+    return re.split(r"[\s<>=!~;\[@]", req, maxsplit=1)[0]
+
+
+def load_installed_requirements() -> dict:
+    try:
+        with open(REQUIREMENTS_RECORD_FILE, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_installed_requirements(req_hash: str, req_list: list[str]):
+    installed = load_installed_requirements()
+    installed[req_hash] = {"requirements": req_list, "installed_at": int(time.time())}
+
+    REQUIREMENTS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    temp_file = REQUIREMENTS_RECORD_FILE.with_suffix(".tmp")
+    with open(temp_file, "w") as f:
+        json.dump(installed, f)
+    os.replace(temp_file, REQUIREMENTS_RECORD_FILE)
+
+
+def is_requirements_satisfied(req_hash: str, req_list: list[str]) -> bool:
+    if req_hash not in load_installed_requirements():
+        return False
+
+    # The record survives restarts, but site-packages may not (e.g. a new image)
+    for req in req_list:
+        try:
+            metadata.distribution(get_requirement_name(req))
+        except metadata.PackageNotFoundError:
+            return False
+    return True
+
+
+def get_pip_commands(req_list: list[str]) -> list[list[str]]:
+    wheels_dir = str(REQUIREMENTS_WHEELS_DIR)
+    return [
+        [sys.executable, "-m", "pip", "wheel", "--wheel-dir", wheels_dir]
+        + ["--find-links", wheels_dir, *req_list],
+        [sys.executable, "-m", "pip", "install", "--no-index"]
+        + ["--find-links", wheels_dir, *req_list],
+    ]
+
+
+async def run_requirements_job_command(job: dict, cmd: list[str]) -> int:
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    async for line in process.stdout:
+        job["log"].append(line.decode("utf-8", errors="replace").rstrip())
+        del job["log"][:-REQUIREMENTS_JOB_LOG_LINES]
+        job["updated_at"] = int(time.time())
+    return await process.wait()
+
+
+async def run_requirements_job(job: dict):
+    req_list = job["requirements"]
+    try:
+        if not req_list or await asyncio.to_thread(
+            is_requirements_satisfied, job["id"], req_list
+        ):
+            log.debug(f"Requirements already satisfied: {req_list}")
+            job["status"] = "done"
+            job["progress"] = 100
+            return
+
+        log.info(f"Installing requirements: {req_list}")
+        job["status"] = "installing"
+        REQUIREMENTS_WHEELS_DIR.mkdir(parents=True, exist_ok=True)
+        commands = get_pip_commands(req_list)
+        for step, cmd in enumerate(commands):
+            job["progress"] = round(step / len(commands) * 100, 2)
+            if await run_requirements_job_command(job, cmd) != 0:
+                # Some packages can't be built as wheels, fall back to a plain install
+                cmd = [sys.executable, "-m", "pip", "install", *req_list]
+                if await run_requirements_job_command(job, cmd) != 0:
+                    raise Exception(f"pip failed to install {', '.join(req_list)}")
+                break
+
+        await asyncio.to_thread(save_installed_requirements, job["id"], req_list)
+        job["status"] = "done"
+        job["progress"] = 100
+    except Exception as e:
+        log.exception(e)
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["updated_at"] = int(time.time())
+
+
+async def install_frontmatter_requirements_async(requirements) -> dict:
+    """
+    Install frontmatter requirements off the event loop. Identical requirement
+    sets share one job, and sets that are already installed never reach pip.
+    """
+    req_list = parse_frontmatter_requirements(requirements)
+    req_hash = get_requirements_hash(req_list)
+
+    job = REQUIREMENTS_JOBS.get(req_hash)
+    if job is None or job["status"] == "failed":
+        job = {
+            "id": req_hash,
+            "requirements": req_list,
+            "status": "pending",
+            "progress": 0,
+            "log": [],
+            "error": None,
+            "updated_at": int(time.time()),
+        }
+        # Created before anything is awaited, so concurrent callers always
+        # find the task to wait on
+        job["task"] = asyncio.create_task(run_requirements_job(job))
+        REQUIREMENTS_JOBS[req_hash] = job
+
+    await asyncio.shield(job["task"])
+
+    if job["status"] == "failed":
+        raise Exception(job["error"])
+    return job
+
+
+def get_requirements_jobs() -> list[dict]:
+    return [
+        {k: v for k, v in job.items() if k != "task"}
+        for job in REQUIREMENTS_JOBS.values()
+    ]
@@ -18,6 +18,7 @@ from open_webui.env import (
     DATA_DIR,
     ENV,
     FRONTEND_BUILD_DIR,
+    WEBSOCKET_REDIS_URL,
     WEBUI_AUTH,
     log,
 )
@@ -589,6 +590,38 @@ else:
     except Exception:
         AIOHTTP_CLIENT_TIMEOUT = 300
 
+AIOHTTP_CLIENT_POOL_LIMIT = int(os.environ.get("AIOHTTP_CLIENT_POOL_LIMIT", "100"))
+AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST = int(
+    os.environ.get("AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST", "0")
+)
+AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT = int(
+    os.environ.get("AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT", "30")
+)
+AIOHTTP_CLIENT_DNS_CACHE_TTL = int(
+    os.environ.get("AIOHTTP_CLIENT_DNS_CACHE_TTL", "300")
+)
+
+AIOHTTP_CLIENT_TTFB_TIMEOUT = os.environ.get("AIOHTTP_CLIENT_TTFB_TIMEOUT", "")
+AIOHTTP_CLIENT_TTFB_TIMEOUT = (
+    int(AIOHTTP_CLIENT_TTFB_TIMEOUT) if AIOHTTP_CLIENT_TTFB_TIMEOUT else None
+)
+
+BACKEND_CIRCUIT_FAILURE_THRESHOLD = int(
+    os.environ.get("BACKEND_CIRCUIT_FAILURE_THRESHOLD", "5")
+)
+BACKEND_CIRCUIT_RECOVERY_TIMEOUT = int(
+    os.environ.get("BACKEND_CIRCUIT_RECOVERY_TIMEOUT", "30")
+)
+BACKEND_HEALTH_PROBE_INTERVAL = int(
+    os.environ.get("BACKEND_HEALTH_PROBE_INTERVAL", "0")
+)
+
+# Requests wait in a priority queue while every backend of their model is at
+# its concurrency cap, and are rejected once they have waited past the deadline
+SCHEDULER_MAX_QUEUE_SIZE = int(os.environ.get("SCHEDULER_MAX_QUEUE_SIZE", "100"))
+SCHEDULER_CHAT_DEADLINE = float(os.environ.get("SCHEDULER_CHAT_DEADLINE", "60"))
+SCHEDULER_TASK_DEADLINE = float(os.environ.get("SCHEDULER_TASK_DEADLINE", "15"))
+
 K8S_FLAG = os.environ.get("K8S_FLAG", "")
 USE_OLLAMA_DOCKER = os.environ.get("USE_OLLAMA_DOCKER", "false")
 
@@ -618,6 +651,70 @@ OLLAMA_BASE_URLS = PersistentConfig(
     "OLLAMA_BASE_URLS", "ollama.base_urls", OLLAMA_BASE_URLS
 )
 
+OLLAMA_ROUTING_STRATEGY = PersistentConfig(
+    "OLLAMA_ROUTING_STRATEGY",
+    "ollama.routing_strategy",
+    os.environ.get("OLLAMA_ROUTING_STRATEGY", "least_outstanding"),
+)
+
+OLLAMA_WEIGHTS = os.environ.get("OLLAMA_WEIGHTS", "")
+OLLAMA_WEIGHTS = PersistentConfig(
+    "OLLAMA_WEIGHTS",
+    "ollama.weights",
+    [int(w) for w in OLLAMA_WEIGHTS.split(";")] if OLLAMA_WEIGHTS else [],
+)
+
+OLLAMA_MAX_CONCURRENCY = os.environ.get("OLLAMA_MAX_CONCURRENCY", "")
+OLLAMA_MAX_CONCURRENCY = PersistentConfig(
+    "OLLAMA_MAX_CONCURRENCY",
+    "ollama.max_concurrency",
+    (
+        [int(c) for c in OLLAMA_MAX_CONCURRENCY.split(";")]
+        if OLLAMA_MAX_CONCURRENCY
+        else []
+    ),
+)
+
+# Seconds between polls of each backend's loaded models (/api/ps), requests
+# prefer backends that have their model in memory, 0 disables. Only polled
+# with several backends or OLLAMA_KEEP_WARM_MODELS set
+OLLAMA_RESIDENCY_POLL_INTERVAL = int(
+    os.environ.get("OLLAMA_RESIDENCY_POLL_INTERVAL", "10")
+)
+
+# Models kept loaded on every backend serving them with keep_alive pings
+OLLAMA_KEEP_WARM_MODELS = os.environ.get("OLLAMA_KEEP_WARM_MODELS", "")
+OLLAMA_KEEP_WARM_MODELS = PersistentConfig(
+    "OLLAMA_KEEP_WARM_MODELS",
+    "ollama.keep_warm_models",
+    [model.strip() for model in OLLAMA_KEEP_WARM_MODELS.split(";") if model.strip()],
+)
+
+OLLAMA_KEEP_WARM_KEEP_ALIVE = PersistentConfig(
+    "OLLAMA_KEEP_WARM_KEEP_ALIVE",
+    "ollama.keep_warm_keep_alive",
+    os.environ.get("OLLAMA_KEEP_WARM_KEEP_ALIVE", "30m"),
+)
+
+# Seconds between keep_alive pings for a model that is already loaded
+OLLAMA_KEEP_WARM_INTERVAL = int(os.environ.get("OLLAMA_KEEP_WARM_INTERVAL", "300"))
+
+# Document embeddings are sent to /api/embed in batches of this many texts,
+# OLLAMA_EMBEDDING_CONCURRENCY at a time per backend hosting the model
+OLLAMA_EMBEDDING_BATCH_SIZE = int(os.environ.get("OLLAMA_EMBEDDING_BATCH_SIZE", "32"))
+
+OLLAMA_EMBEDDING_CONCURRENCY = int(os.environ.get("OLLAMA_EMBEDDING_CONCURRENCY", "2"))
+
+# Times a failed embedding batch is retried, on the next backend if any
+OLLAMA_EMBEDDING_RETRIES = int(os.environ.get("OLLAMA_EMBEDDING_RETRIES", "2"))
+
+# Model files (GGUF) of at least two segments are downloaded over this many
+# connections in ranged segments of OLLAMA_DOWNLOAD_SEGMENT_SIZE bytes
+OLLAMA_DOWNLOAD_CONNECTIONS = int(os.environ.get("OLLAMA_DOWNLOAD_CONNECTIONS", "4"))
+OLLAMA_DOWNLOAD_SEGMENT_SIZE = int(
+    os.environ.get("OLLAMA_DOWNLOAD_SEGMENT_SIZE", str(64 * 1024 * 1024))
+)
+
 ####################################
 # OPENAI_API
 ####################################
@@ -656,6 +753,36 @@ OPENAI_API_BASE_URLS = PersistentConfig(
     "OPENAI_API_BASE_URLS", "openai.api_base_urls", OPENAI_API_BASE_URLS
 )
 
+ENABLE_OPENAI_API_STREAM_USAGE = PersistentConfig(
+    "ENABLE_OPENAI_API_STREAM_USAGE",
+    "openai.enable_stream_usage",
+    os.environ.get("ENABLE_OPENAI_API_STREAM_USAGE", "False").lower() == "true",
+)
+
+OPENAI_API_ROUTING_STRATEGY = PersistentConfig(
+    "OPENAI_API_ROUTING_STRATEGY",
+    "openai.routing_strategy",
+    os.environ.get("OPENAI_API_ROUTING_STRATEGY", "round_robin"),
+)
+
+OPENAI_API_WEIGHTS = os.environ.get("OPENAI_API_WEIGHTS", "")
+OPENAI_API_WEIGHTS = PersistentConfig(
+    "OPENAI_API_WEIGHTS",
+    "openai.api_weights",
+    [int(w) for w in OPENAI_API_WEIGHTS.split(";")] if OPENAI_API_WEIGHTS else [],
+)
+
+OPENAI_API_MAX_CONCURRENCY = os.environ.get("OPENAI_API_MAX_CONCURRENCY", "")
+OPENAI_API_MAX_CONCURRENCY = PersistentConfig(
+    "OPENAI_API_MAX_CONCURRENCY",
+    "openai.api_max_concurrency",
+    (
+        [int(c) for c in OPENAI_API_MAX_CONCURRENCY.split(";")]
+        if OPENAI_API_MAX_CONCURRENCY
+        else []
+    ),
+)
+
 OPENAI_API_NOSTREAM_MODEL_LIST = os.environ.get("OPENAI_API_NOSTREAM_MODELS", "")
 OPENAI_API_NOSTREAM_MODELS = (
     OPENAI_API_NOSTREAM_MODEL_LIST.split(",")
@@ -793,6 +920,19 @@ MODEL_FILTER_LIST = PersistentConfig(
     [model.strip() for model in MODEL_FILTER_LIST.split(";")],
 )
 
+MODEL_PRESET_CACHE_TTL = int(os.environ.get("MODEL_PRESET_CACHE_TTL", "60"))
+
+try:
+    MODEL_FALLBACKS = json.loads(os.environ.get("MODEL_FALLBACKS", "{}"))
+except Exception:
+    MODEL_FALLBACKS = {}
+
+MODEL_FALLBACKS = PersistentConfig(
+    "MODEL_FALLBACKS",
+    "model_fallbacks",
+    MODEL_FALLBACKS,
+)
+
 WEBHOOK_URL = PersistentConfig(
     "WEBHOOK_URL", "webhook_url", os.environ.get("WEBHOOK_URL", "")
 )
@@ -934,6 +1074,137 @@ TOOLS_FUNCTION_CALLING_PROMPT_TEMPLATE = PersistentConfig(
     os.environ.get("TOOLS_FUNCTION_CALLING_PROMPT_TEMPLATE", ""),
 )
 
+# Identical title, emoji and search query generations share one upstream call
+# and are replayed for this many seconds
+TASK_CACHE_TTL = int(os.environ.get("TASK_CACHE_TTL", "300"))
+TASK_CACHE_MAX_SIZE = int(os.environ.get("TASK_CACHE_MAX_SIZE", "1000"))
+
+# Seconds the server side MoA waits for proposals before synthesizing
+MOA_FAN_OUT_DEADLINE = float(os.environ.get("MOA_FAN_OUT_DEADLINE", "60"))
+
+####################################
+# RESUMABLE GENERATIONS
+####################################
+
+ENABLE_RESUMABLE_GENERATIONS = PersistentConfig(
+    "ENABLE_RESUMABLE_GENERATIONS",
+    "generation.resumable.enable",
+    os.environ.get("ENABLE_RESUMABLE_GENERATIONS", "False").lower() == "true",
+)
+
+# "memory" or "redis", redis lets clients reattach through any worker
+GENERATION_BUFFER_BACKEND = os.environ.get("GENERATION_BUFFER_BACKEND", "memory")
+GENERATION_BUFFER_REDIS_URL = os.environ.get(
+    "GENERATION_BUFFER_REDIS_URL", WEBSOCKET_REDIS_URL
+)
+# Streamed chunks kept per generation, older chunks are dropped first
+GENERATION_BUFFER_MAX_CHUNKS = int(
+    os.environ.get("GENERATION_BUFFER_MAX_CHUNKS", "10000")
+)
+# Seconds a buffer is kept around for reattaching
+GENERATION_BUFFER_TTL = int(os.environ.get("GENERATION_BUFFER_TTL", "600"))
+
+####################################
+# STREAM COALESCING
+####################################
+
+# Chunks of outgoing streams arriving within this many milliseconds are sent
+# in one write, 0 forwards every chunk as is
+STREAM_COALESCE_WINDOW_MS = int(os.environ.get("STREAM_COALESCE_WINDOW_MS", "0"))
+STREAM_COALESCE_MAX_BYTES = int(os.environ.get("STREAM_COALESCE_MAX_BYTES", "4096"))
+# Read ahead for slow clients, the upstream is paused beyond this
+STREAM_COALESCE_MAX_BUFFER_BYTES = int(
+    os.environ.get("STREAM_COALESCE_MAX_BUFFER_BYTES", "65536")
+)
+
+####################################
+# RESPONSE CACHE
+####################################
+
+ENABLE_RESPONSE_CACHE = PersistentConfig(
+    "ENABLE_RESPONSE_CACHE",
+    "response_cache.enable",
+    os.environ.get("ENABLE_RESPONSE_CACHE", "False").lower() == "true",
+)
+
+RESPONSE_CACHE_MODELS = os.environ.get("RESPONSE_CACHE_MODELS", "")
+RESPONSE_CACHE_MODELS = PersistentConfig(
+    "RESPONSE_CACHE_MODELS",
+    "response_cache.models",
+    [model.strip() for model in RESPONSE_CACHE_MODELS.split(";") if model.strip()],
+)
+
+RESPONSE_CACHE_TTL = PersistentConfig(
+    "RESPONSE_CACHE_TTL",
+    "response_cache.ttl",
+    int(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+)
+
+# "memory" or "redis"
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_REDIS_URL = os.environ.get(
+    "RESPONSE_CACHE_REDIS_URL", WEBSOCKET_REDIS_URL
+)
+RESPONSE_CACHE_MAX_SIZE = int(os.environ.get("RESPONSE_CACHE_MAX_SIZE", "1000"))
+
+ENABLE_SEMANTIC_CACHE = PersistentConfig(
+    "ENABLE_SEMANTIC_CACHE",
+    "semantic_cache.enable",
+    os.environ.get("ENABLE_SEMANTIC_CACHE", "False").lower() == "true",
+)
+
+SEMANTIC_CACHE_MODELS = os.environ.get("SEMANTIC_CACHE_MODELS", "")
+SEMANTIC_CACHE_MODELS = PersistentConfig(
+    "SEMANTIC_CACHE_MODELS",
+    "semantic_cache.models",
+    [model.strip() for model in SEMANTIC_CACHE_MODELS.split(";") if model.strip()],
+)
+
+SEMANTIC_CACHE_THRESHOLD = PersistentConfig(
+    "SEMANTIC_CACHE_THRESHOLD",
+    "semantic_cache.threshold",
+    float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+)
+
+SEMANTIC_CACHE_TTL = PersistentConfig(
+    "SEMANTIC_CACHE_TTL",
+    "semantic_cache.ttl",
+    int(os.environ.get("SEMANTIC_CACHE_TTL", "86400")),
+)
+
+SEMANTIC_CACHE_MAX_ENTRIES = PersistentConfig(
+    "SEMANTIC_CACHE_MAX_ENTRIES",
+    "semantic_cache.max_entries",
+    int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "1000")),
+)
+
+####################################
+# RATE LIMIT
+####################################
+
+ENABLE_RATE_LIMIT = PersistentConfig(
+    "ENABLE_RATE_LIMIT",
+    "rate_limit.enable",
+    os.environ.get("ENABLE_RATE_LIMIT", "False").lower() == "true",
+)
+
+# Requests (rpm) and tokens (tpm) per minute, per role and per model and role:
+# {"roles": {"user": {"rpm": 20, "tpm": 40000}}, "models": {"gpt-4o": {"user": {"rpm": 5}}}}
+try:
+    RATE_LIMITS = json.loads(os.environ.get("RATE_LIMITS", "{}"))
+except Exception:
+    RATE_LIMITS = {}
+
+RATE_LIMITS = PersistentConfig(
+    "RATE_LIMITS",
+    "rate_limit.limits",
+    RATE_LIMITS,
+)
+
+# "memory" or "redis"
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", WEBSOCKET_REDIS_URL)
+
 ####################################
 # Vector Database
 ####################################
@@ -992,6 +1263,13 @@ RAG_RELEVANCE_THRESHOLD = PersistentConfig(
     float(os.environ.get("RAG_RELEVANCE_THRESHOLD", "0.0")),
 )
 
+# Collections are searched in parallel on a shared pool of this many threads,
+# each gets RAG_COLLECTION_QUERY_TIMEOUT seconds from when its search starts
+RAG_QUERY_CONCURRENCY = int(os.environ.get("RAG_QUERY_CONCURRENCY", "8"))
+RAG_COLLECTION_QUERY_TIMEOUT = float(
+    os.environ.get("RAG_COLLECTION_QUERY_TIMEOUT", "10")
+)
+
 ENABLE_RAG_HYBRID_SEARCH = PersistentConfig(
     "ENABLE_RAG_HYBRID_SEARCH",
     "rag.enable_hybrid_search",
@@ -1057,6 +1335,30 @@ RAG_EMBEDDING_OPENAI_BATCH_SIZE = PersistentConfig(
     os.environ.get("RAG_EMBEDDING_OPENAI_BATCH_SIZE", 1),
 )
 
+# Document chunks are embedded and inserted this many at a time, remote
+# engines (ollama, openai) embed RAG_EMBEDDING_CONCURRENCY batches ahead of
+# the inserts. Requests in flight are bounded per backend across ingestions,
+# by OLLAMA_EMBEDDING_CONCURRENCY for Ollama and this for OpenAI
+RAG_EMBEDDING_INSERT_BATCH_SIZE = int(
+    os.environ.get("RAG_EMBEDDING_INSERT_BATCH_SIZE", "128")
+)
+RAG_EMBEDDING_CONCURRENCY = int(os.environ.get("RAG_EMBEDDING_CONCURRENCY", "4"))
+
+# Embeddings of every engine are cached on disk by model and text, with the
+# most recent ones in memory as well
+ENABLE_EMBEDDING_CACHE = (
+    os.environ.get("ENABLE_EMBEDDING_CACHE", "True").lower() == "true"
+)
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", f"{CACHE_DIR}/embeddings.db"
+)
+EMBEDDING_CACHE_MEMORY_SIZE = int(
+    os.environ.get("EMBEDDING_CACHE_MEMORY_SIZE", "10000")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(
+    os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000")
+)
+
 RAG_RERANKING_MODEL = PersistentConfig(
     "RAG_RERANKING_MODEL",
     "rag.reranking_model",
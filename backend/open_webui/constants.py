@@ -66,6 +66,9 @@ class ERROR_MESSAGES(str, Enum):
     PANDOC_NOT_INSTALLED = "服务器上未安装 Pandoc。请联系您的管理员寻求帮助。"
     INCORRECT_FORMAT = lambda err="": f"格式无效。请使用正确的格式{err}"
     RATE_LIMIT_EXCEEDED = "API 速率限制已超出"
+    BACKENDS_BUSY = "所有上游服务繁忙，请稍后再试。"
+    BACKENDS_UNAVAILABLE = "所有上游服务暂时不可用，请稍后再试。"
+    GENERATION_EXPIRED = "生成内容已过期，无法从该位置继续。"
 
     MODEL_NOT_FOUND = lambda name="": f"找不到模型 '{name}'"
     OPENAI_NOT_FOUND = lambda name="": "未找到 OpenAI API"
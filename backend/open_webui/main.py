@@ -2,6 +2,7 @@ import base64
 import inspect
 import json
 import logging
+import math
 import mimetypes
 import os
 import shutil
@@ -11,7 +12,7 @@ import uuid
 import asyncio
 
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Any, Optional
 
 import aiohttp
 import requests
@@ -33,11 +34,15 @@ from open_webui.apps.ollama.main import (
     generate_openai_chat_completion as generate_ollama_openai_chat_completion,
 )
 from open_webui.apps.ollama.main import get_all_models as get_ollama_models
+from open_webui.apps.ollama.main import probe_backends as probe_ollama_backends
+from open_webui.apps.ollama.main import keep_models_warm as keep_ollama_models_warm
+from open_webui.apps.ollama.main import poll_residency as poll_ollama_residency
 from open_webui.apps.openai.main import app as openai_app
 from open_webui.apps.openai.main import (
     generate_chat_completion as generate_openai_chat_completion,
 )
 from open_webui.apps.openai.main import get_all_models as get_openai_models
+from open_webui.apps.openai.main import probe_backends as probe_openai_backends
 from open_webui.apps.rag.main import app as rag_app
 from open_webui.apps.rag.utils import get_rag_context, rag_template
 from open_webui.apps.socket.main import app as socket_app, periodic_usage_pool_cleanup
@@ -49,6 +54,7 @@ from open_webui.apps.webui.main import (
     get_pipe_models,
 )
 from open_webui.apps.webui.models.auths import Auths
+from open_webui.apps.webui.models.chats import Chats
 from open_webui.apps.webui.models.functions import Functions
 from open_webui.apps.webui.models.models import Models
 from open_webui.apps.webui.models.users import (
@@ -64,6 +70,8 @@ from authlib.oidc.core import UserInfo
 
 
 from open_webui.config import (
+    BACKEND_HEALTH_PROBE_INTERVAL,
+    OLLAMA_RESIDENCY_POLL_INTERVAL,
     CACHE_DIR,
     CORS_ALLOW_ORIGIN,
     DEFAULT_LOCALE,
@@ -76,6 +84,30 @@ from open_webui.config import (
     ENV,
     FRONTEND_BUILD_DIR,
     MODEL_FILTER_LIST,
+    MODEL_FALLBACKS,
+    ENABLE_RESPONSE_CACHE,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_SIZE,
+    RESPONSE_CACHE_MODELS,
+    RESPONSE_CACHE_REDIS_URL,
+    RESPONSE_CACHE_TTL,
+    ENABLE_SEMANTIC_CACHE,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MODELS,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+    ENABLE_RATE_LIMIT,
+    RATE_LIMITS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_REDIS_URL,
+    ENABLE_RESUMABLE_GENERATIONS,
+    GENERATION_BUFFER_BACKEND,
+    GENERATION_BUFFER_MAX_CHUNKS,
+    GENERATION_BUFFER_REDIS_URL,
+    GENERATION_BUFFER_TTL,
+    STREAM_COALESCE_MAX_BUFFER_BYTES,
+    STREAM_COALESCE_MAX_BYTES,
+    STREAM_COALESCE_WINDOW_MS,
     OAUTH_MERGE_ACCOUNTS_BY_EMAIL,
     OAUTH_PROVIDERS,
     ENABLE_SEARCH_QUERY,
@@ -83,6 +115,9 @@ from open_webui.config import (
     STATIC_DIR,
     TASK_MODEL,
     TASK_MODEL_EXTERNAL,
+    TASK_CACHE_MAX_SIZE,
+    TASK_CACHE_TTL,
+    MOA_FAN_OUT_DEADLINE,
     TITLE_GENERATION_PROMPT_TEMPLATE,
     TOOLS_FUNCTION_CALLING_PROMPT_TEMPLATE,
     WEBHOOK_URL,
@@ -137,9 +172,12 @@ from starlette.responses import RedirectResponse, Response, StreamingResponse
 
 from open_webui.utils.security_headers import SecurityHeadersMiddleware
 
+from open_webui.utils.http_client import CLIENT_SESSIONS
+from open_webui.utils.metrics import METRICS
 from open_webui.utils.misc import (
     add_or_update_system_message,
     get_last_user_message,
+    openai_chat_completion_message_template,
     parse_duration,
     prepend_to_first_user_message_content,
 )
@@ -161,11 +199,38 @@ from open_webui.utils.utils import (
 )
 from open_webui.utils.webhook import post_webhook
 
-from open_webui.utils.payload import convert_payload_openai_to_ollama
+from open_webui.apps.openai.utils.streaming import convert_to_stream_data
+from open_webui.utils.payload import convert_payload_openai_to_ollama, get_model_preset
 from open_webui.utils.response import (
+    capture_streaming_response,
     convert_response_ollama_to_openai,
     convert_streaming_response_ollama_to_openai,
 )
+from open_webui.utils.response_cache import (
+    get_response_cache,
+    get_response_cache_key,
+    is_response_cacheable,
+)
+from open_webui.utils.task_cache import TaskCompletionCache
+from open_webui.utils.coalesce import coalesce_stream
+from open_webui.utils.generation import (
+    GenerationManager,
+    get_generation_buffer,
+    get_generation_key,
+)
+from open_webui.utils.disconnect import (
+    CancellableStreamingResponse,
+    DisconnectMiddleware,
+    close_iterator,
+)
+from open_webui.utils.semantic_cache import SEMANTIC_CACHE, get_semantic_cache_prompt
+from open_webui.utils.rate_limit import (
+    estimate_tokens,
+    get_rate_limiter,
+    get_rate_limits,
+    get_request_buckets,
+    get_usage_buckets,
+)
 
 if SAFE_MODE:
     print("SAFE MODE ENABLED")
@@ -204,14 +269,52 @@ https://github.com/open-webui/open-webui
 )
 
 
+async def periodic_backend_health_probe():
+    while True:
+        await asyncio.sleep(BACKEND_HEALTH_PROBE_INTERVAL)
+        try:
+            await asyncio.gather(probe_openai_backends(), probe_ollama_backends())
+        except Exception as e:
+            log.exception(f"Backend health probe failed: {e}")
+
+
+async def periodic_ollama_residency_poll():
+    while True:
+        try:
+            # Residency only steers traffic between several backends and
+            # tells keep-warm what is loaded, a single plain backend is left be
+            if app.state.config.ENABLE_OLLAMA_API and (
+                len(ollama_app.state.config.OLLAMA_BASE_URLS) > 1
+                or ollama_app.state.config.OLLAMA_KEEP_WARM_MODELS
+            ):
+                await poll_ollama_residency()
+                await keep_ollama_models_warm()
+        except Exception as e:
+            log.exception(f"Ollama residency poll failed: {e}")
+        await asyncio.sleep(OLLAMA_RESIDENCY_POLL_INTERVAL)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     run_migrations()
     await app_start()
 
+    CLIENT_SESSIONS.start(
+        [
+            *openai_app.state.config.OPENAI_API_BASE_URLS,
+            *ollama_app.state.config.OLLAMA_BASE_URLS,
+        ]
+    )
+
     asyncio.create_task(periodic_usage_pool_cleanup())
+    if BACKEND_HEALTH_PROBE_INTERVAL > 0:
+        asyncio.create_task(periodic_backend_health_probe())
+    if OLLAMA_RESIDENCY_POLL_INTERVAL > 0:
+        asyncio.create_task(periodic_ollama_residency_poll())
     yield
 
+    await CLIENT_SESSIONS.close()
+
 
 app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
 
@@ -222,6 +325,22 @@ app.state.config.ENABLE_OLLAMA_API = ENABLE_OLLAMA_API
 
 app.state.config.ENABLE_MODEL_FILTER = ENABLE_MODEL_FILTER
 app.state.config.MODEL_FILTER_LIST = MODEL_FILTER_LIST
+app.state.config.MODEL_FALLBACKS = MODEL_FALLBACKS
+
+app.state.config.ENABLE_RESPONSE_CACHE = ENABLE_RESPONSE_CACHE
+app.state.config.RESPONSE_CACHE_MODELS = RESPONSE_CACHE_MODELS
+app.state.config.RESPONSE_CACHE_TTL = RESPONSE_CACHE_TTL
+
+app.state.config.ENABLE_SEMANTIC_CACHE = ENABLE_SEMANTIC_CACHE
+app.state.config.SEMANTIC_CACHE_MODELS = SEMANTIC_CACHE_MODELS
+app.state.config.SEMANTIC_CACHE_THRESHOLD = SEMANTIC_CACHE_THRESHOLD
+app.state.config.SEMANTIC_CACHE_TTL = SEMANTIC_CACHE_TTL
+app.state.config.SEMANTIC_CACHE_MAX_ENTRIES = SEMANTIC_CACHE_MAX_ENTRIES
+
+app.state.config.ENABLE_RATE_LIMIT = ENABLE_RATE_LIMIT
+app.state.config.RATE_LIMITS = RATE_LIMITS
+
+app.state.config.ENABLE_RESUMABLE_GENERATIONS = ENABLE_RESUMABLE_GENERATIONS
 
 app.state.config.WEBHOOK_URL = WEBHOOK_URL
 app.state.config.ADMIN_URL = ADMIN_URL
@@ -246,6 +365,30 @@ change_background_random_image_url(app.state.config.BACKGROUND_RANDOM_IMAGE_URL)
 change_init_background_random_image_url(app.state.config.BACKGROUND_RANDOM_IMAGE_URL)
 app.state.MODELS = {}
 
+app.state.RESPONSE_CACHE = get_response_cache(
+    RESPONSE_CACHE_BACKEND,
+    ttl=app.state.config.RESPONSE_CACHE_TTL,
+    maxsize=RESPONSE_CACHE_MAX_SIZE,
+    redis_url=RESPONSE_CACHE_REDIS_URL,
+)
+
+app.state.TASK_CACHE = TaskCompletionCache(
+    ttl=TASK_CACHE_TTL, maxsize=TASK_CACHE_MAX_SIZE
+)
+
+app.state.RATE_LIMITER = get_rate_limiter(
+    RATE_LIMIT_BACKEND, redis_url=RATE_LIMIT_REDIS_URL
+)
+
+app.state.GENERATIONS = GenerationManager(
+    get_generation_buffer(
+        GENERATION_BUFFER_BACKEND,
+        max_chunks=GENERATION_BUFFER_MAX_CHUNKS,
+        ttl=GENERATION_BUFFER_TTL,
+        redis_url=GENERATION_BUFFER_REDIS_URL,
+    )
+)
+
 ##################################
 #
 # ChatCompletion Middleware
@@ -692,12 +835,25 @@ class ChatCompletionMiddleware(BaseHTTPMiddleware):
             for item in data_items:
                 yield wrap_item(json.dumps(item))
 
-            async for data in original_generator:
-                yield data
+            try:
+                async for data in original_generator:
+                    yield data
+            finally:
+                await close_iterator(original_generator)
+
+        body_iterator = stream_wrapper(response.body_iterator, data_items)
+        if STREAM_COALESCE_WINDOW_MS > 0:
+            body_iterator = coalesce_stream(
+                body_iterator,
+                window=STREAM_COALESCE_WINDOW_MS / 1000,
+                max_bytes=STREAM_COALESCE_MAX_BYTES,
+                max_buffer_bytes=STREAM_COALESCE_MAX_BUFFER_BYTES,
+            )
 
-        return StreamingResponse(
-            stream_wrapper(response.body_iterator, data_items),
+        return CancellableStreamingResponse(
+            body_iterator,
             headers=dict(response.headers),
+            background=response.background,
         )
 
     async def _receive(self, body: bytes):
@@ -889,6 +1045,13 @@ async def inspect_websocket(request: Request, call_next):
     return await call_next(request)
 
 
+# Outermost so the whole request is cancelled, tool calls and pipes included
+app.add_middleware(
+    DisconnectMiddleware,
+    paths=["/ollama/api/chat", "/chat/completions", "/api/task/"],
+)
+
+
 app.mount("/ws", socket_app)
 app.mount("/ollama", ollama_app)
 app.mount("/openai", openai_app)
@@ -1085,6 +1248,14 @@ async def get_models(user=Depends(get_verified_user)):
     return {"data": models}
 
 
+def is_model_allowed(model_id: str, user) -> bool:
+    return (
+        not app.state.config.ENABLE_MODEL_FILTER
+        or str(user.role) in ["admin", "vip", "svip"]
+        or model_id in app.state.config.MODEL_FILTER_LIST
+    )
+
+
 @app.post("/api/chat/completions")
 async def generate_chat_completions(form_data: dict, user=Depends(get_verified_user)):
     model_id = form_data["model"]
@@ -1095,30 +1266,347 @@ async def generate_chat_completions(form_data: dict, user=Depends(get_verified_u
             detail="Model not found",
         )
 
-    if app.state.config.ENABLE_MODEL_FILTER:
-        if (
-            str(user.role) not in ["admin", "vip", "svip"]
-            and model_id not in app.state.config.MODEL_FILTER_LIST
-        ):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Model not found",
+    if not is_model_allowed(model_id, user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Model not found",
+        )
+
+    # Answers templated with the user's details must not be shared
+    model_preset = get_model_preset(model_id)
+    system = model_preset.params.get("system") if model_preset else None
+    is_personalized = bool(system and "{{USER_" in system)
+    stream = form_data.get("stream", False)
+
+    response_cache_key = None
+    if (
+        app.state.config.ENABLE_RESPONSE_CACHE
+        and model_id in app.state.config.RESPONSE_CACHE_MODELS
+        and is_response_cacheable(form_data)
+    ):
+        response_cache_key = get_response_cache_key(
+            form_data, scope=user.id if is_personalized else None
+        )
+
+        response = await get_cached_chat_completion(response_cache_key, model_id)
+        if response is not None:
+            return get_cached_chat_completion_response(response, stream)
+
+    semantic_cache_prompt = None
+    if (
+        app.state.config.ENABLE_SEMANTIC_CACHE
+        and model_id in app.state.config.SEMANTIC_CACHE_MODELS
+        and not is_personalized
+    ):
+        semantic_cache_prompt = get_semantic_cache_prompt(form_data)
+        if semantic_cache_prompt:
+            response = await get_semantic_cached_chat_completion(
+                model_id, semantic_cache_prompt
+            )
+            if response is not None:
+                return get_cached_chat_completion_response(response, stream)
+
+    rate_limits = []
+    if app.state.config.ENABLE_RATE_LIMIT and user.role != "admin":
+        rate_limits = get_rate_limits(app.state.config.RATE_LIMITS, user.role, model_id)
+    estimated_tokens = estimate_tokens(form_data) if rate_limits else 0
+    if rate_limits:
+        await check_rate_limit(rate_limits, user.id, model_id, estimated_tokens)
+
+    response, answered_model_id = await generate_chat_completion_with_fallbacks(
+        form_data, user
+    )
+
+    # A fallback's answer must not be served later as the requested model's
+    if answered_model_id != model_id:
+        response_cache_key = None
+        semantic_cache_prompt = None
+
+    if response_cache_key or semantic_cache_prompt or rate_limits:
+
+        async def on_response(response: dict, finished: bool = True):
+            if rate_limits:
+                await settle_rate_limit(
+                    rate_limits, user.id, response, estimated_tokens
+                )
+            if finished and response_cache_key:
+                try:
+                    await app.state.RESPONSE_CACHE.set(response_cache_key, response)
+                except Exception as e:
+                    log.exception(f"Failed to store response in cache: {e}")
+            if finished and semantic_cache_prompt:
+                await store_semantic_cached_chat_completion(
+                    model_id, semantic_cache_prompt, response
+                )
+
+        if isinstance(response, StreamingResponse):
+            capture_streaming_response(response, model_id, on_response)
+        elif isinstance(response, dict) and response.get("choices"):
+            await on_response(response)
+
+    metadata = form_data.get("metadata") or {}
+    if (
+        app.state.config.ENABLE_RESUMABLE_GENERATIONS
+        and isinstance(response, StreamingResponse)
+        and metadata.get("chat_id")
+        and metadata.get("chat_id") != "local"
+        and metadata.get("message_id")
+    ):
+        return await start_resumable_generation(response, metadata, user)
+
+    return response
+
+
+async def start_resumable_generation(
+    response: StreamingResponse, metadata: dict, user
+) -> StreamingResponse:
+    # The generation runs on its own from here, the client only reads the
+    # buffer and can come back through /api/chat/completions/{chat_id}/{id}
+    chat_id, message_id = metadata["chat_id"], metadata["message_id"]
+    key = get_generation_key(chat_id, message_id)
+
+    async def on_complete(content: str):
+        if not content:
+            return
+        Chats.update_chat_message_content_by_id(chat_id, message_id, content)
+        if metadata.get("session_id"):
+            # Clients that lost the stream still get the whole answer
+            await get_event_emitter(metadata)(
+                {"type": "replace", "data": {"content": content}}
+            )
+
+    await app.state.GENERATIONS.start(key, user.id, response, on_complete)
+    return CancellableStreamingResponse(
+        app.state.GENERATIONS.read(key),
+        media_type="text/event-stream",
+        headers={"X-Generation-Id": key},
+    )
+
+
+async def get_generation_info(chat_id: str, message_id: str, user) -> dict:
+    info = await app.state.GENERATIONS.get_info(get_generation_key(chat_id, message_id))
+    if info is None or (info["user_id"] != user.id and user.role != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=ERROR_MESSAGES.NOT_FOUND,
+        )
+    return info
+
+
+@app.get("/api/chat/completions/{chat_id}/{message_id}")
+async def resume_chat_completion(
+    chat_id: str,
+    message_id: str,
+    offset: int = 0,
+    user=Depends(get_verified_user),
+):
+    info = await get_generation_info(chat_id, message_id, user)
+    if offset < info["start"]:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=ERROR_MESSAGES.GENERATION_EXPIRED,
+        )
+
+    METRICS.inc("generation_reattach_total")
+    return CancellableStreamingResponse(
+        app.state.GENERATIONS.read(get_generation_key(chat_id, message_id), offset),
+        media_type="text/event-stream",
+    )
+
+
+@app.get("/api/chat/completions/{chat_id}/{message_id}/status")
+async def get_chat_completion_status(
+    chat_id: str, message_id: str, user=Depends(get_verified_user)
+):
+    info = await get_generation_info(chat_id, message_id, user)
+    return {key: value for key, value in info.items() if key != "user_id"}
+
+
+@app.delete("/api/chat/completions/{chat_id}/{message_id}")
+async def cancel_chat_completion(
+    chat_id: str, message_id: str, user=Depends(get_verified_user)
+):
+    await get_generation_info(chat_id, message_id, user)
+    cancelled = app.state.GENERATIONS.cancel(get_generation_key(chat_id, message_id))
+    return {"status": cancelled}
+
+
+async def get_cached_chat_completion(key: str, model_id: str) -> Optional[dict]:
+    try:
+        response = await app.state.RESPONSE_CACHE.get(key)
+    except Exception as e:
+        log.exception(f"Failed to read response cache: {e}")
+        response = None
+
+    METRICS.inc(
+        "response_cache_requests_total",
+        model=model_id,
+        result="hit" if response is not None else "miss",
+    )
+    if response is not None:
+        log.info(f"Response cache hit for model: {model_id}")
+    return response
+
+
+async def get_semantic_cached_chat_completion(
+    model_id: str, prompt: str
+) -> Optional[dict]:
+    start_time = time.perf_counter()
+    try:
+        response = await asyncio.to_thread(
+            SEMANTIC_CACHE.lookup,
+            model_id,
+            prompt,
+            rag_app.state.EMBEDDING_FUNCTION,
+            rag_app.state.config.RAG_EMBEDDING_MODEL,
+            app.state.config.SEMANTIC_CACHE_THRESHOLD,
+            app.state.config.SEMANTIC_CACHE_TTL,
+        )
+    except Exception as e:
+        log.exception(f"Failed to read semantic cache: {e}")
+        response = None
+
+    METRICS.observe(
+        "semantic_cache_lookup_seconds",
+        time.perf_counter() - start_time,
+        model=model_id,
+    )
+    METRICS.inc(
+        "semantic_cache_requests_total",
+        model=model_id,
+        result="hit" if response is not None else "miss",
+    )
+    if response is not None:
+        log.info(f"Semantic cache hit for model: {model_id}")
+    return response
+
+
+async def store_semantic_cached_chat_completion(
+    model_id: str, prompt: str, response: dict
+):
+    try:
+        await asyncio.to_thread(
+            SEMANTIC_CACHE.store,
+            model_id,
+            prompt,
+            response,
+            rag_app.state.EMBEDDING_FUNCTION,
+            rag_app.state.config.RAG_EMBEDDING_MODEL,
+            app.state.config.SEMANTIC_CACHE_MAX_ENTRIES,
+            app.state.config.SEMANTIC_CACHE_TTL,
+        )
+    except Exception as e:
+        log.exception(f"Failed to store response in semantic cache: {e}")
+
+
+async def check_rate_limit(
+    rate_limits: list[tuple[str, dict]], user_id: str, model_id: str, tokens: int
+):
+    try:
+        retry_after = await app.state.RATE_LIMITER.acquire(
+            get_request_buckets(rate_limits, user_id, tokens)
+        )
+    except Exception as e:
+        # A broken limiter backend must not take the chat down with it
+        log.exception(f"Failed to check rate limit: {e}")
+        return
+
+    if retry_after > 0:
+        METRICS.inc("rate_limit_rejections_total", model=model_id)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=ERROR_MESSAGES.RATE_LIMIT_EXCEEDED,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+async def settle_rate_limit(
+    rate_limits: list[tuple[str, dict]],
+    user_id: str,
+    response: dict,
+    estimated_tokens: int,
+):
+    # Charges the difference between the estimate taken up front and the real
+    # usage, falling back to an estimate of the answer when none is reported
+    usage = response.get("usage") or {}
+    tokens = usage.get("total_tokens")
+    if tokens is None:
+        content = response["choices"][0].get("message", {}).get("content") or ""
+        tokens = estimated_tokens + len(content) // 4
+    buckets = get_usage_buckets(rate_limits, user_id, tokens - estimated_tokens)
+    if not buckets:
+        return
+
+    try:
+        await app.state.RATE_LIMITER.acquire(buckets, force=True)
+    except Exception as e:
+        log.exception(f"Failed to settle rate limit: {e}")
+
+
+def get_cached_chat_completion_response(response: dict, stream: bool):
+    if stream:
+        return StreamingResponse(
+            iter(convert_to_stream_data(response)),
+            media_type="text/event-stream",
+        )
+    return response
+
+
+async def generate_chat_completion_with_fallbacks(
+    form_data: dict, user
+) -> tuple[Any, str]:
+    # Returns the response and the id of the model that answered
+    model_id = form_data["model"]
+
+    # Upstream failures move on to the next model of the admin configured
+    # chain, skipping those the user couldn't select directly
+    model_ids = [model_id] + [
+        fallback_id
+        for fallback_id in app.state.config.MODEL_FALLBACKS.get(model_id, [])
+        if fallback_id in app.state.MODELS
+        and fallback_id != model_id
+        and is_model_allowed(fallback_id, user)
+    ]
+
+    for idx, current_model_id in enumerate(model_ids):
+        try:
+            response = await generate_model_chat_completion(
+                {**form_data, "model": current_model_id}, user
             )
+            return response, current_model_id
+        except HTTPException as e:
+            if idx == len(model_ids) - 1 or e.status_code not in [
+                429,
+                500,
+                502,
+                503,
+                504,
+            ]:
+                raise
+            log.warning(
+                f"Model {current_model_id} failed ({e.status_code}: {e.detail}), "
+                f"falling back to {model_ids[idx + 1]}"
+            )
+
 
+async def generate_model_chat_completion(form_data: dict, user):
+    model_id = form_data["model"]
     model = app.state.MODELS[model_id]
     if model.get("pipe"):
         log.info(f"Using pipeline for model: {model_id}")
         return await generate_function_chat_completion(form_data, user=user)
     if model["owned_by"] == "ollama":
         # Using /ollama/api/chat endpoint
+        metadata = form_data.get("metadata")
         form_data = convert_payload_openai_to_ollama(form_data)
-        form_data = GenerateChatCompletionForm(**form_data)
+        form_data = GenerateChatCompletionForm(**form_data, metadata=metadata)
         response = await generate_ollama_chat_completion(form_data=form_data, user=user)
         if form_data.stream:
             response.headers["content-type"] = "text/event-stream"
-            return StreamingResponse(
+            return CancellableStreamingResponse(
                 convert_streaming_response_ollama_to_openai(response),
                 headers=dict(response.headers),
+                background=response.background,
             )
         else:
             return convert_response_ollama_to_openai(response)
@@ -1126,6 +1614,8 @@ async def generate_chat_completions(form_data: dict, user=Depends(get_verified_u
         try:
             await filter_message(form_data, user)
             return await generate_openai_chat_completion(form_data, user=user)
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=503, detail=str(e))
 
@@ -1495,10 +1985,37 @@ async def update_task_config(form_data: TaskConfigForm, user=Depends(get_admin_u
     }
 
 
-@app.post("/api/task/title/completions")
-async def generate_title(form_data: dict, user=Depends(get_verified_user)):
-    print("generate_title")
+async def generate_task_completion(payload: dict, user):
+    log.debug(payload)
 
+    # Handle pipeline filters
+    try:
+        payload = filter_pipeline(payload, user)
+    except Exception as e:
+        if len(e.args) > 1:
+            return JSONResponse(
+                status_code=e.args[0],
+                content={"detail": e.args[1]},
+            )
+        else:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": str(e)},
+            )
+    if "chat_id" in payload:
+        del payload["chat_id"]
+
+    # The templated prompt already carries whatever user details it uses, so
+    # identical payloads get identical answers
+    task = payload["metadata"]["task"]
+    return await app.state.TASK_CACHE.run(
+        get_response_cache_key(payload, scope=task),
+        task,
+        lambda: generate_chat_completions(form_data=payload, user=user),
+    )
+
+
+def get_title_generation_payload(form_data: dict, user) -> dict:
     original_model_id = form_data["model"]
 
     # Check if the user has a custom task model
@@ -1567,31 +2084,19 @@ Prompt: {{prompt:middletruncate:8000}}"""
         "metadata": {"task": str(TASKS.TITLE_GENERATION)},
         **token_args,
     }
-    log.debug(payload)
 
-    # Handle pipeline filters
-    try:
-        payload = filter_pipeline(payload, user)
-    except Exception as e:
-        if len(e.args) > 1:
-            return JSONResponse(
-                status_code=e.args[0],
-                content={"detail": e.args[1]},
-            )
-        else:
-            return JSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={"detail": str(e)},
-            )
-    if "chat_id" in payload:
-        del payload["chat_id"]
+    return payload
 
-    return await generate_chat_completions(form_data=payload, user=user)
 
+@app.post("/api/task/title/completions")
+async def generate_title(form_data: dict, user=Depends(get_verified_user)):
+    print("generate_title")
 
-@app.post("/api/task/query/completions")
-async def generate_search_query(form_data: dict, user=Depends(get_verified_user)):
-    print("generate_search_query")
+    payload = get_title_generation_payload(form_data, user)
+    return await generate_task_completion(payload, user)
+
+
+def get_search_query_generation_payload(form_data: dict, user) -> dict:
     if not app.state.config.ENABLE_SEARCH_QUERY:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1644,32 +2149,19 @@ Search Query:"""
         ),
         "metadata": {"task": str(TASKS.QUERY_GENERATION)},
     }
-    log.debug(payload)
 
-    # Handle pipeline filters
-    try:
-        payload = filter_pipeline(payload, user)
-    except Exception as e:
-        if len(e.args) > 1:
-            return JSONResponse(
-                status_code=e.args[0],
-                content={"detail": e.args[1]},
-            )
-        else:
-            return JSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={"detail": str(e)},
-            )
-    if "chat_id" in payload:
-        del payload["chat_id"]
+    return payload
 
-    return await generate_chat_completions(form_data=payload, user=user)
 
+@app.post("/api/task/query/completions")
+async def generate_search_query(form_data: dict, user=Depends(get_verified_user)):
+    print("generate_search_query")
 
-@app.post("/api/task/emoji/completions")
-async def generate_emoji(form_data: dict, user=Depends(get_verified_user)):
-    print("generate_emoji")
+    payload = get_search_query_generation_payload(form_data, user)
+    return await generate_task_completion(payload, user)
 
+
+def get_emoji_generation_payload(form_data: dict, user) -> dict:
     model_id = form_data["model"]
     if model_id not in app.state.MODELS:
         raise HTTPException(
@@ -1712,26 +2204,114 @@ Message: """{{prompt}}"""
         "chat_id": form_data.get("chat_id", None),
         "metadata": {"task": str(TASKS.EMOJI_GENERATION)},
     }
-    log.debug(payload)
 
-    # Handle pipeline filters
+    return payload
+
+
+@app.post("/api/task/emoji/completions")
+async def generate_emoji(form_data: dict, user=Depends(get_verified_user)):
+    print("generate_emoji")
+
+    payload = get_emoji_generation_payload(form_data, user)
+    return await generate_task_completion(payload, user)
+
+
+TASK_PAYLOADS = {
+    "title": get_title_generation_payload,
+    "query": get_search_query_generation_payload,
+    "emoji": get_emoji_generation_payload,
+}
+
+
+@app.post("/api/task/batch/completions")
+async def generate_task_batch(form_data: dict, user=Depends(get_verified_user)):
+    """
+    Answers several tasks for the same chat with one task model call. Takes
+    what the single task endpoints take plus "tasks" (e.g. ["title", "emoji"])
+    and returns one completion per task, as the single endpoints would.
+    """
+    tasks = [task for task in form_data.get("tasks", []) if task in TASK_PAYLOADS]
+    if not tasks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected tasks from {list(TASK_PAYLOADS.keys())}",
+        )
+
+    payloads = {task: TASK_PAYLOADS[task](form_data, user) for task in tasks}
+    task_model_id = payloads[tasks[0]]["model"]
+
+    response = None
+    if len(tasks) > 1 and all(
+        payload["model"] == task_model_id for payload in payloads.values()
+    ):
+        response = await generate_task_completion(
+            get_task_batch_payload(task_model_id, payloads, form_data), user
+        )
+
+    results = parse_task_batch_response(response, tasks, task_model_id)
+    if results is None:
+        # The model didn't follow the batch format, fall back to one call each
+        log.info(f"Falling back to separate task calls for {tasks}")
+        responses = await asyncio.gather(
+            *[generate_task_completion(payloads[task], user) for task in tasks]
+        )
+        results = {
+            task: response
+            for task, response in zip(tasks, responses)
+            if isinstance(response, dict)
+        }
+    return {"results": results}
+
+
+def get_task_batch_payload(task_model_id: str, payloads: dict, form_data: dict):
+    prompts = "\n\n".join(
+        f'### Task "{task}"\n{payload["messages"][0]["content"]}'
+        for task, payload in payloads.items()
+    )
+    content = (
+        "Complete every task below. Respond ONLY with a JSON object that has "
+        f"one key per task ({', '.join(payloads.keys())}) and that task's "
+        f"answer as a string value.\n\n{prompts}"
+    )
+    max_tokens = 20 * len(payloads) + sum(
+        payload.get("max_completion_tokens") or payload.get("max_tokens") or 0
+        for payload in payloads.values()
+    )
+
+    return {
+        "model": task_model_id,
+        "messages": [{"role": "user", "content": content}],
+        "stream": False,
+        **(
+            {"max_tokens": max_tokens}
+            if app.state.MODELS[task_model_id]["owned_by"] == "ollama"
+            else {
+                "max_completion_tokens": max_tokens,
+            }
+        ),
+        "chat_id": form_data.get("chat_id", None),
+        "metadata": {"task": "batch:" + ",".join(payloads.keys())},
+    }
+
+
+def parse_task_batch_response(
+    response, tasks: list[str], task_model_id: str
+) -> Optional[dict]:
+    if not isinstance(response, dict) or not response.get("choices"):
+        return None
+
+    content = response["choices"][0].get("message", {}).get("content") or ""
     try:
-        payload = filter_pipeline(payload, user)
-    except Exception as e:
-        if len(e.args) > 1:
-            return JSONResponse(
-                status_code=e.args[0],
-                content={"detail": e.args[1]},
-            )
-        else:
-            return JSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={"detail": str(e)},
-            )
-    if "chat_id" in payload:
-        del payload["chat_id"]
+        answers = json.loads(content[content.index("{") : content.rindex("}") + 1])
+    except ValueError:
+        return None
+    if not isinstance(answers, dict) or not all(task in answers for task in tasks):
+        return None
 
-    return await generate_chat_completions(form_data=payload, user=user)
+    return {
+        task: openai_chat_completion_message_template(task_model_id, str(answers[task]))
+        for task in tasks
+    }
 
 
 @app.post("/api/task/moa/completions")
@@ -1752,6 +2332,13 @@ async def generate_moa_response(form_data: dict, user=Depends(get_verified_user)
 
     model = app.state.MODELS[task_model_id]
 
+    if "responses" not in form_data and form_data.get("models"):
+        # Server side MoA, gather the proposals here instead of on the client
+        form_data = {
+            **form_data,
+            "responses": await generate_moa_proposals(form_data, user),
+        }
+
     template = """You have been provided with a set of responses from various models to the latest user query: "{{prompt}}"
 
 Your task is to synthesize these responses into a single, high-quality response. It is crucial to critically evaluate the information provided in these responses, recognizing that some of it may be biased or incorrect. Your response should not simply replicate the given answers but should offer a refined, accurate, and comprehensive reply to the instruction. Ensure your response is well-structured, coherent, and adheres to the highest standards of accuracy and reliability.
@@ -1795,6 +2382,114 @@ Responses from models: {{responses}}"""
     return await generate_chat_completions(form_data=payload, user=user)
 
 
+async def generate_moa_proposals(form_data: dict, user) -> list[str]:
+    """
+    Asks every model in form_data["models"] concurrently and returns their
+    answers once a quorum (all of them by default) is in or the deadline
+    passes, whichever comes first. Stragglers are cancelled.
+    """
+    model_ids = [
+        model_id for model_id in form_data["models"] if model_id in app.state.MODELS
+    ]
+    if not model_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Model not found",
+        )
+
+    messages = form_data.get("messages") or [
+        {"role": "user", "content": form_data["prompt"]}
+    ]
+    quorum = min(form_data.get("quorum") or len(model_ids), len(model_ids))
+    try:
+        fan_out_timeout = float(form_data.get("deadline") or MOA_FAN_OUT_DEADLINE)
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid deadline",
+        )
+    # Capped so a single request can't hold every proposer open
+    if not 0 < fan_out_timeout < MOA_FAN_OUT_DEADLINE:
+        fan_out_timeout = MOA_FAN_OUT_DEADLINE
+    deadline = time.monotonic() + fan_out_timeout
+
+    __event_emitter__ = None
+    if all(form_data.get(key) for key in ["chat_id", "id", "session_id"]):
+        __event_emitter__ = get_event_emitter(
+            {
+                "chat_id": form_data["chat_id"],
+                "message_id": form_data["id"],
+                "session_id": form_data["session_id"],
+            }
+        )
+
+    async def emit_status(description: str, done: bool = False):
+        if __event_emitter__:
+            await __event_emitter__(
+                {"type": "status", "data": {"description": description, "done": done}}
+            )
+
+    async def generate_proposal(model_id: str) -> str:
+        response = await generate_chat_completions(
+            form_data={
+                "model": model_id,
+                "messages": messages,
+                "stream": False,
+                "metadata": {"task": str(TASKS.MOA_RESPONSE_GENERATION)},
+            },
+            user=user,
+        )
+        if isinstance(response, dict):
+            return response["choices"][0]["message"]["content"]
+        if isinstance(response, str):
+            return response
+        raise Exception(f"Unexpected response from {model_id}")
+
+    tasks = {
+        asyncio.create_task(generate_proposal(model_id)): model_id
+        for model_id in model_ids
+    }
+    await emit_status(f"Asking {len(model_ids)} models")
+
+    proposals = {}
+    pending = set(tasks)
+    try:
+        while pending and len(proposals) < quorum:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                model_id = tasks[task]
+                try:
+                    proposals[model_id] = task.result()
+                except Exception as e:
+                    log.warning(f"MoA proposal from {model_id} failed: {e}")
+                    await emit_status(f"{model_id} failed")
+                    continue
+                await emit_status(
+                    f"{model_id} responded ({len(proposals)}/{quorum})",
+                )
+    finally:
+        for task in pending:
+            task.cancel()
+
+    METRICS.inc("moa_proposals_total", len(proposals), result="received")
+    METRICS.inc("moa_proposals_total", len(pending), result="cancelled")
+    if not proposals:
+        await emit_status("No model responded", done=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=ERROR_MESSAGES.BACKENDS_UNAVAILABLE,
+        )
+
+    await emit_status(f"Synthesizing {len(proposals)} responses", done=True)
+    return [proposals[model_id] for model_id in model_ids if model_id in proposals]
+
+
 ##################################
 #
 # Pipelines Endpoints
@@ -2235,6 +2930,202 @@ async def update_model_filter_config(
     }
 
 
+@app.get("/api/metrics")
+async def get_metrics(user=Depends(get_admin_user)):
+    return METRICS.model_dump()
+
+
+@app.get("/api/config/response_cache")
+async def get_response_cache_config(user=Depends(get_admin_user)):
+    hits = METRICS.sum_counters("response_cache_requests_total", result="hit")
+    misses = METRICS.sum_counters("response_cache_requests_total", result="miss")
+    return {
+        "enabled": app.state.config.ENABLE_RESPONSE_CACHE,
+        "models": app.state.config.RESPONSE_CACHE_MODELS,
+        "ttl": app.state.config.RESPONSE_CACHE_TTL,
+        "backend": RESPONSE_CACHE_BACKEND,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else None,
+    }
+
+
+class ResponseCacheConfigForm(BaseModel):
+    enabled: bool
+    models: list[str]
+    ttl: int
+
+
+@app.post("/api/config/response_cache")
+async def update_response_cache_config(
+    form_data: ResponseCacheConfigForm, user=Depends(get_admin_user)
+):
+    app.state.config.ENABLE_RESPONSE_CACHE = form_data.enabled
+    app.state.config.RESPONSE_CACHE_MODELS = form_data.models
+
+    if form_data.ttl != app.state.config.RESPONSE_CACHE_TTL:
+        app.state.config.RESPONSE_CACHE_TTL = form_data.ttl
+        app.state.RESPONSE_CACHE = get_response_cache(
+            RESPONSE_CACHE_BACKEND,
+            ttl=form_data.ttl,
+            maxsize=RESPONSE_CACHE_MAX_SIZE,
+            redis_url=RESPONSE_CACHE_REDIS_URL,
+        )
+
+    return await get_response_cache_config(user)
+
+
+@app.post("/api/config/response_cache/clear")
+async def clear_response_cache(user=Depends(get_admin_user)):
+    await app.state.RESPONSE_CACHE.clear()
+    return {"status": True}
+
+
+@app.get("/api/config/semantic_cache")
+async def get_semantic_cache_config(user=Depends(get_admin_user)):
+    hits = METRICS.sum_counters("semantic_cache_requests_total", result="hit")
+    misses = METRICS.sum_counters("semantic_cache_requests_total", result="miss")
+    return {
+        "enabled": app.state.config.ENABLE_SEMANTIC_CACHE,
+        "models": app.state.config.SEMANTIC_CACHE_MODELS,
+        "threshold": app.state.config.SEMANTIC_CACHE_THRESHOLD,
+        "ttl": app.state.config.SEMANTIC_CACHE_TTL,
+        "max_entries": app.state.config.SEMANTIC_CACHE_MAX_ENTRIES,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else None,
+    }
+
+
+class SemanticCacheConfigForm(BaseModel):
+    enabled: bool
+    models: list[str]
+    threshold: float
+    ttl: int
+    max_entries: int
+
+
+@app.post("/api/config/semantic_cache")
+async def update_semantic_cache_config(
+    form_data: SemanticCacheConfigForm, user=Depends(get_admin_user)
+):
+    app.state.config.ENABLE_SEMANTIC_CACHE = form_data.enabled
+    app.state.config.SEMANTIC_CACHE_MODELS = form_data.models
+    app.state.config.SEMANTIC_CACHE_THRESHOLD = form_data.threshold
+    app.state.config.SEMANTIC_CACHE_TTL = form_data.ttl
+    app.state.config.SEMANTIC_CACHE_MAX_ENTRIES = form_data.max_entries
+    return await get_semantic_cache_config(user)
+
+
+@app.post("/api/config/semantic_cache/clear")
+async def clear_semantic_cache(user=Depends(get_admin_user)):
+    await asyncio.to_thread(
+        SEMANTIC_CACHE.clear,
+        list(app.state.MODELS.keys()),
+        rag_app.state.config.RAG_EMBEDDING_MODEL,
+    )
+    return {"status": True}
+
+
+@app.get("/api/config/resumable_generation")
+async def get_resumable_generation_config(user=Depends(get_admin_user)):
+    return {
+        "enabled": app.state.config.ENABLE_RESUMABLE_GENERATIONS,
+        "backend": GENERATION_BUFFER_BACKEND,
+        "running": len(app.state.GENERATIONS.tasks),
+    }
+
+
+class ResumableGenerationConfigForm(BaseModel):
+    enabled: bool
+
+
+@app.post("/api/config/resumable_generation")
+async def update_resumable_generation_config(
+    form_data: ResumableGenerationConfigForm, user=Depends(get_admin_user)
+):
+    app.state.config.ENABLE_RESUMABLE_GENERATIONS = form_data.enabled
+    return await get_resumable_generation_config(user)
+
+
+@app.get("/api/config/rate_limit")
+async def get_rate_limit_config(user=Depends(get_admin_user)):
+    return {
+        "enabled": app.state.config.ENABLE_RATE_LIMIT,
+        "limits": app.state.config.RATE_LIMITS,
+        "backend": RATE_LIMIT_BACKEND,
+        "rejections": METRICS.sum_counters("rate_limit_rejections_total"),
+    }
+
+
+class RateLimitConfigForm(BaseModel):
+    enabled: bool
+    limits: dict
+
+
+@app.post("/api/config/rate_limit")
+async def update_rate_limit_config(
+    form_data: RateLimitConfigForm, user=Depends(get_admin_user)
+):
+    app.state.config.ENABLE_RATE_LIMIT = form_data.enabled
+    app.state.config.RATE_LIMITS = form_data.limits
+    return await get_rate_limit_config(user)
+
+
+@app.get("/api/config/rate_limit/usage")
+async def get_rate_limit_usage(user=Depends(get_admin_user)):
+    # Only partially used buckets are listed
+    usage = await app.state.RATE_LIMITER.get_usage()
+
+    names = {}
+    data = []
+    for key, bucket in usage.items():
+        user_id, scope = key.split(":", 1)
+        scope, limit = scope.rsplit(":", 1)
+        if user_id not in names:
+            usage_user = Users.get_user_by_id(user_id)
+            names[user_id] = usage_user.name if usage_user else None
+        data.append(
+            {
+                "user_id": user_id,
+                "user": names[user_id],
+                "scope": scope,
+                "limit": limit,
+                **bucket,
+            }
+        )
+    return {"data": data}
+
+
+@app.post("/api/config/rate_limit/reset")
+async def reset_rate_limit_usage(user=Depends(get_admin_user)):
+    await app.state.RATE_LIMITER.reset()
+    return {"status": True}
+
+
+@app.get("/api/config/model/fallbacks")
+async def get_model_fallbacks_config(user=Depends(get_admin_user)):
+    return {
+        "fallbacks": app.state.config.MODEL_FALLBACKS,
+        "backends": {
+            "openai": openai_app.state.BALANCER.model_dump(),
+            "ollama": ollama_app.state.BALANCER.model_dump(),
+        },
+    }
+
+
+class ModelFallbacksConfigForm(BaseModel):
+    fallbacks: dict[str, list[str]]
+
+
+@app.post("/api/config/model/fallbacks")
+async def update_model_fallbacks_config(
+    form_data: ModelFallbacksConfigForm, user=Depends(get_admin_user)
+):
+    app.state.config.MODEL_FALLBACKS = form_data.fallbacks
+    return await get_model_fallbacks_config(user)
+
+
 # TODO: webhook endpoint should be under config endpoints
 
 
@@ -0,0 +1,189 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from open_webui.apps.rag import utils
+from open_webui.apps.rag.utils import get_rag_context, query_collection
+from open_webui.apps.rag.vector.main import SearchResult
+
+
+class CountingEmbeddingFunction:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+
+    def __call__(self, query):
+        self.calls.append(query)
+        if self.fail:
+            raise Exception("Embedding backend unavailable")
+        return [0.1, 0.2, 0.3]
+
+
+class MockVectorDBClient:
+    def __init__(self, collections: dict[str, list[tuple[float, str]]]):
+        self.collections = collections
+        self.searches = []
+
+    def search(self, collection_name: str, vectors: list, limit: int):
+        self.searches.append((collection_name, vectors[0]))
+        if collection_name not in self.collections:
+            raise Exception(f"Collection {collection_name} not found")
+        items = sorted(self.collections[collection_name])[:limit]
+        return SearchResult(
+            ids=[[f"{collection_name}-{i}" for i in range(len(items))]],
+            distances=[[distance for distance, _ in items]],
+            documents=[[document for _, document in items]],
+            metadatas=[[{"name": collection_name} for _ in items]],
+        )
+
+
+@pytest.fixture
+def vector_db(monkeypatch):
+    client = MockVectorDBClient(
+        {
+            "a": [(0.1, "a1"), (0.4, "a2")],
+            "b": [(0.2, "b1"), (0.3, "b2")],
+        }
+    )
+    monkeypatch.setattr(utils, "VECTOR_DB_CLIENT", client)
+    return client
+
+
+def test_query_collection_embeds_once(vector_db):
+    embedding_function = CountingEmbeddingFunction()
+    result = query_collection(["a", "b"], "query", embedding_function, k=3)
+
+    assert embedding_function.calls == ["query"]
+    assert sorted(vector_db.searches) == [
+        ("a", [0.1, 0.2, 0.3]),
+        ("b", [0.1, 0.2, 0.3]),
+    ]
+    assert result["documents"] == [["a1", "b1", "b2"]]
+    assert result["distances"] == [[0.1, 0.2, 0.3]]
+
+
+def test_query_collection_uses_given_embedding(vector_db):
+    embedding_function = CountingEmbeddingFunction()
+    query_collection(
+        ["a"], "query", embedding_function, k=3, query_embedding=[1.0, 0.0, 0.0]
+    )
+
+    assert embedding_function.calls == []
+    assert vector_db.searches == [("a", [1.0, 0.0, 0.0])]
+
+
+def test_query_collection_embedding_failure_finds_nothing(vector_db):
+    embedding_function = CountingEmbeddingFunction(fail=True)
+    result = query_collection(["a", "b"], "query", embedding_function, k=3)
+
+    assert result == {
+        "distances": [[]],
+        "documents": [[]],
+        "metadatas": [[]],
+        "failed_collections": ["a", "b"],
+    }
+    assert vector_db.searches == []
+
+
+def test_query_collection_skips_failed_collections(vector_db):
+    result = query_collection(
+        ["a", "missing"], "query", CountingEmbeddingFunction(), k=3
+    )
+    assert result["documents"] == [["a1", "a2"]]
+    assert result["failed_collections"] == ["missing"]
+
+
+@pytest.fixture
+def single_query_thread(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(utils, "QUERY_EXECUTOR", executor)
+    monkeypatch.setattr(utils, "RAG_QUERY_CONCURRENCY", 1)
+    yield
+    executor.shutdown(wait=False)
+
+
+def test_query_timeout_starts_with_the_search(monkeypatch, single_query_thread):
+    monkeypatch.setattr(utils, "RAG_COLLECTION_QUERY_TIMEOUT", 0.2)
+
+    def search(collection_name):
+        time.sleep(0.1)
+        return collection_name
+
+    # Run one after the other, the last starts after the first timeout is up
+    results, failed = utils.query_collections_in_parallel(
+        ["a", "b", "c"], search, "vector"
+    )
+    assert results == ["a", "b", "c"]
+    assert failed == []
+
+
+def test_queued_collections_dropped_behind_hung_search(
+    monkeypatch, single_query_thread
+):
+    monkeypatch.setattr(utils, "RAG_COLLECTION_QUERY_TIMEOUT", 0.1)
+    release = threading.Event()
+
+    def search(collection_name):
+        if collection_name == "hung":
+            release.wait(5)
+        return collection_name
+
+    start = time.monotonic()
+    try:
+        results, failed = utils.query_collections_in_parallel(
+            ["hung", "a", "b"], search, "vector"
+        )
+    finally:
+        release.set()
+    # Bounded by a timeout per wave of searches, not by the hung search
+    assert time.monotonic() - start < 1
+    assert results == []
+    assert failed == ["hung", "a", "b"]
+
+
+def test_query_timeout_reports_slow_collections(monkeypatch):
+    monkeypatch.setattr(utils, "RAG_COLLECTION_QUERY_TIMEOUT", 0.1)
+    release = threading.Event()
+
+    def search(collection_name):
+        if collection_name == "slow":
+            release.wait(5)
+        return collection_name
+
+    try:
+        results, failed = utils.query_collections_in_parallel(
+            ["a", "slow", "b"], search, "vector"
+        )
+    finally:
+        release.set()
+    assert results == ["a", "b"]
+    assert failed == ["slow"]
+
+
+def test_get_rag_context_embeds_once_per_request(vector_db):
+    embedding_function = CountingEmbeddingFunction()
+    files = [
+        {"type": "collection", "collection_names": ["a"]},
+        {"type": "doc", "collection_name": "b"},
+    ]
+    messages = [{"role": "user", "content": "query"}]
+
+    contexts, citations = get_rag_context(
+        files,
+        messages,
+        embedding_function,
+        k=2,
+        reranking_function=None,
+        r=0.0,
+        hybrid_search=False,
+    )
+
+    assert embedding_function.calls == ["query"]
+    assert sorted(collection for collection, _ in vector_db.searches) == ["a", "b"]
+    assert len(contexts) == 2
+    assert [citation["document"] for citation in citations] == [
+        ["a1", "a2"],
+        ["b1", "b2"],
+    ]
@@ -0,0 +1,132 @@
+import time
+
+from open_webui.utils.balancer import BackendBalancer
+
+
+class TestBackendBalancer:
+    def setup_method(self):
+        self.balancer = BackendBalancer(failure_threshold=2, recovery_timeout=0.1)
+
+    def test_round_robin(self):
+        picks = [self.balancer.select([0, 1, 2], key="model") for _ in range(6)]
+        assert picks == [0, 1, 2, 0, 1, 2]
+
+    def test_round_robin_per_key(self):
+        assert self.balancer.select([0, 1], key="a") == 0
+        assert self.balancer.select([0, 1], key="b") == 0
+        assert self.balancer.select([0, 1], key="a") == 1
+
+    def test_least_outstanding(self):
+        self.balancer.acquire(0)
+        self.balancer.acquire(0)
+        self.balancer.acquire(1)
+        assert self.balancer.select([0, 1, 2], strategy="least_outstanding") == 2
+
+        self.balancer.release(0)
+        self.balancer.release(0)
+        assert self.balancer.select([0, 1], strategy="least_outstanding") == 0
+
+    def test_latency_ewma(self):
+        self.balancer.observe_latency(0, 1.0)
+        self.balancer.observe_latency(1, 0.2)
+        assert self.balancer.select([0, 1], strategy="latency_ewma") == 1
+
+        # Unmeasured backends are tried first
+        assert self.balancer.select([0, 1, 2], strategy="latency_ewma") == 2
+
+        self.balancer.observe_latency(0, 0.0)
+        assert self.balancer.get_stats(0).latency_ewma == 0.7
+
+    def test_weighted(self):
+        picks = {
+            self.balancer.select([0, 1], strategy="weighted", weights=[0, 1])
+            for _ in range(20)
+        }
+        assert picks == {1}
+
+    def test_max_concurrency(self):
+        self.balancer.acquire(0)
+        assert self.balancer.select([0, 1], max_concurrency=[1, 1]) == 1
+
+        self.balancer.acquire(1)
+        assert self.balancer.select([0, 1], max_concurrency=[1, 1]) is None
+
+        # Unset or non positive caps don't limit
+        assert self.balancer.select([0, 1], max_concurrency=[1, 0]) == 1
+        assert self.balancer.select([0, 1], max_concurrency=[None]) is not None
+
+    def test_release_never_goes_negative(self):
+        self.balancer.release(0)
+        assert self.balancer.get_stats(0).in_flight == 0
+
+    def test_circuit_opens_after_threshold(self):
+        self.balancer.record_failure(0, Exception("boom"))
+        assert self.balancer.get_stats(0).state == "closed"
+        assert self.balancer.is_healthy(0)
+
+        self.balancer.record_failure(0, Exception("boom"))
+        stats = self.balancer.get_stats(0)
+        assert stats.state == "open"
+        assert stats.last_error == "boom"
+        assert not self.balancer.is_healthy(0)
+        assert self.balancer.get_healthy([0, 1]) == [1]
+        assert self.balancer.select([0, 1]) == 1
+
+    def test_success_resets_failures(self):
+        self.balancer.record_failure(0)
+        self.balancer.record_success(0)
+        self.balancer.record_failure(0)
+        assert self.balancer.get_stats(0).state == "closed"
+        assert self.balancer.get_stats(0).total_failures == 2
+
+    def test_half_open_allows_a_single_trial(self):
+        self.balancer.record_failure(0)
+        self.balancer.record_failure(0)
+        time.sleep(0.15)
+
+        assert self.balancer.is_healthy(0)
+        assert self.balancer.get_stats(0).state == "half_open"
+
+        # The trial is taken without acquire(), later requests still wait
+        assert self.balancer.select([0]) == 0
+        assert self.balancer.select([0]) is None
+        assert self.balancer.select([0, 1]) == 1
+
+    def test_half_open_trial_success_closes(self):
+        self.balancer.record_failure(0)
+        self.balancer.record_failure(0)
+        time.sleep(0.15)
+
+        assert self.balancer.select([0]) == 0
+        self.balancer.record_success(0)
+        assert self.balancer.get_stats(0).state == "closed"
+        assert self.balancer.select([0]) == 0
+        assert self.balancer.select([0]) == 0
+
+    def test_half_open_trial_failure_reopens(self):
+        self.balancer.record_failure(0)
+        self.balancer.record_failure(0)
+        time.sleep(0.15)
+
+        assert self.balancer.select([0]) == 0
+        self.balancer.record_failure(0)
+        assert self.balancer.get_stats(0).state == "open"
+        assert not self.balancer.is_healthy(0)
+
+    def test_half_open_trial_expires(self):
+        self.balancer.record_failure(0)
+        self.balancer.record_failure(0)
+        time.sleep(0.15)
+
+        # A trial that never reports back doesn't block the backend forever
+        assert self.balancer.select([0]) == 0
+        assert self.balancer.select([0]) is None
+        time.sleep(0.15)
+        assert self.balancer.select([0]) == 0
+
+    def test_model_dump(self):
+        self.balancer.acquire(3)
+        dump = self.balancer.model_dump()
+        assert dump[3]["in_flight"] == 1
+        assert dump[3]["requests"] == 1
+        assert dump[3]["state"] == "closed"
@@ -0,0 +1,188 @@
+import asyncio
+
+from starlette.background import BackgroundTask
+
+from open_webui.utils.disconnect import (
+    CancellableStreamingResponse,
+    DisconnectMiddleware,
+    close_iterator,
+)
+from open_webui.utils.metrics import METRICS
+
+SCOPE = {
+    "type": "http",
+    "method": "POST",
+    "path": "/api/chat/completions",
+    "headers": [],
+}
+
+
+def get_receive(disconnect_after: float):
+    # The request body, then the client leaving after a while
+    messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+def get_send(sent: list):
+    async def send(message):
+        sent.append(message)
+
+    return send
+
+
+class TestCloseIterator:
+    def test_runs_finally_of_async_generator(self):
+        closed = []
+
+        async def generate():
+            try:
+                while True:
+                    yield b"data"
+            finally:
+                closed.append(True)
+
+        async def run():
+            iterator = generate()
+            await iterator.__anext__()
+            await close_iterator(iterator)
+
+        asyncio.run(run())
+        assert closed == [True]
+
+    def test_ignores_plain_iterables(self):
+        asyncio.run(close_iterator([b"data"]))
+
+
+class TestCancellableStreamingResponse:
+    def test_closes_generator_on_disconnect(self):
+        closed = []
+        cleaned_up = []
+
+        async def generate():
+            try:
+                while True:
+                    yield b"data: {}\n\n"
+                    await asyncio.sleep(0.01)
+            finally:
+                closed.append(True)
+
+        async def cleanup():
+            cleaned_up.append(True)
+
+        async def run():
+            response = CancellableStreamingResponse(
+                generate(), background=BackgroundTask(cleanup)
+            )
+            sent = []
+            await asyncio.wait_for(
+                response(SCOPE, get_receive(0.05), get_send(sent)), timeout=2
+            )
+            return sent
+
+        sent = asyncio.run(run())
+        assert sent[0]["type"] == "http.response.start"
+        assert closed == [True]
+        assert cleaned_up == [True]
+
+    def test_finished_stream_runs_background_once(self):
+        cleaned_up = []
+
+        async def generate():
+            yield b"data: [DONE]\n\n"
+
+        async def cleanup():
+            cleaned_up.append(True)
+
+        async def run():
+            response = CancellableStreamingResponse(
+                generate(), background=BackgroundTask(cleanup)
+            )
+            sent = []
+            await asyncio.wait_for(
+                response(SCOPE, get_receive(10), get_send(sent)), timeout=2
+            )
+            return sent
+
+        sent = asyncio.run(run())
+        assert sent[-1] == {
+            "type": "http.response.body",
+            "body": b"",
+            "more_body": False,
+        }
+        assert cleaned_up == [True]
+
+
+class TestDisconnectMiddleware:
+    def test_cancels_app_when_client_leaves(self):
+        cancelled = []
+
+        async def app(scope, receive, send):
+            await receive()
+            try:
+                # Waiting on a tool call or the upstream
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        middleware = DisconnectMiddleware(app, paths=["/api/chat/completions"])
+        disconnects = METRICS.get_counter("request_disconnects_total")
+
+        asyncio.run(
+            asyncio.wait_for(middleware(SCOPE, get_receive(0.05), get_send([])), 2)
+        )
+        assert cancelled == [True]
+        assert METRICS.get_counter("request_disconnects_total") == disconnects + 1
+
+    def test_app_is_told_about_the_disconnect(self):
+        received = []
+
+        async def app(scope, receive, send):
+            await receive()
+            received.append(await receive())
+
+        middleware = DisconnectMiddleware(app, paths=["/api/chat/completions"])
+        asyncio.run(
+            asyncio.wait_for(middleware(SCOPE, get_receive(0.05), get_send([])), 2)
+        )
+        assert received == [{"type": "http.disconnect"}]
+
+    def test_finished_response_is_not_cancelled(self):
+        async def app(scope, receive, send):
+            await receive()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        middleware = DisconnectMiddleware(app, paths=["/api/chat/completions"])
+        disconnects = METRICS.get_counter("request_disconnects_total")
+        sent = []
+
+        asyncio.run(
+            asyncio.wait_for(middleware(SCOPE, get_receive(0), get_send(sent)), 2)
+        )
+        assert [message["type"] for message in sent] == [
+            "http.response.start",
+            "http.response.body",
+        ]
+        assert METRICS.get_counter("request_disconnects_total") == disconnects
+
+    def test_other_paths_are_not_watched(self):
+        async def app(scope, receive, send):
+            await receive()
+            await asyncio.sleep(0.1)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+
+        middleware = DisconnectMiddleware(app, paths=["/api/chat/completions"])
+        sent = []
+
+        asyncio.run(
+            middleware({**SCOPE, "path": "/api/models"}, get_receive(0), get_send(sent))
+        )
+        assert sent[0]["status"] == 200
@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+from starlette.responses import StreamingResponse
+
+from open_webui.utils.generation import (
+    GenerationManager,
+    MemoryGenerationBuffer,
+    get_sse_content,
+)
+
+
+def get_chunk(content: str) -> str:
+    return f"data: {json.dumps({'choices': [{'delta': {'content': content}}]})}\n\n"
+
+
+async def collect(iterator) -> list[str]:
+    return [chunk async for chunk in iterator]
+
+
+class TestMemoryGenerationBuffer:
+    def test_read_from_offset(self):
+        async def run():
+            buffer = MemoryGenerationBuffer(max_chunks=10, ttl=60)
+            await buffer.create("chat:message", "user")
+            for chunk in ["a", "b", "c"]:
+                await buffer.append("chat:message", chunk)
+            await buffer.finish("chat:message")
+
+            assert await collect(buffer.read("chat:message", 0)) == ["a", "b", "c"]
+            assert await collect(buffer.read("chat:message", 2)) == ["c"]
+            assert await collect(buffer.read("chat:message", 3)) == []
+
+        asyncio.run(run())
+
+    def test_dropped_chunks_move_start(self):
+        async def run():
+            buffer = MemoryGenerationBuffer(max_chunks=2, ttl=60)
+            await buffer.create("chat:message", "user")
+            for chunk in ["a", "b", "c", "d"]:
+                await buffer.append("chat:message", chunk)
+
+            info = await buffer.get_info("chat:message")
+            assert info == {"user_id": "user", "start": 2, "offset": 4, "done": False}
+
+            # Resuming from before start is answered with 410 by the endpoint,
+            # a reader that fell behind carries on from what is left
+            await buffer.finish("chat:message")
+            assert await collect(buffer.read("chat:message", 0)) == ["c", "d"]
+
+        asyncio.run(run())
+
+    def test_read_waits_for_new_chunks(self):
+        async def run():
+            buffer = MemoryGenerationBuffer(max_chunks=10, ttl=60)
+            await buffer.create("chat:message", "user")
+            await buffer.append("chat:message", "a")
+
+            reader = asyncio.create_task(collect(buffer.read("chat:message", 0)))
+            await asyncio.sleep(0.01)
+            assert not reader.done()
+
+            await buffer.append("chat:message", "b")
+            await buffer.finish("chat:message")
+            assert await asyncio.wait_for(reader, 1) == ["a", "b"]
+
+        asyncio.run(run())
+
+    def test_expired(self):
+        async def run():
+            buffer = MemoryGenerationBuffer(max_chunks=10, ttl=0)
+            await buffer.create("chat:message", "user")
+            assert await buffer.get_info("chat:message") is None
+            assert await buffer.get_info("unknown") is None
+
+        asyncio.run(run())
+
+
+class TestGenerationManager:
+    def test_runs_to_completion_without_readers(self):
+        completed = []
+
+        async def generate():
+            for content in ["Hel", "lo"]:
+                yield get_chunk(content).encode()
+            yield b"data: [DONE]\n\n"
+
+        async def on_complete(content: str):
+            completed.append(content)
+
+        async def run():
+            manager = GenerationManager(MemoryGenerationBuffer(100, 60))
+            await manager.start(
+                "chat:message", "user", StreamingResponse(generate()), on_complete
+            )
+            await asyncio.wait_for(manager.tasks["chat:message"], 1)
+
+            info = await manager.get_info("chat:message")
+            assert info["offset"] == 3
+            assert info["done"]
+            assert not info["running"]
+
+            chunks = await collect(manager.read("chat:message", 1))
+            assert chunks == [get_chunk("lo"), "data: [DONE]\n\n"]
+
+        asyncio.run(run())
+        assert completed == ["Hello"]
+
+    def test_multi_byte_character_split_across_chunks(self):
+        completed = []
+        chunk = {"choices": [{"delta": {"content": "你好"}}]}
+        data = f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+        split = data.index("好".encode("utf-8")) + 1
+
+        async def generate():
+            yield data[:split]
+            yield data[split:]
+
+        async def on_complete(content: str):
+            completed.append(content)
+
+        async def run():
+            manager = GenerationManager(MemoryGenerationBuffer(100, 60))
+            await manager.start(
+                "chat:message", "user", StreamingResponse(generate()), on_complete
+            )
+            await asyncio.wait_for(manager.tasks["chat:message"], 1)
+
+            chunks = await collect(manager.read("chat:message", 0))
+            assert "".join(chunks) == data.decode("utf-8")
+
+        asyncio.run(run())
+        assert completed == ["你好"]
+
+    def test_cancel(self):
+        completed = []
+
+        async def generate():
+            yield get_chunk("Hel").encode()
+            await asyncio.sleep(10)
+            yield get_chunk("lo").encode()
+
+        async def on_complete(content: str):
+            completed.append(content)
+
+        async def run():
+            manager = GenerationManager(MemoryGenerationBuffer(100, 60))
+            await manager.start(
+                "chat:message", "user", StreamingResponse(generate()), on_complete
+            )
+            await asyncio.sleep(0.01)
+            task = manager.tasks["chat:message"]
+            assert manager.cancel("chat:message")
+            await asyncio.gather(task, return_exceptions=True)
+
+            info = await manager.get_info("chat:message")
+            assert info["done"]
+            assert not manager.cancel("chat:message")
+
+        asyncio.run(run())
+        # Cancelled generations don't save a partial answer
+        assert completed == []
+
+
+def test_get_sse_content():
+    lines = (get_chunk("a") + "data: [DONE]\n" + get_chunk("b")).split("\n")
+    assert get_sse_content(lines) == "ab"
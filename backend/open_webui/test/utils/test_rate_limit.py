@@ -0,0 +1,182 @@
+import asyncio
+import time
+
+import docker
+import pytest
+from pytest_docker.plugin import get_docker_ip
+
+from open_webui.utils import rate_limit
+from open_webui.utils.rate_limit import (
+    RATE_LIMIT_WINDOW,
+    Bucket,
+    MemoryRateLimiter,
+    RedisRateLimiter,
+    get_rate_limits,
+    get_request_buckets,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class AbstractRateLimiterTest:
+    def create_limiter(self):
+        raise NotImplementedError
+
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.patch = pytest.MonkeyPatch()
+        self.patch.setattr(rate_limit, "time", self.clock)
+        # One loop per test, the Redis client is bound to the loop it runs on
+        self.loop = asyncio.new_event_loop()
+        self.limiter = self.create_limiter()
+        self.loop.run_until_complete(self.limiter.reset())
+
+    def teardown_method(self):
+        self.loop.close()
+        self.patch.undo()
+
+    def acquire(self, buckets: dict, force: bool = False) -> float:
+        return self.loop.run_until_complete(self.limiter.acquire(buckets, force=force))
+
+    def get_usage(self) -> dict:
+        return self.loop.run_until_complete(self.limiter.get_usage())
+
+    def get_remaining(self, key: str, capacity: float) -> float:
+        usage = self.get_usage()
+        return usage[key]["remaining"] if key in usage else capacity
+
+    def test_allows_up_to_capacity(self):
+        for _ in range(3):
+            assert self.acquire({"u:all:rpm": Bucket(3, 1)}) == 0
+
+        wait = self.acquire({"u:all:rpm": Bucket(3, 1)})
+        assert wait == pytest.approx(RATE_LIMIT_WINDOW / 3)
+
+    def test_refills_over_time(self):
+        for _ in range(3):
+            self.acquire({"u:all:rpm": Bucket(3, 1)})
+        assert self.acquire({"u:all:rpm": Bucket(3, 1)}) > 0
+
+        self.clock.now += RATE_LIMIT_WINDOW / 3
+        assert self.acquire({"u:all:rpm": Bucket(3, 1)}) == 0
+        assert self.acquire({"u:all:rpm": Bucket(3, 1)}) > 0
+
+    def test_charges_all_buckets_or_none(self):
+        assert self.acquire({"u:all:tpm": Bucket(100, 90)}) == 0
+
+        wait = self.acquire({"u:all:rpm": Bucket(10, 1), "u:all:tpm": Bucket(100, 50)})
+        assert wait == pytest.approx(40 * RATE_LIMIT_WINDOW / 100)
+        assert self.get_remaining("u:all:rpm", 10) == pytest.approx(10)
+        assert self.get_remaining("u:all:tpm", 100) == pytest.approx(10)
+
+    def test_forced_charge_goes_into_debt(self):
+        self.acquire({"u:all:tpm": Bucket(100, 80)})
+        assert self.acquire({"u:all:tpm": Bucket(100, 100)}, force=True) == 0
+        assert self.get_remaining("u:all:tpm", 100) == pytest.approx(-80)
+
+        # Debt is bounded by one bucket's worth
+        self.acquire({"u:all:tpm": Bucket(100, 100)}, force=True)
+        assert self.get_remaining("u:all:tpm", 100) == pytest.approx(-100)
+        assert self.acquire({"u:all:tpm": Bucket(100, 1)}) > RATE_LIMIT_WINDOW
+
+    def test_forced_refund(self):
+        self.acquire({"u:all:tpm": Bucket(100, 50)})
+        self.acquire({"u:all:tpm": Bucket(100, -30)}, force=True)
+        assert self.get_remaining("u:all:tpm", 100) == pytest.approx(80)
+
+        # Refunds never overfill the bucket
+        self.acquire({"u:all:tpm": Bucket(100, -500)}, force=True)
+        assert self.get_remaining("u:all:tpm", 100) == pytest.approx(100)
+
+    def test_oversized_request_passes_on_full_bucket(self):
+        assert self.acquire({"u:all:tpm": Bucket(100, 500)}) == 0
+        assert self.acquire({"u:all:tpm": Bucket(100, 500)}) > 0
+
+    def test_usage_skips_full_buckets(self):
+        self.acquire({"u:all:rpm": Bucket(10, 1)})
+        assert self.get_usage() == {
+            "u:all:rpm": {"remaining": pytest.approx(9), "capacity": 10}
+        }
+
+        self.clock.now += RATE_LIMIT_WINDOW
+        assert self.get_usage() == {}
+
+
+class TestMemoryRateLimiter(AbstractRateLimiterTest):
+    def create_limiter(self):
+        return MemoryRateLimiter()
+
+
+class TestRedisRateLimiter(AbstractRateLimiterTest):
+    DOCKER_CONTAINER_NAME = "redis-test-container-will-get-deleted"
+    docker_client = None
+
+    @classmethod
+    def setup_class(cls):
+        cls.docker_client = docker.from_env()
+        cls.docker_client.containers.run(
+            "redis:7",
+            detach=True,
+            name=cls.DOCKER_CONTAINER_NAME,
+            ports={6379: ("0.0.0.0", 8082)},
+        )
+        cls.redis_url = f"redis://{get_docker_ip()}:8082/0"
+
+        async def ping():
+            limiter = RedisRateLimiter(cls.redis_url)
+            try:
+                await limiter.redis.ping()
+            finally:
+                await limiter.redis.aclose()
+
+        for _ in range(10):
+            try:
+                asyncio.run(ping())
+                return
+            except Exception:
+                time.sleep(1)
+        cls.teardown_class()
+        pytest.fail("Could not connect to Redis")
+
+    @classmethod
+    def teardown_class(cls):
+        cls.docker_client.containers.get(cls.DOCKER_CONTAINER_NAME).remove(force=True)
+
+    def create_limiter(self):
+        return RedisRateLimiter(self.redis_url)
+
+    def teardown_method(self):
+        self.loop.run_until_complete(self.limiter.redis.aclose())
+        super().teardown_method()
+
+
+def test_get_rate_limits():
+    rate_limits = {
+        "roles": {"user": {"rpm": 20, "tpm": 40000}},
+        "models": {"gpt-4o": {"user": {"rpm": 5}}},
+    }
+    assert get_rate_limits(rate_limits, "user", "gpt-4o") == [
+        ("all", {"rpm": 20, "tpm": 40000}),
+        ("gpt-4o", {"rpm": 5}),
+    ]
+    assert get_rate_limits(rate_limits, "user", "llama3") == [
+        ("all", {"rpm": 20, "tpm": 40000}),
+    ]
+    assert get_rate_limits(rate_limits, "pending", "gpt-4o") == []
+
+
+def test_get_request_buckets():
+    buckets = get_request_buckets(
+        [("all", {"rpm": 20, "tpm": 40000}), ("gpt-4o", {"rpm": 5})], "u", 100
+    )
+    assert {key: (b.capacity, b.cost) for key, b in buckets.items()} == {
+        "u:all:rpm": (20, 1),
+        "u:all:tpm": (40000, 100),
+        "u:gpt-4o:rpm": (5, 1),
+    }
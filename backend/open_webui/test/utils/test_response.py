@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from starlette.responses import StreamingResponse
+
+from open_webui.utils.response import capture_streaming_response
+
+
+def get_chunk(content: str, finish_reason=None) -> bytes:
+    chunk = {
+        "choices": [{"delta": {"content": content}, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def generate(chunks: list[bytes]):
+    for chunk in chunks:
+        yield chunk
+
+
+def capture(chunks: list[bytes]) -> tuple[list[bytes], list]:
+    completions = []
+
+    async def on_complete(completion: dict, finished: bool):
+        completions.append((completion, finished))
+
+    async def run():
+        response = StreamingResponse(generate(chunks))
+        capture_streaming_response(response, "model", on_complete)
+        return [chunk async for chunk in response.body_iterator]
+
+    return asyncio.run(run()), completions
+
+
+def test_rebuilds_completion():
+    chunks = [get_chunk("Hello"), get_chunk(" world", "stop"), b"data: [DONE]\n\n"]
+    sent, completions = capture(chunks)
+
+    assert sent == chunks
+    [(completion, finished)] = completions
+    assert completion["choices"][0]["message"]["content"] == "Hello world"
+    assert finished
+
+
+def test_multi_byte_character_split_across_chunks():
+    data = get_chunk("你好 👋", "stop") + b"data: [DONE]\n\n"
+    split = data.index("好".encode("utf-8")) + 1
+    chunks = [data[:split], data[split:]]
+    sent, completions = capture(chunks)
+
+    assert sent == chunks
+    [(completion, finished)] = completions
+    assert completion["choices"][0]["message"]["content"] == "你好 👋"
+    assert finished
+
+
+def test_unfinished_stream():
+    sent, completions = capture([get_chunk("Hel")])
+
+    [(completion, finished)] = completions
+    assert completion["choices"][0]["message"]["content"] == "Hel"
+    assert not finished
@@ -0,0 +1,211 @@
+import itertools
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from open_webui.config import (
+    BACKEND_CIRCUIT_FAILURE_THRESHOLD,
+    BACKEND_CIRCUIT_RECOVERY_TIMEOUT,
+)
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+ROUTING_STRATEGIES = ["round_robin", "least_outstanding", "latency_ewma", "weighted"]
+
+
+class BackendStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.requests = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_used_at: Optional[float] = None
+
+        # Circuit breaker: closed -> open after repeated failures,
+        # open -> half_open after the recovery timeout, then one trial request
+        self.state = "closed"
+        self.failures = 0
+        self.total_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        # Set while the half-open trial request hasn't reported back
+        self.trial_started_at: Optional[float] = None
+
+    def model_dump(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "latency_ewma": self.latency_ewma,
+            "last_used_at": self.last_used_at,
+            "state": self.state,
+            "failures": self.failures,
+            "total_failures": self.total_failures,
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+            "trial_started_at": self.trial_started_at,
+        }
+
+
+class BackendBalancer:
+    """
+    Picks one backend index out of the set of backends serving a model and
+    tracks in-flight requests, latency and health per backend index.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        failure_threshold: int = BACKEND_CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: int = BACKEND_CIRCUIT_RECOVERY_TIMEOUT,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.stats: dict[int, BackendStats] = {}
+        self.counters: dict[str, itertools.count] = {}
+        # Requests also report from worker threads (embeddings, batches)
+        self.lock = threading.RLock()
+
+    def get_stats(self, idx: int) -> BackendStats:
+        with self.lock:
+            if idx not in self.stats:
+                self.stats[idx] = BackendStats()
+            return self.stats[idx]
+
+    def is_healthy(self, idx: int) -> bool:
+        with self.lock:
+            stats = self.get_stats(idx)
+            if stats.state == "open":
+                if time.time() - stats.opened_at < self.recovery_timeout:
+                    return False
+                stats.state = "half_open"
+                stats.trial_started_at = None
+            if stats.state == "half_open":
+                # Only let a single trial request through until it reports back,
+                # a trial that never does is given up after the recovery timeout
+                return (
+                    stats.trial_started_at is None
+                    or time.time() - stats.trial_started_at >= self.recovery_timeout
+                )
+            return True
+
+    def get_healthy(self, candidates: list[int]) -> list[int]:
+        with self.lock:
+            return [idx for idx in candidates if self.is_healthy(idx)]
+
+    def record_success(self, idx: int):
+        with self.lock:
+            stats = self.get_stats(idx)
+            if stats.state != "closed":
+                log.info(f"Backend {idx} recovered, closing circuit")
+            stats.state = "closed"
+            stats.failures = 0
+            stats.trial_started_at = None
+
+    def record_failure(self, idx: int, error: Optional[Exception] = None):
+        with self.lock:
+            stats = self.get_stats(idx)
+            stats.failures += 1
+            stats.total_failures += 1
+            stats.last_error = str(error) if error else None
+
+            if stats.state == "half_open" or (
+                stats.state == "closed" and stats.failures >= self.failure_threshold
+            ):
+                log.warning(f"Backend {idx} is unhealthy, opening circuit: {error}")
+                stats.state = "open"
+                stats.opened_at = time.time()
+                stats.trial_started_at = None
+
+    def select(
+        self,
+        candidates: list[int],
+        strategy: str = "round_robin",
+        weights: Optional[list[int]] = None,
+        max_concurrency: Optional[list[int]] = None,
+        key: str = "",
+    ) -> Optional[int]:
+        """
+        Returns the chosen backend index, or None when every healthy candidate
+        is at its concurrency cap.
+        """
+        with self.lock:
+            idx = self.choose(candidates, strategy, weights, max_concurrency, key)
+            if idx is not None and self.get_stats(idx).state == "half_open":
+                self.get_stats(idx).trial_started_at = time.time()
+            return idx
+
+    def choose(
+        self,
+        candidates: list[int],
+        strategy: str,
+        weights: Optional[list[int]],
+        max_concurrency: Optional[list[int]],
+        key: str,
+    ) -> Optional[int]:
+
+        def get_setting(values, idx, default):
+            if values and idx < len(values) and values[idx] is not None:
+                return values[idx]
+            return default
+
+        available = [
+            idx
+            for idx in self.get_healthy(candidates)
+            if get_setting(max_concurrency, idx, 0) <= 0
+            or self.get_stats(idx).in_flight < get_setting(max_concurrency, idx, 0)
+        ]
+        if not available:
+            return None
+        if len(available) == 1:
+            return available[0]
+
+        if strategy == "least_outstanding":
+            return min(available, key=lambda idx: self.get_stats(idx).in_flight)
+
+        if strategy == "latency_ewma":
+            # Unmeasured backends score 0 so they get sampled at least once
+            return min(
+                available,
+                key=lambda idx: (self.get_stats(idx).latency_ewma or 0)
+                * (self.get_stats(idx).in_flight + 1),
+            )
+
+        if strategy == "weighted":
+            backend_weights = [
+                max(get_setting(weights, idx, 1), 0) for idx in available
+            ]
+            if sum(backend_weights) > 0:
+                return random.choices(available, weights=backend_weights)[0]
+
+        counter = self.counters.setdefault(key, itertools.count())
+        return available[next(counter) % len(available)]
+
+    def acquire(self, idx: int):
+        with self.lock:
+            stats = self.get_stats(idx)
+            stats.in_flight += 1
+            stats.requests += 1
+            stats.last_used_at = time.time()
+
+    def release(self, idx: int):
+        with self.lock:
+            stats = self.get_stats(idx)
+            stats.in_flight = max(stats.in_flight - 1, 0)
+
+    def observe_latency(self, idx: int, latency: float):
+        with self.lock:
+            stats = self.get_stats(idx)
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma = (
+                    self.alpha * latency + (1 - self.alpha) * stats.latency_ewma
+                )
+
+    def model_dump(self) -> dict:
+        with self.lock:
+            return {idx: stats.model_dump() for idx, stats in self.stats.items()}
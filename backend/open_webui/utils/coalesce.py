@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Union
+
+from open_webui.utils.disconnect import close_iterator
+from open_webui.utils.metrics import METRICS
+
+
+def has_content(data: bytes) -> bool:
+    # Cheap check for a non empty "content" field in OpenAI or Ollama chunks
+    start = 0
+    while (idx := data.find(b'"content":', start)) != -1:
+        start = idx + len(b'"content":')
+        while start < len(data) and data[start] in b" \t":
+            start += 1
+        if not data.startswith((b'""', b"null"), start):
+            return True
+    return False
+
+
+async def coalesce_stream(
+    iterator: AsyncIterator[Union[str, bytes]],
+    window: float,
+    max_bytes: int,
+    max_buffer_bytes: int,
+) -> AsyncGenerator[bytes, None]:
+    """
+    Merges chunks that arrive within window seconds of each other into one
+    write of at most max_bytes, bigger chunks are split. Everything up to the
+    first chunk with content goes out right away so time to first token is
+    unchanged.
+
+    The upstream is read ahead of the client, and a slow client gets whatever
+    piled up since its last write in one go. Reading stops once
+    max_buffer_bytes are waiting, which passes the backpressure upstream.
+    """
+    loop = asyncio.get_running_loop()
+    pending: deque[bytes] = deque()
+    size = 0
+    done = False
+    error = None
+    changed = asyncio.Event()
+    drained = asyncio.Event()
+    chunks = 0
+    writes = 0
+
+    async def produce():
+        nonlocal size, done, error, chunks
+        try:
+            async for chunk in iterator:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                pending.append(chunk)
+                size += len(chunk)
+                chunks += 1
+                changed.set()
+                while size >= max_buffer_bytes:
+                    drained.clear()
+                    await drained.wait()
+        except Exception as e:
+            error = e
+        finally:
+            await close_iterator(iterator)
+            done = True
+            changed.set()
+
+    def take() -> bytes:
+        nonlocal size
+        parts = []
+        taken = 0
+        while pending and taken < max_bytes:
+            chunk = pending[0]
+            if taken + len(chunk) <= max_bytes:
+                pending.popleft()
+            elif taken:
+                break
+            else:
+                pending[0] = chunk[max_bytes:]
+                chunk = chunk[:max_bytes]
+            parts.append(chunk)
+            taken += len(chunk)
+        size -= taken
+        if size < max_buffer_bytes:
+            drained.set()
+        return b"".join(parts)
+
+    producer = asyncio.create_task(produce())
+    immediate = True
+    backlog = False
+    try:
+        while True:
+            if not pending and not done:
+                changed.clear()
+                await changed.wait()
+
+            # What didn't fit in the last write goes out without waiting
+            if not immediate and not backlog:
+                deadline = loop.time() + window
+                while not done and size < max_bytes:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    changed.clear()
+                    try:
+                        await asyncio.wait_for(changed.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+            if pending:
+                data = take()
+                backlog = bool(pending)
+                writes += 1
+                if immediate and has_content(data):
+                    immediate = False
+                yield data
+            elif done:
+                if error is not None:
+                    raise error
+                return
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        METRICS.inc("stream_chunks_total", chunks)
+        METRICS.inc("stream_writes_total", writes)
@@ -0,0 +1,137 @@
+import asyncio
+import inspect
+import logging
+from functools import partial
+from typing import Any
+
+import anyio
+from starlette.responses import StreamingResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from open_webui.env import SRC_LOG_LEVELS
+from open_webui.utils.metrics import METRICS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+
+async def close_iterator(iterator: Any):
+    """
+    Closes a sync or async generator (or anything with close/aclose) so its
+    finally blocks run now rather than whenever it is garbage collected.
+    """
+    # Shielded, the surrounding scope is usually being cancelled already
+    with anyio.CancelScope(shield=True):
+        try:
+            if hasattr(iterator, "aclose"):
+                await iterator.aclose()
+            elif hasattr(iterator, "close"):
+                result = iterator.close()
+                if inspect.isawaitable(result):
+                    await result
+        except Exception as e:
+            log.debug(f"Error closing iterator: {e}")
+
+
+async def close_streaming_response(response: StreamingResponse):
+    await close_iterator(response.body_iterator)
+    # Still runs when the request is being cancelled, background tasks give
+    # back backend slots and release upstream connections
+    if response.background is not None:
+        with anyio.CancelScope(shield=True):
+            await response.background()
+
+
+class CancellableStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that closes its body iterator as soon as streaming
+    stops, for whatever reason. Upstream requests and pipe generators down the
+    generator chain are torn down right away instead of running on until the
+    abandoned generators are collected.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            async with anyio.create_task_group() as task_group:
+
+                async def wrap(func):
+                    await func()
+                    task_group.cancel_scope.cancel()
+
+                task_group.start_soon(wrap, partial(self.stream_response, send))
+                await wrap(partial(self.listen_for_disconnect, receive))
+        finally:
+            await close_streaming_response(self)
+
+
+class DisconnectMiddleware:
+    """
+    Cancels the handling of a generation request as soon as its client goes
+    away, wherever it is at: tool calls, pipes, waiting on the upstream or
+    streaming. Only the paths given are watched.
+
+    Once the request body has been read the middleware owns the server's
+    receive channel. The app is told about the disconnect the usual way when
+    it asks for it, and is cancelled outright otherwise.
+    """
+
+    def __init__(self, app: ASGIApp, paths: list[str]):
+        self.app = app
+        self.paths = paths
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not any(
+            path in scope["path"] for path in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        disconnected = asyncio.Event()
+        body_received = False
+        response_sent = False
+        listener = None
+        app_task = None
+
+        async def listen():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    break
+            if not response_sent:
+                disconnected.set()
+                log.info(f"Client disconnected from {scope['path']}")
+                METRICS.inc("request_disconnects_total")
+                # An app waiting on receive gets to see the disconnect first
+                await asyncio.sleep(0)
+                app_task.cancel()
+
+        async def wrapped_receive() -> Message:
+            nonlocal body_received, listener
+            if body_received:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body"):
+                body_received = True
+                listener = asyncio.create_task(listen())
+            return message
+
+        async def wrapped_send(message: Message):
+            nonlocal response_sent
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                response_sent = True
+            await send(message)
+
+        app_task = asyncio.create_task(self.app(scope, wrapped_receive, wrapped_send))
+        try:
+            await app_task
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+            # Nobody is left to answer
+        finally:
+            if listener is not None:
+                listener.cancel()
+            if not app_task.done():
+                app_task.cancel()
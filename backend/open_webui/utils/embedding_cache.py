@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Optional
+
+from cachetools import LRUCache
+
+from open_webui.config import (
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_MEMORY_SIZE,
+    EMBEDDING_CACHE_PATH,
+    ENABLE_EMBEDDING_CACHE,
+)
+from open_webui.env import SRC_LOG_LEVELS
+from open_webui.utils.metrics import METRICS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Entries added between checks of the size limit
+EMBEDDING_CACHE_PRUNE_INTERVAL = 1000
+
+EMBEDDING_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embedding (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS embedding_namespace ON embedding (namespace);
+"""
+
+
+def get_embedding_namespace(engine: str, model: str) -> str:
+    return f"{engine or 'sentence_transformers'}:{model}"
+
+
+def get_embedding_cache_key(namespace: str, text: str) -> str:
+    # Whitespace differences don't change what a chunk means
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{namespace}\0{normalized}".encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content addressed embeddings in a SQLite file with an in memory LRU in
+    front, keyed by engine, model and text. Vectors are stored as float32.
+    Entries of models other than the one in use are dropped by retain().
+    """
+
+    def __init__(self, path: str, memory_size: int, max_entries: int):
+        self.max_entries = max_entries
+        self.memory = LRUCache(maxsize=memory_size)
+        self.lock = threading.Lock()
+        self.inserts = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(EMBEDDING_CACHE_SCHEMA)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self.lock:
+            for key in keys:
+                vector = self.memory.get(key)
+                if vector is not None:
+                    found[key] = vector
+
+            missing = [key for key in set(keys) if key not in found]
+            # Stays under SQLite's default limit of host parameters
+            for i in range(0, len(missing), 500):
+                batch = missing[i : i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embedding WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    self.memory[key] = vector
+                    found[key] = vector
+        return found
+
+    def set_many(self, namespace: str, items: dict[str, list[float]]):
+        now = int(time.time())
+        with self.lock:
+            for key, vector in items.items():
+                self.memory[key] = vector
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embedding (key, namespace, vector, created_at) VALUES (?, ?, ?, ?)",
+                [
+                    (key, namespace, array("f", vector).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+            self.conn.commit()
+
+            self.inserts += len(items)
+            if self.inserts >= EMBEDDING_CACHE_PRUNE_INTERVAL:
+                self.inserts = 0
+                self.prune()
+
+    def prune(self):
+        # Oldest entries go first once the file holds too many
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM embedding").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM embedding WHERE key IN (SELECT key FROM embedding ORDER BY created_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self.conn.commit()
+            log.info(f"Pruned {count - self.max_entries} cached embeddings")
+
+    def retain(self, namespace: str):
+        with self.lock:
+            deleted = self.conn.execute(
+                "DELETE FROM embedding WHERE namespace != ?", (namespace,)
+            ).rowcount
+            self.conn.commit()
+            if deleted:
+                self.memory.clear()
+                log.info(f"Dropped {deleted} cached embeddings of other models")
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM embedding")
+            self.conn.commit()
+            self.memory.clear()
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            (entries,) = self.conn.execute("SELECT COUNT(*) FROM embedding").fetchone()
+        hits = METRICS.get_counter("embedding_cache_requests_total", result="hit")
+        misses = METRICS.get_counter("embedding_cache_requests_total", result="miss")
+        return {
+            "entries": entries,
+            "memory_entries": len(self.memory),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0,
+        }
+
+    def lookup(self, namespace: str, texts: list[str]) -> tuple[list[str], dict]:
+        keys = [get_embedding_cache_key(namespace, text) for text in texts]
+        found = self.get_many(keys)
+
+        hits = sum(1 for key in keys if key in found)
+        if hits:
+            METRICS.inc("embedding_cache_requests_total", hits, result="hit")
+        if len(keys) - hits:
+            METRICS.inc(
+                "embedding_cache_requests_total", len(keys) - hits, result="miss"
+            )
+        return keys, found
+
+    def get_missing(self, keys: list[str], texts: list[str], found: dict) -> dict:
+        # Unique texts still to embed, by key
+        return {key: text for key, text in zip(keys, texts) if key not in found}
+
+    def embed(
+        self,
+        namespace: str,
+        texts: list[str],
+        embed: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        keys, found = self.lookup(namespace, texts)
+        missing = self.get_missing(keys, texts, found)
+        if missing:
+            vectors = dict(zip(missing.keys(), embed(list(missing.values()))))
+            self.set_many(namespace, vectors)
+            found.update(vectors)
+        return [found[key] for key in keys]
+
+
+EMBEDDING_CACHE: Optional[EmbeddingCache] = None
+if ENABLE_EMBEDDING_CACHE:
+    try:
+        EMBEDDING_CACHE = EmbeddingCache(
+            EMBEDDING_CACHE_PATH,
+            EMBEDDING_CACHE_MEMORY_SIZE,
+            EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+    except Exception as e:
+        log.exception(f"Embedding cache disabled, could not open it: {e}")
@@ -0,0 +1,314 @@
+import asyncio
+import codecs
+import json
+import logging
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+from redis import asyncio as aioredis
+from starlette.responses import StreamingResponse
+
+from open_webui.env import SRC_LOG_LEVELS
+from open_webui.utils.disconnect import close_streaming_response
+from open_webui.utils.metrics import METRICS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+# How often redis readers check for new chunks
+GENERATION_POLL_INTERVAL = 0.1
+
+# KEYS are the info hash and the chunk list, ARGV is the offset to read from.
+# Returns nothing for unknown generations, else the offset the chunks start
+# at (later than asked for when older chunks were dropped), done and chunks.
+GENERATION_READ_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return nil
+end
+local total = tonumber(redis.call("HGET", KEYS[1], "total") or "0")
+local done = redis.call("HGET", KEYS[1], "done") or "0"
+local start = total - redis.call("LLEN", KEYS[2])
+local offset = math.max(tonumber(ARGV[1]), start)
+return {tostring(offset), done, redis.call("LRANGE", KEYS[2], offset - start, -1)}
+"""
+
+
+def get_generation_key(chat_id: str, message_id: str) -> str:
+    return f"{chat_id}:{message_id}"
+
+
+class MemoryGenerationBuffer:
+    def __init__(self, max_chunks: int, ttl: int):
+        self.max_chunks = max_chunks
+        self.ttl = ttl
+        self.buffers: dict[str, dict] = {}
+        self.condition = asyncio.Condition()
+
+    def expire(self):
+        now = time.time()
+        for key, buffer in list(self.buffers.items()):
+            if buffer["expires_at"] <= now:
+                del self.buffers[key]
+
+    async def create(self, key: str, user_id: str):
+        self.expire()
+        self.buffers[key] = {
+            "user_id": user_id,
+            "chunks": [],
+            "start": 0,
+            "done": False,
+            "expires_at": time.time() + self.ttl,
+        }
+
+    async def append(self, key: str, chunk: str):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            return
+
+        async with self.condition:
+            buffer["chunks"].append(chunk)
+            overflow = len(buffer["chunks"]) - self.max_chunks
+            if overflow > 0:
+                del buffer["chunks"][:overflow]
+                buffer["start"] += overflow
+            buffer["expires_at"] = time.time() + self.ttl
+            self.condition.notify_all()
+
+    async def finish(self, key: str):
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            return
+
+        async with self.condition:
+            buffer["done"] = True
+            buffer["expires_at"] = time.time() + self.ttl
+            self.condition.notify_all()
+
+    async def get_info(self, key: str) -> Optional[dict]:
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer["expires_at"] <= time.time():
+            return None
+        return {
+            "user_id": buffer["user_id"],
+            "start": buffer["start"],
+            "offset": buffer["start"] + len(buffer["chunks"]),
+            "done": buffer["done"],
+        }
+
+    async def read(self, key: str, offset: int) -> AsyncGenerator[str, None]:
+        while True:
+            async with self.condition:
+                buffer = self.buffers.get(key)
+                if buffer is None:
+                    return
+
+                if offset < buffer["start"]:
+                    log.warning(f"Reader of {key} fell behind, chunks were dropped")
+                    offset = buffer["start"]
+                chunks = buffer["chunks"][offset - buffer["start"] :]
+                if not chunks:
+                    if buffer["done"]:
+                        return
+                    await self.condition.wait()
+                    continue
+
+            for chunk in chunks:
+                yield chunk
+            offset += len(chunks)
+
+
+class RedisGenerationBuffer:
+    def __init__(self, max_chunks: int, ttl: int, redis_url: str):
+        self.max_chunks = max_chunks
+        self.ttl = ttl
+        self.prefix = "open-webui:generation:"
+        self.redis = aioredis.Redis.from_url(redis_url, decode_responses=True)
+        self.read_script = self.redis.register_script(GENERATION_READ_SCRIPT)
+
+    def get_keys(self, key: str) -> tuple[str, str]:
+        return f"{self.prefix}{key}", f"{self.prefix}{key}:chunks"
+
+    async def create(self, key: str, user_id: str):
+        info_key, chunks_key = self.get_keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(info_key, chunks_key)
+            pipe.hset(info_key, mapping={"user_id": user_id, "total": 0, "done": 0})
+            pipe.expire(info_key, self.ttl)
+            await pipe.execute()
+
+    async def append(self, key: str, chunk: str):
+        info_key, chunks_key = self.get_keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(chunks_key, chunk)
+            pipe.ltrim(chunks_key, -self.max_chunks, -1)
+            pipe.hincrby(info_key, "total", 1)
+            pipe.expire(info_key, self.ttl)
+            pipe.expire(chunks_key, self.ttl)
+            await pipe.execute()
+
+    async def finish(self, key: str):
+        info_key, chunks_key = self.get_keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(info_key, "done", 1)
+            pipe.expire(info_key, self.ttl)
+            pipe.expire(chunks_key, self.ttl)
+            await pipe.execute()
+
+    async def get_info(self, key: str) -> Optional[dict]:
+        info_key, chunks_key = self.get_keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(info_key)
+            pipe.llen(chunks_key)
+            info, length = await pipe.execute()
+        if not info:
+            return None
+        return {
+            "user_id": info["user_id"],
+            "start": int(info["total"]) - length,
+            "offset": int(info["total"]),
+            "done": info["done"] == "1",
+        }
+
+    async def read(self, key: str, offset: int) -> AsyncGenerator[str, None]:
+        while True:
+            result = await self.read_script(
+                keys=list(self.get_keys(key)), args=[offset]
+            )
+            if not result:
+                return
+
+            start, done, chunks = int(result[0]), result[1] == "1", result[2]
+            if start > offset:
+                log.warning(f"Reader of {key} fell behind, chunks were dropped")
+            offset = start
+            if not chunks:
+                if done:
+                    return
+                await asyncio.sleep(GENERATION_POLL_INTERVAL)
+                continue
+
+            for chunk in chunks:
+                yield chunk
+            offset += len(chunks)
+
+
+def get_generation_buffer(
+    backend: str, max_chunks: int, ttl: int, redis_url: Optional[str] = None
+):
+    if backend == "redis":
+        return RedisGenerationBuffer(max_chunks, ttl, redis_url)
+    return MemoryGenerationBuffer(max_chunks, ttl)
+
+
+def get_sse_content(lines: list[str]) -> str:
+    content = ""
+    for line in lines:
+        line = line.strip()
+        if not line.startswith("data:"):
+            continue
+        try:
+            chunk = json.loads(line[len("data:") :])
+        except json.JSONDecodeError:
+            continue
+        for choice in chunk.get("choices") or []:
+            content += (choice.get("delta") or {}).get("content") or ""
+    return content
+
+
+class GenerationManager:
+    """
+    Runs streamed generations as server side tasks that outlive the request
+    that started them. Chunks go to a buffer that any number of clients read
+    from an offset, so a dropped connection picks up where it left off and the
+    answer is finished (and handed to on_complete) with nobody listening.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.tasks: dict[str, asyncio.Task] = {}
+
+    async def start(
+        self,
+        key: str,
+        user_id: str,
+        response: StreamingResponse,
+        on_complete: Callable[[str], Awaitable],
+    ):
+        # Regenerating a message replaces whatever was still running for it
+        self.cancel(key)
+        await self.buffer.create(key, user_id)
+
+        task = asyncio.create_task(self.run(key, response, on_complete))
+        self.tasks[key] = task
+        task.add_done_callback(lambda task: self.remove_task(key, task))
+        METRICS.set("generations_running", len(self.tasks))
+
+    def remove_task(self, key: str, task: asyncio.Task):
+        if self.tasks.get(key) is task:
+            del self.tasks[key]
+        METRICS.set("generations_running", len(self.tasks))
+
+    async def run(
+        self,
+        key: str,
+        response: StreamingResponse,
+        on_complete: Callable[[str], Awaitable],
+    ):
+        content = ""
+        tail = ""
+        result = "failed"
+        # Chunks can end partway through a multi-byte character
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        async def append(chunk: str):
+            nonlocal content, tail
+            if not chunk:
+                return
+            await self.buffer.append(key, chunk)
+
+            lines = (tail + chunk).split("\n")
+            tail = lines.pop()
+            content += get_sse_content(lines)
+
+        try:
+            async for chunk in response.body_iterator:
+                if isinstance(chunk, bytes):
+                    chunk = decoder.decode(chunk)
+                await append(chunk)
+            await append(decoder.decode(b"", final=True))
+            result = "finished"
+        except asyncio.CancelledError:
+            log.info(f"Generation {key} cancelled")
+            result = "cancelled"
+            raise
+        except Exception as e:
+            log.exception(f"Generation {key} failed: {e}")
+            await self.buffer.append(
+                key, f"data: {json.dumps({'error': {'detail': str(e)}})}\n\n"
+            )
+        finally:
+            await close_streaming_response(response)
+            await self.buffer.finish(key)
+            METRICS.inc("generations_total", result=result)
+
+        content += get_sse_content([tail])
+        try:
+            await on_complete(content)
+        except Exception as e:
+            log.exception(f"Failed to complete generation {key}: {e}")
+
+    def cancel(self, key: str) -> bool:
+        task = self.tasks.get(key)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    async def get_info(self, key: str) -> Optional[dict]:
+        info = await self.buffer.get_info(key)
+        if info is not None:
+            info["running"] = key in self.tasks
+        return info
+
+    def read(self, key: str, offset: int = 0) -> AsyncGenerator[str, None]:
+        return self.buffer.read(key, offset)
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from urllib.parse import urlparse
+
+import aiohttp
+
+from open_webui.config import (
+    AIOHTTP_CLIENT_DNS_CACHE_TTL,
+    AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT,
+    AIOHTTP_CLIENT_POOL_LIMIT,
+    AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST,
+    AIOHTTP_CLIENT_TIMEOUT,
+)
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+
+class ClientSessionRegistry:
+    """
+    One pooled aiohttp session per upstream origin, so chats, task generations
+    and model listings reuse warm TCP/TLS connections instead of reconnecting.
+    """
+
+    def __init__(self):
+        self.sessions: dict[str, aiohttp.ClientSession] = {}
+
+    @staticmethod
+    def get_key(url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=AIOHTTP_CLIENT_POOL_LIMIT,
+            limit_per_host=AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=AIOHTTP_CLIENT_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT),
+            trust_env=True,
+        )
+
+    def get_session(self, url: str) -> aiohttp.ClientSession:
+        key = self.get_key(url)
+        session = self.sessions.get(key)
+        if session is None or session.closed:
+            log.debug(f"Creating pooled client session for {key}")
+            session = self.create_session()
+            self.sessions[key] = session
+        return session
+
+    def start(self, urls: list[str]):
+        for url in urls:
+            if url:
+                self.get_session(url)
+
+    async def close(self):
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        await asyncio.gather(
+            *(session.close() for session in sessions), return_exceptions=True
+        )
+
+
+CLIENT_SESSIONS = ClientSessionRegistry()
+
+
+def get_client_session(url: str) -> aiohttp.ClientSession:
+    return CLIENT_SESSIONS.get_session(url)
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+
+def get_metric_key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class Metrics:
+    """
+    Process local counters, gauges and summaries, keyed by name and labels.
+    Values are exposed to admins through /api/metrics.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.summaries = {}
+        self.labels = {}
+        self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = get_metric_key(name, labels)
+        with self.lock:
+            self.counters[key] += value
+            self.labels[key] = (name, labels)
+
+    def set(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[get_metric_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = get_metric_key(name, labels)
+        with self.lock:
+            summary = self.summaries.get(key)
+            if summary is None:
+                self.summaries[key] = {
+                    "count": 1,
+                    "sum": value,
+                    "min": value,
+                    "max": value,
+                }
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["min"] = min(summary["min"], value)
+                summary["max"] = max(summary["max"], value)
+
+    def get_counter(self, name: str, **labels) -> float:
+        return self.counters.get(get_metric_key(name, labels), 0)
+
+    def get_summary(self, name: str, **labels) -> Optional[dict]:
+        with self.lock:
+            summary = self.summaries.get(get_metric_key(name, labels))
+            return dict(summary) if summary else None
+
+    def sum_counters(self, name: str, **labels) -> float:
+        # Sums every series of a counter whose labels include the given ones
+        with self.lock:
+            return sum(
+                value
+                for key, value in self.counters.items()
+                if self.labels[key][0] == name
+                and labels.items() <= self.labels[key][1].items()
+            )
+
+    def model_dump(self) -> dict:
+        with self.lock:
+            return {
+                "started_at": self.started_at,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "summaries": {
+                    key: {**summary, "avg": summary["sum"] / summary["count"]}
+                    for key, summary in self.summaries.items()
+                },
+            }
+
+
+METRICS = Metrics()
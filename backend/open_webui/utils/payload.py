@@ -1,5 +1,8 @@
-from typing import Callable
+import time
+from typing import Callable, Optional
 
+from open_webui.apps.webui.models.models import ModelModel, Models
+from open_webui.config import MODEL_PRESET_CACHE_TTL
 from open_webui.utils.misc import (
     add_or_update_system_message,
 )
@@ -88,6 +91,67 @@ def apply_model_params_to_body_ollama(params: dict, form_data: dict) -> dict:
     return form_data
 
 
+def copy_params(params: dict) -> dict:
+    # stop sequences are the only mutable values, copy them per request
+    return {k: list(v) if isinstance(v, list) else v for k, v in params.items()}
+
+
+class ModelPreset:
+    """
+    A custom model definition resolved once: base model, params already cast for
+    each backend and the system prompt. Applying it is a dict merge.
+    """
+
+    def __init__(self, model: ModelModel):
+        self.id = model.id
+        self.base_model_id = model.base_model_id
+        self.params = model.params.model_dump()
+        self.openai_params = apply_model_params_to_body_openai(self.params, {})
+        self.ollama_options = apply_model_params_to_body_ollama(self.params, {})
+
+    # inplace function: form_data is modified
+    def apply_to_openai_body(self, form_data: dict, user) -> dict:
+        if self.base_model_id:
+            form_data["model"] = self.base_model_id
+        form_data.update(copy_params(self.openai_params))
+        return apply_model_system_prompt_to_body(self.params, form_data, user)
+
+    # inplace function: form_data is modified
+    def apply_to_ollama_body(self, form_data: dict, user) -> dict:
+        if self.base_model_id:
+            form_data["model"] = self.base_model_id
+        if self.params:
+            if form_data.get("options") is None:
+                form_data["options"] = {}
+            form_data["options"].update(copy_params(self.ollama_options))
+            form_data = apply_model_system_prompt_to_body(self.params, form_data, user)
+        return form_data
+
+
+# model id -> (Models.version, cached_at, preset)
+MODEL_PRESET_CACHE: dict[str, tuple[int, float, Optional[ModelPreset]]] = {}
+
+
+def get_model_preset(model_id: str) -> Optional[ModelPreset]:
+    """
+    Returns the cached preset of a custom model, or None for models without one.
+    Entries are dropped when the models table changes in this process, the TTL
+    bounds staleness for writes made by other workers.
+    """
+    entry = MODEL_PRESET_CACHE.get(model_id)
+    if (
+        entry is not None
+        and entry[0] == Models.version
+        and time.time() - entry[1] < MODEL_PRESET_CACHE_TTL
+    ):
+        return entry[2]
+
+    model = Models.get_model_by_id(model_id)
+    preset = ModelPreset(model) if model else None
+    MODEL_PRESET_CACHE[model_id] = (Models.version, time.time(), preset)
+    return preset
+
+
 def convert_payload_openai_to_ollama(openai_payload: dict) -> dict:
     """
     Converts a payload formatted for OpenAI's API to be compatible with Ollama's API endpoint for chat completions.
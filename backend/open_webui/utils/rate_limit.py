@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from redis import asyncio as aioredis
+
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+# Buckets refill continuously, a full bucket holds one minute of quota
+RATE_LIMIT_WINDOW = 60
+
+# KEYS are bucket keys, ARGV is now, force, then capacity and cost per key.
+# Either every bucket is charged or none is, forced charges (usage settled
+# after the fact) always apply and may leave a bucket in debt or refund it.
+RATE_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local force = ARGV[2] == "1"
+local window = tonumber(ARGV[3])
+local wait = 0
+local balances = {}
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[2 + i * 2])
+    local cost = tonumber(ARGV[3 + i * 2])
+    local state = redis.call("HMGET", KEYS[i], "tokens", "updated_at")
+    local tokens = tonumber(state[1]) or capacity
+    local updated_at = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated_at) * capacity / window)
+    balances[i] = tokens
+    if not force and tokens < cost then
+        wait = math.max(wait, (cost - tokens) * window / capacity)
+    end
+end
+if wait == 0 then
+    for i = 1, #KEYS do
+        local capacity = tonumber(ARGV[2 + i * 2])
+        local cost = tonumber(ARGV[3 + i * 2])
+        local tokens = math.min(math.max(balances[i] - cost, -capacity), capacity)
+        redis.call(
+            "HSET", KEYS[i], "tokens", tokens, "updated_at", now, "capacity", capacity
+        )
+        redis.call("EXPIRE", KEYS[i], math.ceil(window * 2))
+    end
+end
+return tostring(wait)
+"""
+
+
+class Bucket:
+    def __init__(self, capacity: float, cost: float):
+        self.capacity = capacity
+        # A single request bigger than the bucket is let through when it's full
+        self.cost = min(cost, capacity)
+
+
+def get_refilled_tokens(
+    tokens: float, updated_at: float, capacity: float, now: float
+) -> float:
+    return min(capacity, tokens + (now - updated_at) * capacity / RATE_LIMIT_WINDOW)
+
+
+class MemoryRateLimiter:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # key -> (tokens, updated_at, capacity)
+        self.buckets: dict[str, tuple[float, float, float]] = {}
+
+    async def acquire(self, buckets: dict[str, Bucket], force: bool = False) -> float:
+        """
+        Charges every bucket, returns 0 on success or the seconds to wait until
+        all of them hold enough tokens.
+        """
+        async with self.lock:
+            now = time.time()
+            balances = {}
+            wait = 0
+            for key, bucket in buckets.items():
+                tokens, updated_at, _ = self.buckets.get(
+                    key, (bucket.capacity, now, bucket.capacity)
+                )
+                tokens = get_refilled_tokens(tokens, updated_at, bucket.capacity, now)
+                balances[key] = tokens
+                if not force and tokens < bucket.cost:
+                    wait = max(
+                        wait,
+                        (bucket.cost - tokens) * RATE_LIMIT_WINDOW / bucket.capacity,
+                    )
+
+            if wait == 0:
+                for key, bucket in buckets.items():
+                    tokens = min(
+                        max(balances[key] - bucket.cost, -bucket.capacity),
+                        bucket.capacity,
+                    )
+                    self.buckets[key] = (tokens, now, bucket.capacity)
+            return wait
+
+    async def get_usage(self) -> dict:
+        now = time.time()
+        usage = {}
+        for key, (tokens, updated_at, capacity) in list(self.buckets.items()):
+            tokens = get_refilled_tokens(tokens, updated_at, capacity, now)
+            if tokens >= capacity:
+                # Full buckets carry no information, drop them
+                self.buckets.pop(key, None)
+                continue
+            usage[key] = {"remaining": tokens, "capacity": capacity}
+        return usage
+
+    async def reset(self):
+        self.buckets.clear()
+
+
+class RedisRateLimiter:
+    def __init__(self, redis_url: str):
+        self.prefix = "open-webui:rate_limit:"
+        self.redis = aioredis.Redis.from_url(redis_url, decode_responses=True)
+        self.script = self.redis.register_script(RATE_LIMIT_SCRIPT)
+
+    async def acquire(self, buckets: dict[str, Bucket], force: bool = False) -> float:
+        args = [time.time(), "1" if force else "0", RATE_LIMIT_WINDOW]
+        for bucket in buckets.values():
+            args.extend([bucket.capacity, bucket.cost])
+        wait = await self.script(
+            keys=[f"{self.prefix}{key}" for key in buckets], args=args
+        )
+        return float(wait)
+
+    async def get_usage(self) -> dict:
+        now = time.time()
+        usage = {}
+        async for key in self.redis.scan_iter(match=f"{self.prefix}*"):
+            state = await self.redis.hgetall(key)
+            if not state:
+                continue
+            capacity = float(state["capacity"])
+            tokens = get_refilled_tokens(
+                float(state["tokens"]), float(state["updated_at"]), capacity, now
+            )
+            if tokens < capacity:
+                usage[key[len(self.prefix) :]] = {
+                    "remaining": tokens,
+                    "capacity": capacity,
+                }
+        return usage
+
+    async def reset(self):
+        async for key in self.redis.scan_iter(match=f"{self.prefix}*"):
+            await self.redis.delete(key)
+
+
+def get_rate_limiter(backend: str, redis_url: Optional[str] = None):
+    if backend == "redis":
+        return RedisRateLimiter(redis_url=redis_url)
+    return MemoryRateLimiter()
+
+
+def get_rate_limits(
+    rate_limits: dict, role: str, model_id: str
+) -> list[tuple[str, dict]]:
+    """
+    Resolves the limits that apply to a request as (scope, limits) pairs, the
+    role wide quota and the per model quota for that role are both enforced.
+
+    rate_limits = {
+        "roles": {"user": {"rpm": 20, "tpm": 40000}},
+        "models": {"gpt-4o": {"user": {"rpm": 5}, "vip": {"tpm": 100000}}},
+    }
+    """
+    limits = []
+    role_limits = (rate_limits.get("roles") or {}).get(role)
+    if role_limits:
+        limits.append(("all", role_limits))
+    model_limits = ((rate_limits.get("models") or {}).get(model_id) or {}).get(role)
+    if model_limits:
+        limits.append((model_id, model_limits))
+    return limits
+
+
+def estimate_tokens(form_data: dict) -> int:
+    # Rough count (about 4 characters per token) that is good enough to charge
+    # up front, the real usage is settled once the response is done
+    characters = 0
+    for message in form_data.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            for item in content:
+                if item.get("type") == "text":
+                    characters += len(item.get("text", ""))
+    return characters // 4 + 1
+
+
+def get_request_buckets(
+    limits: list[tuple[str, dict]], user_id: str, tokens: int
+) -> dict[str, Bucket]:
+    buckets = {}
+    for scope, scope_limits in limits:
+        if scope_limits.get("rpm"):
+            buckets[f"{user_id}:{scope}:rpm"] = Bucket(scope_limits["rpm"], 1)
+        if scope_limits.get("tpm"):
+            buckets[f"{user_id}:{scope}:tpm"] = Bucket(scope_limits["tpm"], tokens)
+    return buckets
+
+
+def get_usage_buckets(
+    limits: list[tuple[str, dict]], user_id: str, tokens: int
+) -> dict[str, Bucket]:
+    buckets = {}
+    for scope, scope_limits in limits:
+        if scope_limits.get("tpm"):
+            buckets[f"{user_id}:{scope}:tpm"] = Bucket(scope_limits["tpm"], tokens)
+    return buckets
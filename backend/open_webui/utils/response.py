@@ -1,9 +1,25 @@
+import codecs
 import json
+import uuid
+
+from open_webui.utils.disconnect import close_iterator
 from open_webui.utils.misc import (
     openai_chat_chunk_message_template,
     openai_chat_completion_message_template,
 )
 
+try:
+    import orjson
+
+    json_loads = orjson.loads
+
+    def json_dumps(value) -> str:
+        return orjson.dumps(value).decode("utf-8")
+
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
 
 def convert_response_ollama_to_openai(ollama_response: dict) -> dict:
     model = ollama_response.get("model", "ollama")
@@ -13,20 +29,109 @@ def convert_response_ollama_to_openai(ollama_response: dict) -> dict:
     return response
 
 
+def get_chunk_templates(model: str) -> tuple[str, str, str, str]:
+    # Serialized once per stream, every chunk shares the id and creation
+    # time and only the content is encoded. Returns the parts around the
+    # content, a chunk without content and the final chunk.
+    placeholder = str(uuid.uuid4())
+    data = openai_chat_chunk_message_template(model, placeholder)
+    head, tail = json.dumps(data).split(json.dumps(placeholder))
+
+    del data["choices"][0]["delta"]
+    empty = f"data: {json.dumps(data)}\n\n"
+    data["choices"][0]["finish_reason"] = "stop"
+    done = f"data: {json.dumps(data)}\n\ndata: [DONE]\n\n"
+    return f"data: {head}", f"{tail}\n\n", empty, done
+
+
 async def convert_streaming_response_ollama_to_openai(ollama_streaming_response):
-    async for data in ollama_streaming_response.body_iterator:
-        data = json.loads(data)
+    model = None
+    templates = None
+    buffer = b""
 
-        model = data.get("model", "ollama")
+    def convert(line: bytes) -> str:
+        nonlocal model, templates
+        data = json_loads(line)
+
+        if data.get("model", "ollama") != model or templates is None:
+            model = data.get("model", "ollama")
+            templates = get_chunk_templates(model)
+        head, tail, empty, done = templates
+
+        if data.get("done", False):
+            return done
         message_content = data.get("message", {}).get("content", "")
-        done = data.get("done", False)
+        if not message_content:
+            return empty
+        return f"{head}{json_dumps(message_content)}{tail}"
+
+    try:
+        async for chunk in ollama_streaming_response.body_iterator:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            buffer += chunk
+            if b"\n" not in chunk:
+                continue
+
+            *lines, buffer = buffer.split(b"\n")
+            # Everything that came in one chunk goes out in one write
+            output = "".join(convert(line) for line in lines if line.strip())
+            if output:
+                yield output
+
+        if buffer.strip():
+            yield convert(buffer)
+    finally:
+        await close_iterator(ollama_streaming_response.body_iterator)
+
+
+def capture_streaming_response(response, model_id: str, on_complete):
+    # Rebuilds the completion from the streamed deltas once the stream ends,
+    # on_complete is told whether it finished so broken answers aren't cached
+    body_iterator = response.body_iterator
+
+    async def capture():
+        content = ""
+        usage = None
+        finished = False
+        failed = False
+        buffer = ""
+        # Chunks can end partway through a multi-byte character
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            async for data in body_iterator:
+                yield data
 
-        data = openai_chat_chunk_message_template(
-            model, message_content if not done else None
-        )
+                buffer += decoder.decode(data) if isinstance(data, bytes) else data
+                lines = buffer.split("\n")
+                buffer = lines.pop()
+                for line in lines:
+                    line = line.strip()
+                    if not line.startswith("data:"):
+                        continue
+                    line = line[len("data:") :].strip()
+                    if line == "[DONE]":
+                        finished = True
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if "error" in chunk:
+                        failed = True
+                        continue
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+                    for choice in chunk.get("choices") or []:
+                        content += (choice.get("delta") or {}).get("content") or ""
+                        if choice.get("finish_reason"):
+                            finished = True
+        finally:
+            await close_iterator(body_iterator)
 
-        line = f"data: {json.dumps(data)}\n\n"
-        if done:
-            line += "data: [DONE]\n\n"
+        completion = openai_chat_completion_message_template(model_id, content)
+        if usage:
+            completion["usage"] = usage
+        await on_complete(completion, finished and not failed and bool(content))
 
-        yield line
+    response.body_iterator = capture()
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+
+from cachetools import TTLCache
+from redis import asyncio as aioredis
+
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+# Request fields that change the generated answer, everything else
+# (stream, metadata, chat and session ids) is left out of the key
+RESPONSE_CACHE_KEY_FIELDS = [
+    "model",
+    "messages",
+    "temperature",
+    "top_p",
+    "max_tokens",
+    "max_completion_tokens",
+    "seed",
+    "stop",
+    "frequency_penalty",
+    "presence_penalty",
+    "n",
+    "logit_bias",
+    "response_format",
+    "tools",
+    "tool_choice",
+]
+
+
+def is_response_cacheable(form_data: dict) -> bool:
+    # Only deterministic requests are safe to answer from the cache
+    return form_data.get("temperature") == 0 or form_data.get("seed") is not None
+
+
+def get_response_cache_key(form_data: dict, scope: Optional[str] = None) -> str:
+    key_data = {
+        field: form_data[field]
+        for field in RESPONSE_CACHE_KEY_FIELDS
+        if form_data.get(field) is not None
+    }
+    if scope:
+        key_data["scope"] = scope
+
+    canonical = json.dumps(
+        key_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryResponseCache:
+    def __init__(self, ttl: int, maxsize: int):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[dict]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: dict):
+        self.cache[key] = value
+
+    async def clear(self):
+        self.cache.clear()
+
+
+class RedisResponseCache:
+    def __init__(self, ttl: int, redis_url: str):
+        self.ttl = ttl
+        self.prefix = "open-webui:response_cache:"
+        self.redis = aioredis.Redis.from_url(redis_url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await self.redis.get(f"{self.prefix}{key}")
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: dict):
+        await self.redis.set(f"{self.prefix}{key}", json.dumps(value), ex=self.ttl)
+
+    async def clear(self):
+        async for key in self.redis.scan_iter(match=f"{self.prefix}*"):
+            await self.redis.delete(key)
+
+
+def get_response_cache(backend: str, ttl: int, maxsize: int, redis_url: str):
+    if backend == "redis":
+        return RedisResponseCache(ttl=ttl, redis_url=redis_url)
+    return MemoryResponseCache(ttl=ttl, maxsize=maxsize)
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+
+from open_webui.config import (
+    SCHEDULER_CHAT_DEADLINE,
+    SCHEDULER_MAX_QUEUE_SIZE,
+    SCHEDULER_TASK_DEADLINE,
+)
+from open_webui.constants import ERROR_MESSAGES, TASKS
+from open_webui.env import SRC_LOG_LEVELS
+from open_webui.utils.metrics import METRICS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+# Lower values are admitted first
+PRIORITY_CHAT = 0
+PRIORITY_TASK = 1
+
+PRIORITY_NAMES = {PRIORITY_CHAT: "chat", PRIORITY_TASK: "task"}
+
+
+def get_request_priority(metadata: Optional[dict]) -> int:
+    task = (metadata or {}).get("task")
+    # MoA aggregates answers for an interactive chat, it's not background work
+    if task and task != str(TASKS.MOA_RESPONSE_GENERATION):
+        return PRIORITY_TASK
+    return PRIORITY_CHAT
+
+
+class Waiter:
+    def __init__(
+        self, try_acquire: Callable[[], Optional[int]], priority: int, deadline: float
+    ):
+        self.try_acquire = try_acquire
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionScheduler:
+    """
+    Queues upstream requests while every backend that serves their model is at
+    its concurrency cap. Freed slots go to the highest priority class first and
+    to the oldest request within a class. The queue is bounded, a full queue
+    sheds its lowest priority waiter for a more important request, and waiters
+    that outlive their deadline are rejected instead of being served late.
+    """
+
+    def __init__(self, name: str, max_queue_size: int, deadlines: dict[int, float]):
+        self.name = name
+        self.max_queue_size = max_queue_size
+        self.deadlines = deadlines
+        self.queue: list[tuple[int, int, Waiter]] = []
+        self.counter = itertools.count()
+
+    def get_depth(self) -> int:
+        return sum(1 for *_, waiter in self.queue if not waiter.future.done())
+
+    def update_metrics(self):
+        METRICS.set("scheduler_queue_depth", self.get_depth(), pool=self.name)
+
+    def shed(self, priority: int, reason: str):
+        METRICS.inc(
+            "scheduler_shed_total",
+            pool=self.name,
+            priority=PRIORITY_NAMES.get(priority, priority),
+            reason=reason,
+        )
+        return HTTPException(status_code=429, detail=ERROR_MESSAGES.BACKENDS_BUSY)
+
+    def observe_wait(self, waiter: Waiter):
+        METRICS.observe(
+            "scheduler_wait_seconds",
+            time.monotonic() - waiter.enqueued_at,
+            pool=self.name,
+            priority=PRIORITY_NAMES.get(waiter.priority, waiter.priority),
+        )
+
+    async def admit(
+        self,
+        try_acquire: Callable[[], Optional[int]],
+        release: Callable[[int], None],
+        priority: int,
+    ) -> int:
+        """
+        Returns whatever try_acquire hands out (a backend index), waiting for a
+        slot if it has none available right now. release gives back a slot that
+        was handed out after the caller stopped waiting.
+        """
+        # Nobody jumps the queue unless it's empty, waiters are served first
+        if not self.get_depth():
+            result = try_acquire()
+            if result is not None:
+                return result
+
+        if self.get_depth() >= self.max_queue_size and not self.evict(priority):
+            raise self.shed(priority, "queue_full")
+
+        waiter = Waiter(
+            try_acquire, priority, time.monotonic() + self.deadlines[priority]
+        )
+        heapq.heappush(self.queue, (priority, next(self.counter), waiter))
+        self.update_metrics()
+        # A slot may have freed up while nothing else was queued
+        self.notify()
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(waiter.future),
+                timeout=max(waiter.deadline - time.monotonic(), 0),
+            )
+        except asyncio.TimeoutError:
+            if (
+                waiter.future.done()
+                and not waiter.future.cancelled()
+                and not waiter.future.exception()
+            ):
+                # Admitted right at the deadline, the slot is already ours
+                return waiter.future.result()
+            waiter.future.cancel()
+            raise self.shed(priority, "deadline")
+        except asyncio.CancelledError:
+            if (
+                waiter.future.done()
+                and not waiter.future.cancelled()
+                and not waiter.future.exception()
+            ):
+                release(waiter.future.result())
+            raise
+        finally:
+            if not waiter.future.done():
+                # The client went away while queued
+                waiter.future.cancel()
+            self.observe_wait(waiter)
+            self.update_metrics()
+
+    def evict(self, priority: int) -> bool:
+        # Drops the newest waiter of the least important class below priority
+        candidates = [
+            entry
+            for entry in self.queue
+            if entry[0] > priority and not entry[2].future.done()
+        ]
+        if not candidates:
+            return False
+
+        entry = max(candidates, key=lambda entry: (entry[0], entry[1]))
+        entry[2].future.set_exception(self.shed(entry[0], "evicted"))
+        return True
+
+    def notify(self):
+        """
+        Called whenever a slot may have been freed, admits queued requests in
+        priority order for as long as their backends have room.
+        """
+        now = time.monotonic()
+        pending = []
+        while self.queue:
+            entry = heapq.heappop(self.queue)
+            waiter = entry[2]
+            if waiter.future.done():
+                continue
+            if waiter.deadline <= now:
+                waiter.future.set_exception(self.shed(waiter.priority, "deadline"))
+                continue
+
+            try:
+                result = waiter.try_acquire()
+            except Exception as e:
+                waiter.future.set_exception(e)
+                continue
+
+            if result is None:
+                # Requests for other models may still fit on other backends
+                pending.append(entry)
+            else:
+                waiter.future.set_result(result)
+
+        for entry in pending:
+            heapq.heappush(self.queue, entry)
+        self.update_metrics()
+
+    def model_dump(self) -> dict:
+        depth = {}
+        for priority, _, waiter in self.queue:
+            if not waiter.future.done():
+                name = PRIORITY_NAMES.get(priority, priority)
+                depth[name] = depth.get(name, 0) + 1
+        return {
+            "max_queue_size": self.max_queue_size,
+            "deadlines": {
+                PRIORITY_NAMES.get(priority, priority): deadline
+                for priority, deadline in self.deadlines.items()
+            },
+            "depth": depth,
+        }
+
+
+def get_admission_scheduler(name: str) -> AdmissionScheduler:
+    return AdmissionScheduler(
+        name,
+        max_queue_size=SCHEDULER_MAX_QUEUE_SIZE,
+        deadlines={
+            PRIORITY_CHAT: SCHEDULER_CHAT_DEADLINE,
+            PRIORITY_TASK: SCHEDULER_TASK_DEADLINE,
+        },
+    )
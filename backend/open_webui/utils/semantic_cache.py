@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import math
+import time
+import uuid
+from typing import Callable, Optional
+
+from open_webui.apps.rag.vector.connector import VECTOR_DB_CLIENT
+from open_webui.config import VECTOR_DB
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+def get_semantic_cache_prompt(form_data: dict) -> Optional[str]:
+    """
+    Returns the prompt to look up, or None when the request must not be served
+    from a shared cache: files, tools, tasks, personal system prompts and
+    follow-up turns all make the answer depend on more than the question.
+    """
+    metadata = form_data.get("metadata") or {}
+    if metadata.get("files") or metadata.get("tool_ids") or metadata.get("task"):
+        return None
+    if form_data.get("tools"):
+        return None
+
+    messages = form_data.get("messages") or []
+    if len(messages) != 1 or messages[0].get("role") != "user":
+        return None
+
+    content = messages[0].get("content")
+    if not isinstance(content, str) or not content.strip():
+        return None
+    return content.strip()
+
+
+def get_semantic_cache_collection_name(model_id: str, embedding_model: str) -> str:
+    # Vectors of different embedding models can't share a collection
+    key = f"{model_id}:{embedding_model}"
+    return f"semantic_cache_{hashlib.sha256(key.encode()).hexdigest()[:32]}"
+
+
+def normalize_vector(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+def get_similarity(distance: float) -> float:
+    # Vectors are normalized, milvus reports cosine similarity and chroma
+    # squared l2 distance, which is 2 - 2 * cosine for unit vectors
+    if VECTOR_DB == "milvus":
+        return distance
+    return 1 - distance / 2
+
+
+class SemanticCache:
+    def __init__(self):
+        # Inserts per collection since the last size based eviction
+        self.inserts: dict[str, int] = {}
+
+    def lookup(
+        self,
+        model_id: str,
+        prompt: str,
+        embedding_function: Callable,
+        embedding_model: str,
+        threshold: float,
+        ttl: int,
+    ) -> Optional[dict]:
+        collection_name = get_semantic_cache_collection_name(model_id, embedding_model)
+        if not VECTOR_DB_CLIENT.has_collection(collection_name):
+            return None
+
+        vector = normalize_vector(embedding_function(prompt))
+        result = VECTOR_DB_CLIENT.search(collection_name, vectors=[vector], limit=1)
+        if not result or not result.ids or not result.ids[0]:
+            return None
+
+        metadata = result.metadatas[0][0] or {}
+        if time.time() - metadata.get("created_at", 0) > ttl:
+            VECTOR_DB_CLIENT.delete(collection_name, ids=[result.ids[0][0]])
+            return None
+
+        similarity = get_similarity(result.distances[0][0])
+        log.debug(f"semantic cache similarity for {model_id}: {similarity}")
+        if similarity < threshold:
+            return None
+        return json.loads(metadata["response"])
+
+    def store(
+        self,
+        model_id: str,
+        prompt: str,
+        response: dict,
+        embedding_function: Callable,
+        embedding_model: str,
+        max_entries: int,
+        ttl: int,
+    ):
+        collection_name = get_semantic_cache_collection_name(model_id, embedding_model)
+        VECTOR_DB_CLIENT.insert(
+            collection_name,
+            items=[
+                {
+                    "id": str(uuid.uuid4()),
+                    "text": prompt,
+                    "vector": normalize_vector(embedding_function(prompt)),
+                    "metadata": {
+                        "model": model_id,
+                        "response": json.dumps(response),
+                        "created_at": int(time.time()),
+                    },
+                }
+            ],
+        )
+
+        self.inserts[collection_name] = self.inserts.get(collection_name, 0) + 1
+        if self.inserts[collection_name] >= max(max_entries // 10, 1):
+            self.inserts[collection_name] = 0
+            self.evict(collection_name, max_entries, ttl)
+
+    def evict(self, collection_name: str, max_entries: int, ttl: int):
+        result = VECTOR_DB_CLIENT.get(collection_name)
+        if not result or not result.ids:
+            return
+
+        entries = sorted(
+            zip(result.ids[0], result.metadatas[0]),
+            key=lambda entry: (entry[1] or {}).get("created_at", 0),
+        )
+        expired_before = time.time() - ttl
+        ids = [
+            id
+            for idx, (id, metadata) in enumerate(entries)
+            if (metadata or {}).get("created_at", 0) < expired_before
+            or idx < len(entries) - max_entries
+        ]
+        if ids:
+            log.info(f"Evicting {len(ids)} entries from {collection_name}")
+            VECTOR_DB_CLIENT.delete(collection_name, ids=ids)
+
+    def clear(self, model_ids: list[str], embedding_model: str):
+        for model_id in model_ids:
+            collection_name = get_semantic_cache_collection_name(
+                model_id, embedding_model
+            )
+            if VECTOR_DB_CLIENT.has_collection(collection_name):
+                VECTOR_DB_CLIENT.delete_collection(collection_name)
+
+
+SEMANTIC_CACHE = SemanticCache()
@@ -0,0 +1,71 @@
+import asyncio
+import copy
+import logging
+from typing import Awaitable, Callable
+
+from cachetools import TTLCache
+
+from open_webui.env import SRC_LOG_LEVELS
+from open_webui.utils.metrics import METRICS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+
+class TaskCompletionCache:
+    """
+    Single-flight plus a short lived result cache for task generations.
+    Identical requests share the one in flight, and completed answers are
+    replayed until they expire. Only plain dict responses are shared,
+    anything else (streams, error responses) is left to each caller.
+    """
+
+    def __init__(self, ttl: int, maxsize: int):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.in_flight: dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, task: str, generate: Callable[[], Awaitable]):
+        if key in self.cache:
+            METRICS.inc("task_cache_requests_total", task=task, result="hit")
+            return copy.deepcopy(self.cache[key])
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            METRICS.inc("task_cache_requests_total", task=task, result="coalesced")
+            try:
+                response = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader's client went away mid request
+                response = None
+            except Exception:
+                response = None
+            if isinstance(response, dict):
+                return copy.deepcopy(response)
+            # The shared attempt failed or can't be shared, try on our own
+            return await generate()
+
+        METRICS.inc("task_cache_requests_total", task=task, result="miss")
+        future = asyncio.get_running_loop().create_future()
+        # Followers handle failures themselves, don't warn when nobody waited
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.in_flight[key] = future
+        try:
+            response = await generate()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self.in_flight.pop(key, None)
+
+        if isinstance(response, dict) and response.get("choices"):
+            self.cache[key] = copy.deepcopy(response)
+        future.set_result(response)
+        return response
+
+    def clear(self):
+        self.cache.clear()
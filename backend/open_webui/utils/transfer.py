@@ -0,0 +1,294 @@
+import asyncio
+import hashlib
+import logging
+import os
+from typing import AsyncGenerator, Optional
+
+import aiohttp
+
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+# Seconds between progress events of a running transfer
+TRANSFER_PROGRESS_INTERVAL = 0.5
+
+# Times a failed segment of a multi connection download is fetched again
+TRANSFER_SEGMENT_RETRIES = 3
+
+
+class TransferProgress:
+    def __init__(self, total: int = 0):
+        self.total = total
+        self.completed = 0
+
+    def model_dump(self) -> dict:
+        return {
+            "progress": round((self.completed / self.total) * 100, 2),
+            "completed": self.completed,
+            "total": self.total,
+        }
+
+
+def hash_range(file, hasher, start: int, end: int, chunk_size: int):
+    file.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = file.read(min(chunk_size, remaining))
+        if not data:
+            raise Exception(f"Unexpected end of file at {end - remaining}")
+        hasher.update(data)
+        remaining -= len(data)
+
+
+def is_permanent_error(e: Exception) -> bool:
+    # Client errors other than timeouts and rate limits won't go away by retrying
+    return (
+        isinstance(e, aiohttp.ClientResponseError)
+        and 400 <= e.status < 500
+        and e.status not in [408, 429]
+    )
+
+
+def write_and_hash(file, hasher, data: bytes):
+    file.write(data)
+    hasher.update(data)
+
+
+async def iter_file(
+    file_path: str,
+    progress: Optional[TransferProgress] = None,
+    chunk_size: int = TRANSFER_CHUNK_SIZE,
+) -> AsyncGenerator[bytes, None]:
+    with open(file_path, "rb") as file:
+        while data := await asyncio.to_thread(file.read, chunk_size):
+            if progress is not None:
+                progress.completed += len(data)
+            yield data
+
+
+async def watch_transfer(
+    task: asyncio.Task,
+    progress: TransferProgress,
+    interval: float = TRANSFER_PROGRESS_INTERVAL,
+) -> AsyncGenerator[dict, None]:
+    # Yields progress until the task is done, the caller checks its result
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=interval)
+            if progress.total:
+                yield progress.model_dump()
+            if done:
+                return
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+async def get_download_info(
+    session: aiohttp.ClientSession, url: str
+) -> tuple[int, bool]:
+    # Size of the file and whether ranged requests are supported
+    try:
+        async with session.head(url, allow_redirects=True) as r:
+            r.raise_for_status()
+            return (
+                int(r.headers.get("content-length", 0)),
+                r.headers.get("accept-ranges", "").lower() == "bytes",
+            )
+    except Exception as e:
+        log.debug(f"HEAD {url} failed: {e}")
+        return 0, False
+
+
+async def download_sequential(
+    session: aiohttp.ClientSession,
+    url: str,
+    file_path: str,
+    progress: TransferProgress,
+    chunk_size: int,
+    timeout: aiohttp.ClientTimeout,
+) -> str:
+    current_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    hasher = hashlib.sha256()
+
+    headers = {"Range": f"bytes={current_size}-"} if current_size > 0 else {}
+    async with session.get(url, headers=headers, timeout=timeout) as r:
+        if r.status == 416 and current_size > 0:
+            # Nothing left, a previous attempt got the whole file
+            progress.total = progress.completed = current_size
+            with open(file_path, "rb") as file:
+                await asyncio.to_thread(
+                    hash_range, file, hasher, 0, current_size, chunk_size
+                )
+            return hasher.hexdigest()
+        r.raise_for_status()
+
+        mode = "ab"
+        if current_size > 0 and r.status != 206:
+            log.info(f"{url} doesn't support resuming, starting over")
+            current_size = 0
+            mode = "wb"
+
+        content_length = int(r.headers.get("content-length", 0))
+        progress.total = current_size + content_length
+        progress.completed = current_size
+
+        with open(file_path, mode + "+") as file:
+            if current_size > 0:
+                # Only the part of a previous attempt is read back
+                await asyncio.to_thread(
+                    hash_range, file, hasher, 0, current_size, chunk_size
+                )
+                file.seek(0, os.SEEK_END)
+
+            async for data in r.content.iter_chunked(chunk_size):
+                await asyncio.to_thread(write_and_hash, file, hasher, data)
+                progress.completed += len(data)
+
+    if content_length and progress.completed != progress.total:
+        raise Exception(
+            f"Download incomplete, got {progress.completed} of {progress.total} bytes"
+        )
+    return hasher.hexdigest()
+
+
+async def download_segments(
+    session: aiohttp.ClientSession,
+    url: str,
+    file_path: str,
+    total_size: int,
+    progress: TransferProgress,
+    connections: int,
+    segment_size: int,
+    chunk_size: int,
+    timeout: aiohttp.ClientTimeout,
+) -> str:
+    segments = [
+        (start, min(start + segment_size, total_size))
+        for start in range(0, total_size, segment_size)
+    ]
+    finished = [asyncio.Event() for _ in segments]
+    pending = iter(range(len(segments)))
+    hasher = hashlib.sha256()
+
+    progress.total = total_size
+    progress.completed = 0
+
+    def allocate():
+        with open(file_path, "wb") as file:
+            file.truncate(total_size)
+
+    await asyncio.to_thread(allocate)
+
+    async def fetch_segment(file, start: int, end: int):
+        written = 0
+        try:
+            async with session.get(
+                url, headers={"Range": f"bytes={start}-{end - 1}"}, timeout=timeout
+            ) as r:
+                r.raise_for_status()
+                if r.status != 206:
+                    raise Exception(f"{url} ignored the range request")
+
+                file.seek(start)
+                async for data in r.content.iter_chunked(chunk_size):
+                    await asyncio.to_thread(file.write, data)
+                    written += len(data)
+                    progress.completed += len(data)
+
+            await asyncio.to_thread(file.flush)
+            if file.tell() != end:
+                raise aiohttp.ClientPayloadError(f"Segment {start}-{end} incomplete")
+        except BaseException:
+            # The segment is written again from its start on the next attempt
+            progress.completed -= written
+            raise
+
+    async def fetch():
+        with open(file_path, "r+b") as file:
+            for idx in pending:
+                start, end = segments[idx]
+                for attempt in range(TRANSFER_SEGMENT_RETRIES + 1):
+                    if attempt:
+                        await asyncio.sleep(2 ** (attempt - 1))
+                    try:
+                        await fetch_segment(file, start, end)
+                        break
+                    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                        if attempt == TRANSFER_SEGMENT_RETRIES or is_permanent_error(e):
+                            raise
+                        log.warning(f"Segment {start}-{end} of {url} failed: {e!r}")
+                finished[idx].set()
+
+    async def hash_segments():
+        # Segments are fetched roughly in order, so hashing trails the
+        # downloads and reads them back while they are still in the page cache
+        with open(file_path, "rb") as file:
+            for idx, (start, end) in enumerate(segments):
+                await finished[idx].wait()
+                await asyncio.to_thread(
+                    hash_range, file, hasher, start, end, chunk_size
+                )
+
+    tasks = [
+        asyncio.create_task(fetch()) for _ in range(min(connections, len(segments)))
+    ]
+    hashing = asyncio.create_task(hash_segments())
+    completed = False
+    try:
+        await asyncio.gather(*tasks)
+        await hashing
+        completed = True
+    finally:
+        for task in [*tasks, hashing]:
+            task.cancel()
+        await asyncio.gather(*tasks, hashing, return_exceptions=True)
+        # The preallocated file would pass for a finished download next time
+        if not completed and os.path.exists(file_path):
+            os.remove(file_path)
+
+    return hasher.hexdigest()
+
+
+async def download_file(
+    session: aiohttp.ClientSession,
+    url: str,
+    file_path: str,
+    progress: TransferProgress,
+    connections: int = 1,
+    segment_size: int = 64 * 1024 * 1024,
+    chunk_size: int = TRANSFER_CHUNK_SIZE,
+    read_timeout: int = 600,
+) -> str:
+    """
+    Downloads url to file_path and returns its sha256, hashed as the data
+    comes in instead of reading the file again afterwards. Large files are
+    fetched over several connections in ranged segments when the server
+    allows it, partial sequential downloads are resumed.
+    """
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=read_timeout)
+
+    if connections > 1 and not os.path.exists(file_path):
+        total_size, ranges = await get_download_info(session, url)
+        if ranges and total_size >= 2 * segment_size:
+            log.info(f"Downloading {url} in {segment_size} byte segments")
+            return await download_segments(
+                session,
+                url,
+                file_path,
+                total_size,
+                progress,
+                connections,
+                segment_size,
+                chunk_size,
+                timeout,
+            )
+
+    return await download_sequential(
+        session, url, file_path, progress, chunk_size, timeout
+    )